@@ -1,5 +1,12 @@
 """Expose project agents to ADK tooling."""
 
-from app.agents import root_agent
+
+def __getattr__(name: str):
+    if name == "root_agent":
+        from app.agents import get_root_agent
+
+        return get_root_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = ["root_agent"]
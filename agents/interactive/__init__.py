@@ -1,5 +1,12 @@
 """Expose the ADK app for the web runner."""
 
-from app import app
+
+def __getattr__(name: str):
+    if name == "app":
+        from app import get_app
+
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = ["app"]
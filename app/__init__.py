@@ -1,36 +1,27 @@
-from google.adk.apps.app import App
+"""The ADK App (`app.app`) for `adk web` and runners, built on first access."""
 
-from app.agents import root_agent
-from app.plugins import LoggerPlugin, OllamaToolCallBridgePlugin
+import functools
 
 
-def _collect_tool_names(agent) -> set[str]:
-    names: set[str] = set()
-    for tool in getattr(agent, "tools", []):
-        name = getattr(tool, "name", getattr(tool, "__name__", None))
-        if not isinstance(name, str):
-            continue
-        if name == agent.name:
-            continue
-        names.add(name)
+@functools.lru_cache(maxsize=None)
+def get_app():
+    from google.adk.apps.app import App
 
-    for child in getattr(agent, "sub_agents", []) or []:
-        names.update(_collect_tool_names(child))
+    from app.agents import get_root_agent
+    from app.plugins import default_plugins
 
-    return names
+    return App(
+        name="app",
+        root_agent=get_root_agent(),
+        plugins=default_plugins(),
+    )
 
 
-def _discover_tool_names() -> set[str]:
-    return _collect_tool_names(root_agent)
+def __getattr__(name: str):
+    # Importing app.tools, app.cache, ... must not build the agent.
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-app = App(
-    name="app",
-    root_agent=root_agent,
-    plugins=[
-        OllamaToolCallBridgePlugin(allowed_tool_names=_discover_tool_names()),
-        LoggerPlugin(),
-    ],
-)
-
-__all__ = ["app"]
+__all__ = ["app", "get_app"]
@@ -1,30 +1,95 @@
+"""The root agent and the tool registry it is built from.
+
+Importing google.adk and LiteLLM takes seconds, so the agent is only built
+by `get_root_agent()` on first use; `root_agent` (and `ollama_llm`) still
+resolve on attribute access. With several Ollama daemons configured, the
+model's calls go through app.routing.OllamaRouter, and with CASSETTE_PATH
+set they (and the tools' HTTP traffic) are recorded or replayed by
+app.cassette. `TOOLS` / `TOOL_NAMES` are the one list of tools
+the agent exposes, which the bridge plugin uses as its allow-list.
+"""
+
+import functools
+import json
 import os
-from google.adk.agents import LlmAgent
-from google.adk.models.lite_llm import LiteLlm
-from app.tools import calc, http_get, weather_by_zip
+from pathlib import Path
+from typing import List
+
+from app.executor import tool_executor
+from app.tools import calc, http_get, weather_by_zip, weather_by_zips
 
 OLLAMA_API_BASE = os.getenv("OLLAMA_API_BASE", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3:8b")
+# Several daemons: comma-separated api_bases, or a file holding a JSON list or one URL per line.
+OLLAMA_API_BASES = os.getenv("OLLAMA_API_BASES", "")
+OLLAMA_BACKENDS_FILE = os.getenv("OLLAMA_BACKENDS_FILE", "")
 
-# Ensure ADK treats this as a chat model and knows where Ollama lives
-ollama_llm = LiteLlm(
-    model=f"ollama_chat/{OLLAMA_MODEL}",
-    api_base=OLLAMA_API_BASE,
-)
+TOOLS = (calc, http_get, weather_by_zip, weather_by_zips)
+TOOL_NAMES = frozenset(tool.__name__ for tool in TOOLS)
 
-root_agent = LlmAgent(
-    name="root",
-    model=ollama_llm,
-    instruction=(
-        "You are a helpful assistant running on a local Ollama model. "
-        "Always produce a final textual answer in plain language. "
-        "You may call exactly three tools: calc, http_get, and weather_by_zip. "
-        "Use calc for arithmetic, http_get for JSON APIs, and weather_by_zip for current weather by US ZIP code "
-        "(ask the user for a 5-digit ZIP if you do not have one). "
-        "If any tool returns ok=False or errors, explain the issue briefly and continue. "
-        "Never invent new tool names, never emit raw JSON in the final answer, and keep responses concise."
-    ),
-    tools=[calc, http_get, weather_by_zip],
-    disallow_transfer_to_parent=True,
-    disallow_transfer_to_peers=True,
+INSTRUCTION = (
+    "You are a helpful assistant running on a local Ollama model. "
+    "Always produce a final textual answer in plain language. "
+    "You may call exactly four tools: calc, http_get, weather_by_zip, and weather_by_zips. "
+    "Use calc for arithmetic, http_get for JSON APIs, and weather_by_zip for current weather by US ZIP code "
+    "(ask the user for a 5-digit ZIP if you do not have one). "
+    "When the user asks about more than one ZIP code, call weather_by_zips once with all of them. "
+    "When several tool calls do not depend on each other's results, request them all in the same response. "
+    "If any tool returns ok=False or errors, explain the issue briefly and continue. "
+    "Never invent new tool names, never emit raw JSON in the final answer, and keep responses concise."
 )
+
+
+def ollama_api_bases(default: str = OLLAMA_API_BASE) -> List[str]:
+    """Backends from OLLAMA_API_BASES, else OLLAMA_BACKENDS_FILE, else just `default`."""
+    if OLLAMA_API_BASES.strip():
+        items = OLLAMA_API_BASES.split(",")
+    elif OLLAMA_BACKENDS_FILE:
+        text = Path(OLLAMA_BACKENDS_FILE).read_text()
+        items = json.loads(text) if text.lstrip().startswith("[") else text.splitlines()
+    else:
+        items = [default]
+    bases = [item.strip().rstrip("/") for item in items if item.strip() and not item.strip().startswith("#")]
+    return list(dict.fromkeys(bases)) or [default]
+
+
+@functools.lru_cache(maxsize=None)
+def get_root_agent():
+    from google.adk.agents import LlmAgent
+    from google.adk.models.lite_llm import LiteLlm
+
+    from app.cassette import use_cassette
+    from app.ollama import OllamaClient, keep_alive_arg
+
+    # Ensure ADK treats this as a chat model and knows where Ollama lives
+    bases = ollama_api_bases()
+    if len(bases) > 1:
+        from app.routing import OllamaRouter
+
+        llm_client = use_cassette(OllamaRouter(bases), passthrough=bases)
+        ollama_llm = LiteLlm(model=f"ollama_chat/{OLLAMA_MODEL}", llm_client=llm_client, **keep_alive_arg())
+    else:
+        ollama_llm = LiteLlm(
+            model=f"ollama_chat/{OLLAMA_MODEL}",
+            api_base=bases[0],
+            # OllamaClient adds OllamaOptionsPlugin's num_ctx; CASSETTE_PATH records or replays it.
+            llm_client=use_cassette(OllamaClient(), passthrough=bases),
+            **keep_alive_arg(),
+        )
+    return LlmAgent(
+        name="root",
+        model=ollama_llm,
+        instruction=INSTRUCTION,
+        # Sync tools run on the executor's thread pool; all tools honour TOOL_CONCURRENCY.
+        tools=tool_executor.wrap_all(TOOLS),
+        disallow_transfer_to_parent=True,
+        disallow_transfer_to_peers=True,
+    )
+
+
+def __getattr__(name: str):
+    if name == "root_agent":
+        return get_root_agent()
+    if name == "ollama_llm":
+        return get_root_agent().model
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
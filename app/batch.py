@@ -0,0 +1,170 @@
+"""Concurrent batch runs over a JSONL file of prompts.
+
+Each input line is either a JSON string or an object holding the prompt under
+`prompt`, `message`, `body` or `text`, and optionally an `id`/`request_id`.
+Prompts share one Runner and session service, each gets its own session, and a
+result line is appended to the output file as soon as its prompt finishes, so
+an interrupted batch can be resumed by skipping ids already written. The file
+is read as the workers take prompts, so its size does not bound memory, and a
+malformed line becomes a failed result rather than stopping the batch.
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+import google.genai.types as types
+
+_PROMPT_KEYS = ("prompt", "message", "body", "text")
+_ID_KEYS = ("id", "request_id")
+
+
+def iter_prompts(path: Path) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    """Yield (id, prompt, error) from a JSONL file; ids default to the line number.
+
+    A line without a usable prompt yields None and the reason instead of raising.
+    """
+    with open(path, encoding="utf-8") as fh:
+        for lineno, line in enumerate(fh, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield str(lineno), None, f"line {lineno}: invalid JSON: {exc}"
+                continue
+            if isinstance(record, str):
+                yield str(lineno), record, None
+                continue
+            if not isinstance(record, dict):
+                yield str(lineno), None, f"line {lineno}: expected a string or an object"
+                continue
+            prompt_id = next((record[k] for k in _ID_KEYS if record.get(k) is not None), lineno)
+            prompt = next((record[k] for k in _PROMPT_KEYS if record.get(k)), None)
+            if prompt is None:
+                yield str(prompt_id), None, f"line {lineno}: no prompt field ({', '.join(_PROMPT_KEYS)})"
+                continue
+            yield str(prompt_id), str(prompt), None
+
+
+def completed_ids(path: Path) -> Set[str]:
+    """Ids already written to `path` without an error."""
+    done: Set[str] = set()
+    if not path.exists():
+        return done
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line torn by an interrupted write
+            if not record.get("error"):
+                done.add(str(record.get("id")))
+    return done
+
+
+def _result(prompt_id: str) -> Dict[str, Any]:
+    return {
+        "id": prompt_id,
+        "final_text": None,
+        "tool_calls": [],
+        "latency_s": None,
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        "error": None,
+    }
+
+
+async def run_prompt(
+    runner: Any, session_service: Any, *, app_name: str, user_id: str, prompt_id: str, prompt: str
+) -> Dict[str, Any]:
+    """Run one prompt in a fresh session and summarize the outcome."""
+    started = time.perf_counter()
+    result = _result(prompt_id)
+    session_id = f"batch-{prompt_id}-{uuid.uuid4().hex[:8]}"
+    try:
+        await session_service.create_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        message = types.Content(role="user", parts=[types.Part(text=prompt)])
+        async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=message):
+            usage = getattr(event, "usage_metadata", None)
+            if usage is not None:
+                result["usage"]["prompt_tokens"] += usage.prompt_token_count or 0
+                result["usage"]["completion_tokens"] += usage.candidates_token_count or 0
+                result["usage"]["total_tokens"] += usage.total_token_count or 0
+            for call in event.get_function_calls():
+                result["tool_calls"].append({"name": call.name, "args": call.args or {}})
+            if event.is_final_response() and event.content and event.content.parts:
+                result["final_text"] = "".join(p.text for p in event.content.parts if p.text)
+    except Exception as exc:
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    result["latency_s"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+async def run_batch(
+    runner: Any,
+    session_service: Any,
+    input_path: Path,
+    output_path: Path,
+    *,
+    app_name: str,
+    user_id: str,
+    concurrency: int = 4,
+    resume: bool = False,
+) -> Dict[str, int]:
+    """Run every prompt in `input_path`, appending JSONL results to `output_path`.
+
+    `concurrency` workers take prompts from a short queue that is filled as
+    the file is read.
+    """
+    skip = completed_ids(output_path) if resume else set()
+    workers = max(1, concurrency)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    counts = {"total": 0, "skipped": 0, "ok": 0, "failed": 0}
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as out:
+
+        def write(result: Dict[str, Any]) -> None:
+            out.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+            counts["failed" if result["error"] else "ok"] += 1
+            print(
+                f"[ADK][batch] {result['id']} {'error' if result['error'] else 'ok'}"
+                f" latency={result['latency_s']}s ({counts['ok'] + counts['failed']} done)"
+            )
+
+        async def work() -> None:
+            while (item := await queue.get()) is not None:
+                prompt_id, prompt = item
+                write(await run_prompt(
+                    runner, session_service,
+                    app_name=app_name, user_id=user_id, prompt_id=prompt_id, prompt=prompt,
+                ))
+
+        tasks = [asyncio.create_task(work()) for _ in range(workers)]
+        try:
+            for prompt_id, prompt, error in iter_prompts(input_path):
+                counts["total"] += 1
+                if prompt_id in skip:
+                    counts["skipped"] += 1
+                elif prompt is None:
+                    write({**_result(prompt_id), "error": error})
+                else:
+                    await queue.put((prompt_id, prompt))
+            for _ in tasks:
+                await queue.put(None)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+    return counts
+
+
+def default_output_path(input_path: Path, output: Optional[str]) -> Path:
+    if output:
+        return Path(output)
+    return input_path.with_name(f"{input_path.stem}.results.jsonl")
@@ -0,0 +1,253 @@
+"""In-process LRU + TTL cache with an optional SQLite disk tier.
+
+`TTLCache.get_or_fetch` also coalesces concurrent misses for the same key into
+one upstream call (single-flight): the first caller runs the fetch and every
+other caller awaits its result.
+
+`cache_policy` declares on a tool function how ToolResultCachePlugin
+(app/plugins.py) may reuse its results.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+_MISSING = object()
+
+
+class DiskCache:
+    """JSON values in a SQLite table, shared across restarts and processes."""
+
+    def __init__(self, path: str, *, maxsize: int = 10_000) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._maxsize = maxsize
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+        )
+
+    def get(self, key: str) -> Tuple[Any, float]:
+        """Return (value, expires_at), or (_MISSING, 0) when absent or expired."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return _MISSING, 0.0
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Any, expires_at: float) -> None:
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, expires_at, value) VALUES (?, ?, ?)",
+                (key, expires_at, payload),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._prune()
+
+    def delete_prefix(self, prefix: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+
+    def _prune(self) -> None:
+        self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if count > self._maxsize:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY expires_at LIMIT ?)",
+                (count - self._maxsize,),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class TTLCache:
+    """Size-bounded LRU whose entries also expire after a per-entry TTL."""
+
+    def __init__(
+        self,
+        *,
+        maxsize: int = 1024,
+        ttl: float = 300.0,
+        disk: Optional[DiskCache] = None,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.disk = disk
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, "asyncio.Task[Any]"] = {}
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def peek(self, key: str, default: Any = None) -> Any:
+        """Like `get`, without touching the hit/miss counters."""
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._lookup(key)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def _lookup(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                return value
+            del self._entries[key]
+        if self.disk is not None:
+            value, expires_at = self.disk.get(key)
+            if value is not _MISSING:
+                self.disk_hits += 1
+                self._store(key, value, expires_at)
+                return value
+        return _MISSING
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        self._store(key, value, expires_at)
+        if self.disk is not None:
+            self.disk.set(key, value, expires_at)
+
+    def _store(self, key: str, value: Any, expires_at: float) -> None:
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, prefix: str = "") -> None:
+        """Drop every entry whose key starts with `prefix` (all entries by default)."""
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+        if self.disk is not None:
+            self.disk.delete_prefix(prefix)
+
+    async def get_or_fetch(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Tuple[Any, Optional[float]]]],
+    ) -> Any:
+        """Return the cached value for `key` or run `fetch` once for all waiters.
+
+        `fetch` returns `(value, ttl)`; a ttl of None uses the cache default and
+        a ttl <= 0 hands the value to the waiters without caching it. Exceptions
+        raised by `fetch` propagate to every waiter and nothing is cached.
+        """
+        value = self._lookup(key)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+        task = self._inflight.get(key)
+        if task is not None and not task.done():
+            self.coalesced += 1
+            return await asyncio.shield(task)
+        self.misses += 1
+        task = asyncio.ensure_future(self._fill(key, fetch))
+        self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _fill(
+        self, key: str, fetch: Callable[[], Awaitable[Tuple[Any, Optional[float]]]]
+    ) -> Any:
+        try:
+            value, ttl = await fetch()
+            self.set(key, value, ttl)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """How long a tool's result may be reused for the same arguments.
+
+    "pure" results depend only on the arguments; "ttl" results stay valid for
+    `ttl` seconds; "http" results stay valid while `freshness(args, result)`,
+    derived from the response's caching headers, returns a positive lifetime.
+    """
+
+    kind: str
+    ttl: Optional[float] = None
+    freshness: Optional[Callable[[Dict[str, Any], Any], float]] = None
+
+    def __post_init__(self) -> None:
+        if self.kind not in ("pure", "ttl", "http"):
+            raise ValueError(f"Unknown cache policy kind: {self.kind!r}")
+        if self.kind == "ttl" and self.ttl is None:
+            raise ValueError("A 'ttl' cache policy needs ttl=<seconds>.")
+        if self.kind == "http" and self.freshness is None:
+            raise ValueError("An 'http' cache policy needs freshness=<callable>.")
+
+    def lifetime(self, args: Dict[str, Any], result: Any, *, pure_ttl: float) -> float:
+        """Seconds `result` may be reused; 0 means do not cache it."""
+        if self.kind == "http":
+            return self.freshness(args, result)
+        if self.kind == "pure":
+            return pure_ttl if self.ttl is None else self.ttl
+        return self.ttl
+
+
+def cache_policy(
+    kind: str,
+    *,
+    ttl: Optional[float] = None,
+    freshness: Optional[Callable[[Dict[str, Any], Any], float]] = None,
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Attach a CachePolicy to a tool function (kept by functools.wraps wrappers)."""
+    policy = CachePolicy(kind, ttl, freshness)
+
+    def decorate(func: Callable[..., Any]) -> Callable[..., Any]:
+        func.cache_policy = policy
+        return func
+
+    return decorate
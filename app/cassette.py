@@ -0,0 +1,332 @@
+"""Record model and tool traffic to a cassette file and replay it offline.
+
+    CASSETTE_PATH=incident.json CASSETTE_MODE=record python -m app.main
+    CASSETTE_PATH=incident.json CASSETTE_MODE=replay python -m app.main
+
+In record mode every LiteLLM completion the agent makes (through
+`CassetteClient`, wrapped around the model's client) and every request on the
+shared httpx client (through `CassetteTransport`) is sent as usual and written
+down; replay answers them from the file without touching the network.
+Calls to the Ollama daemons themselves (warm-up, health probes) pass through.
+
+The file is JSON: `blobs` maps a content hash to a value and `interactions`
+refers to those hashes, so the system prompt, tool list and each message are
+stored once however many requests repeat them. An interaction is matched by
+the hash of its request with what does not change the answer left out:
+tool-call ids (ADK makes them up per run), api_base, timeout, keep_alive and
+num_ctx for the model; headers for HTTP. Requests with the same key are
+answered in recorded order, the last answer repeating, so many sessions can
+replay one conversation. A request that was never recorded raises
+`CassetteMiss`.
+
+CASSETTE_TIMING=real sleeps for the recorded durations (time to first token
+and between stream chunks included); the default `none` answers at once,
+which leaves only plugin, tool and framework overhead to profile.
+"""
+
+import asyncio
+import atexit
+import base64
+import gzip
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+import httpx
+import litellm
+from google.adk.models.lite_llm import LiteLLMClient
+
+from app import http_client
+from app.logs import log
+from app.ollama import request_options
+
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "")
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "replay")  # record | replay
+CASSETTE_TIMING = os.getenv("CASSETTE_TIMING", "none")  # none | real
+
+# Completion kwargs that only say where and how long, not what the model answers.
+_TRANSPORT_KWARGS = frozenset({"api_base", "timeout", "keep_alive", "num_ctx"})
+# Headers describing the stored (already decoded) body no longer apply to it.
+_BODY_HEADERS = frozenset({"content-encoding", "content-length", "transfer-encoding"})
+
+
+class CassetteMiss(LookupError):
+    """Replay met a request the cassette has no recording of."""
+
+
+def _plain(value: Any) -> Any:
+    """JSON-ready copy of LiteLLM messages/responses (pydantic models, TypedDicts, tuples)."""
+    if hasattr(value, "model_dump"):
+        value = value.model_dump(exclude_none=True)
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(",", ":")).encode()).hexdigest()[:24]
+
+
+def _without_call_ids(message: Dict[str, Any]) -> Dict[str, Any]:
+    message = {key: value for key, value in message.items() if key != "tool_call_id"}
+    if isinstance(message.get("tool_calls"), list):
+        message["tool_calls"] = [
+            {key: value for key, value in call.items() if key != "id"} if isinstance(call, dict) else call
+            for call in message["tool_calls"]
+        ]
+    return message
+
+
+class Cassette:
+    """One cassette file, recording or replaying; see the module docstring."""
+
+    def __init__(self, path: str, mode: str = CASSETTE_MODE, timing: str = CASSETTE_TIMING) -> None:
+        if mode not in ("record", "replay"):
+            raise ValueError(f"cassette mode must be 'record' or 'replay', not {mode!r}")
+        self.path = Path(path)
+        self.mode = mode
+        self.timing = timing
+        self.blobs: Dict[str, Any] = {}
+        self.interactions: List[Dict[str, Any]] = []
+        self._by_key: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._served: Dict[str, int] = defaultdict(int)
+        self.played: Dict[str, int] = defaultdict(int)  # "llm" / "http" requests answered by replay
+        self._dirty = False
+        if mode == "replay":
+            self._load()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    def _load(self) -> None:
+        raw = self.path.read_bytes()
+        if raw[:2] == b"\x1f\x8b":
+            raw = gzip.decompress(raw)
+        data = json.loads(raw)
+        self.blobs = data.get("blobs", {})
+        self.interactions = data.get("interactions", [])
+        for interaction in self.interactions:
+            self._add(interaction)
+
+    def save(self) -> None:
+        """Write the cassette (gzipped when the path ends in .gz); a no-op when nothing new was recorded."""
+        if not self._dirty:
+            return
+        raw = json.dumps({"version": 1, "interactions": self.interactions, "blobs": self.blobs}, ensure_ascii=False)
+        data = gzip.compress(raw.encode()) if self.path.suffix == ".gz" else raw.encode()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, self.path)
+        self._dirty = False
+        log.event("cassette", msg="saved", path=str(self.path), interactions=len(self.interactions), blobs=len(self.blobs))
+
+    def put(self, value: Any) -> str:
+        """Store `value` under its hash and return the hash."""
+        digest = _digest(value)
+        self.blobs.setdefault(digest, value)
+        return digest
+
+    def get(self, digest: str) -> Any:
+        return self.blobs[digest]
+
+    def _add(self, interaction: Dict[str, Any]) -> None:
+        self._by_key[interaction["key"]].append(interaction)
+
+    def record(self, interaction: Dict[str, Any]) -> None:
+        self.interactions.append(interaction)
+        self._add(interaction)
+        self._dirty = True
+
+    def play(self, kind: str, key: str, describe: str) -> Dict[str, Any]:
+        """The next recorded `kind` interaction for `key`; the last one repeats once they run out."""
+        recorded = self._by_key.get(key)
+        if not recorded:
+            log.event("cassette", "WARNING", msg="miss", key=key, request=describe)
+            raise CassetteMiss(f"no recording of {describe} (key {key}) in {self.path}")
+        index = self._served[key]
+        self._served[key] = index + 1
+        self.played[kind] += 1
+        return recorded[min(index, len(recorded) - 1)]
+
+    async def pause(self, seconds: float) -> None:
+        if self.timing == "real" and seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def client(self, inner: Optional[LiteLLMClient] = None) -> "CassetteClient":
+        return CassetteClient(self, inner)
+
+    def transport(self, inner: Optional[httpx.AsyncBaseTransport] = None, passthrough: Sequence[str] = ()) -> "CassetteTransport":
+        return CassetteTransport(self, inner, passthrough)
+
+
+class CassetteClient(LiteLLMClient):
+    """LiteLLM client that records `inner`'s completions, or replays them without calling it."""
+
+    def __init__(self, cassette: Cassette, inner: Optional[LiteLLMClient] = None) -> None:
+        self.cassette = cassette
+        self.inner = inner or LiteLLMClient()
+
+    def _request(self, model: str, messages: Any, tools: Any, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        messages = [_without_call_ids(message) for message in _plain(messages)]
+        # The inner OllamaClient adds request_options (format, schema, ...) after us; key on them too.
+        options = {**kwargs, **(request_options.get() or {})}
+        settings = {key: value for key, value in _plain(options).items() if key not in _TRANSPORT_KWARGS}
+        return {
+            "model": model,
+            "messages": [self.cassette.put(message) for message in messages],
+            "tools": self.cassette.put(_plain(tools)) if tools else None,
+            "settings": settings,
+        }
+
+    async def acompletion(self, model, messages, tools, **kwargs):
+        request = self._request(model, messages, tools, kwargs)
+        key = _digest(request)
+        stream = bool(kwargs.get("stream"))
+        if not self.cassette.recording:
+            interaction = self.cassette.play("llm", key, f"{model} completion")
+            if stream:
+                return self._replay_stream(interaction)
+            await self.cassette.pause(interaction["seconds"])
+            return litellm.ModelResponse(**self.cassette.get(interaction["response"]))
+        started = time.perf_counter()
+        response = await self.inner.acompletion(model, messages, tools, **kwargs)
+        if stream:
+            return self._record_stream(response, key, request, started)
+        self.cassette.record({
+            "kind": "llm",
+            "key": key,
+            "request": self.cassette.put(request),
+            "response": self.cassette.put(_plain(response)),
+            "seconds": round(time.perf_counter() - started, 4),
+        })
+        return response
+
+    async def _record_stream(self, stream: Any, key: str, request: Dict[str, Any], started: float) -> AsyncIterator[Any]:
+        chunks: List[str] = []
+        gaps: List[float] = []
+        last = started
+        async for chunk in stream:
+            now = time.perf_counter()
+            chunks.append(self.cassette.put(_plain(chunk)))
+            gaps.append(round(now - last, 4))
+            last = now
+            yield chunk
+        # Only a stream that ran to the end is recorded: replaying a cut-off one would pass it off as complete.
+        self.cassette.record({
+            "kind": "llm-stream",
+            "key": key,
+            "request": self.cassette.put(request),
+            "chunks": chunks,
+            "gaps": gaps,
+        })
+
+    async def _replay_stream(self, interaction: Dict[str, Any]) -> AsyncIterator[Any]:
+        for digest, gap in zip(interaction["chunks"], interaction["gaps"]):
+            await self.cassette.pause(gap)
+            yield litellm.ModelResponseStream(**self.cassette.get(digest))
+
+
+class CassetteTransport(httpx.AsyncBaseTransport):
+    """httpx transport that records what `inner` answers, or replays it; URLs under `passthrough` go straight to `inner`."""
+
+    def __init__(
+        self, cassette: Cassette, inner: Optional[httpx.AsyncBaseTransport] = None, passthrough: Sequence[str] = ()
+    ) -> None:
+        self.cassette = cassette
+        self._inner = inner
+        self._default: Optional[httpx.AsyncBaseTransport] = None
+        self._default_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.passthrough = tuple(passthrough)
+
+    def _forward(self) -> httpx.AsyncBaseTransport:
+        if self._inner is not None:
+            return self._inner
+        # Like the shared client: pooled connections belong to the loop that opened them.
+        loop = asyncio.get_running_loop()
+        if self._default is None or self._default_loop is not loop:
+            self._default = http_client.default_transport()
+            self._default_loop = loop
+        return self._default
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        url = str(request.url)
+        if self.passthrough and url.startswith(self.passthrough):
+            return await self._forward().handle_async_request(request)
+        body = await request.aread()
+        key = _digest([request.method, url, hashlib.sha256(body).hexdigest() if body else None])
+        if not self.cassette.recording:
+            interaction = self.cassette.play("http", key, f"{request.method} {url}")
+            await self.cassette.pause(interaction["seconds"])
+            stored = self.cassette.get(interaction["body"])
+            content = base64.b64decode(stored["base64"]) if "base64" in stored else stored["text"].encode()
+            return httpx.Response(
+                interaction["status"], headers=self.cassette.get(interaction["headers"]), content=content, request=request
+            )
+        started = time.perf_counter()
+        response = await self._forward().handle_async_request(request)
+        content = await response.aread()
+        await response.aclose()
+        headers = [(name, value) for name, value in response.headers.multi_items() if name.lower() not in _BODY_HEADERS]
+        try:
+            stored = {"text": content.decode()}
+        except UnicodeDecodeError:
+            stored = {"base64": base64.b64encode(content).decode()}
+        self.cassette.record({
+            "kind": "http",
+            "key": key,
+            "method": request.method,
+            "url": url,
+            "status": response.status_code,
+            "headers": self.cassette.put(headers),
+            "body": self.cassette.put(stored),
+            "seconds": round(time.perf_counter() - started, 4),
+        })
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    async def aclose(self) -> None:
+        if self._default is not None:
+            await self._default.aclose()
+            self._default = None
+
+
+_active: Optional[Cassette] = None
+
+
+def active_cassette() -> Optional[Cassette]:
+    """The cassette CASSETTE_PATH names, opened on first use; None when it is unset."""
+    global _active
+    if _active is None and CASSETTE_PATH:
+        _active = Cassette(CASSETTE_PATH)
+        if _active.recording:
+            atexit.register(_active.save)
+        log.event("cassette", msg="opened", path=CASSETTE_PATH, mode=_active.mode, timing=_active.timing)
+    return _active
+
+
+def use_cassette(llm_client: LiteLLMClient, passthrough: Sequence[str] = ()) -> LiteLLMClient:
+    """`llm_client` behind the active cassette, with the shared httpx client routed through it too.
+
+    Without CASSETTE_PATH this returns `llm_client` and changes nothing.
+    `passthrough` are URL prefixes (the Ollama api_bases) left off the cassette.
+    """
+    cassette = active_cassette()
+    if cassette is None:
+        return llm_client
+    http_client.set_transport(cassette.transport(passthrough=passthrough))
+    return cassette.client(llm_client)
+
+
+def save_cassette() -> None:
+    """Write what the active cassette recorded so far (also done at exit)."""
+    if _active is not None and _active.recording:
+        _active.save()
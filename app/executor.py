@@ -0,0 +1,137 @@
+"""Tool execution layer: keeps tool work off the Runner's event loop.
+
+ADK calls synchronous tools inline from `run_async`, so a blocking tool stalls
+every session sharing the loop. `ToolExecutor.wrap` turns each tool into a
+coroutine that runs sync work on a bounded thread pool and enforces optional
+per-tool concurrency limits. `Deadline` gives retry loops jittered exponential
+backoff with a total time budget, sleeping with `asyncio.sleep`.
+"""
+
+import asyncio
+import functools
+import inspect
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+TOOL_THREAD_POOL_SIZE = int(os.getenv("TOOL_THREAD_POOL_SIZE", "8"))
+# Per-tool concurrency caps such as "http_get=8,weather_by_zip=4".
+TOOL_CONCURRENCY = os.getenv("TOOL_CONCURRENCY", "")
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.25"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "4.0"))
+
+
+def backoff_delay(
+    attempt: int, *, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY
+) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**(attempt-1))]."""
+    return random.uniform(0, min(cap, base * (2 ** max(0, attempt - 1))))
+
+
+class Deadline:
+    """Total time budget shared by every attempt of a retry loop."""
+
+    def __init__(self, seconds: float) -> None:
+        self._expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self._expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    async def backoff(self, attempt: int) -> bool:
+        """Sleep before the next attempt; False when the budget can't cover it."""
+        delay = backoff_delay(attempt)
+        if delay >= self.remaining():
+            return False
+        await asyncio.sleep(delay)
+        return True
+
+
+def _parse_limits(spec: str) -> Dict[str, int]:
+    limits: Dict[str, int] = {}
+    for item in spec.split(","):
+        name, sep, value = item.partition("=")
+        if not sep:
+            continue
+        try:
+            limits[name.strip()] = max(1, int(value))
+        except ValueError:
+            continue
+    return limits
+
+
+class ToolExecutor:
+    """Runs tools without blocking the event loop."""
+
+    def __init__(
+        self,
+        *,
+        max_workers: int = TOOL_THREAD_POOL_SIZE,
+        limits: Optional[Dict[str, int]] = None,
+    ) -> None:
+        self._max_workers = max_workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._limits = dict(limits or {})
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._slots_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self._max_workers, thread_name_prefix="adk-tool"
+            )
+        return self._pool
+
+    def _slot(self, name: str) -> Optional[asyncio.Semaphore]:
+        limit = self._limits.get(name)
+        if limit is None:
+            return None
+        loop = asyncio.get_running_loop()
+        if self._slots_loop is not loop:
+            self._slots = {}
+            self._slots_loop = loop
+        slot = self._slots.get(name)
+        if slot is None:
+            slot = asyncio.Semaphore(limit)
+            self._slots[name] = slot
+        return slot
+
+    async def run(self, func: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Any:
+        """Await `func`, off-loading it to the thread pool when it is synchronous."""
+        slot = self._slot(func.__name__)
+        if slot is None:
+            return await self._invoke(func, args, kwargs)
+        async with slot:
+            return await self._invoke(func, args, kwargs)
+
+    async def _invoke(self, func: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        if inspect.iscoroutinefunction(func):
+            return await func(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor(), functools.partial(func, *args, **kwargs)
+        )
+
+    def wrap(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        """Async wrapper that keeps `func`'s name, signature and docstring for ADK."""
+
+        @functools.wraps(func)
+        async def tool(*args: Any, **kwargs: Any) -> Any:
+            return await self.run(func, *args, **kwargs)
+
+        return tool
+
+    def wrap_all(self, funcs: Iterable[Callable[..., Any]]) -> List[Callable[..., Any]]:
+        return [self.wrap(func) for func in funcs]
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+tool_executor = ToolExecutor(limits=_parse_limits(TOOL_CONCURRENCY))
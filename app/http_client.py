@@ -0,0 +1,158 @@
+"""Process-wide pooled async HTTP client shared by the tools.
+
+Every tool call used to build its own `httpx` client, paying DNS, TCP and TLS
+setup on each request. The tools now borrow one `httpx.AsyncClient` with
+keep-alive pooling (and HTTP/2 when `h2` is installed) and release it when the
+app shuts down via `aclose_client()`.
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_ENABLE_HTTP2 = os.getenv("HTTP_ENABLE_HTTP2", "1") != "0"
+# Default cap on in-flight requests per host, plus optional overrides such as
+# "api.open-meteo.com=4,api.zippopotam.us=8".
+HTTP_PER_HOST_LIMIT = int(os.getenv("HTTP_PER_HOST_LIMIT", "10"))
+HTTP_PER_HOST_LIMITS = os.getenv("HTTP_PER_HOST_LIMITS", "")
+
+
+def _parse_host_limits(spec: str) -> Dict[str, int]:
+    limits: Dict[str, int] = {}
+    for item in spec.split(","):
+        host, sep, value = item.partition("=")
+        if not sep:
+            continue
+        try:
+            limits[host.strip().lower()] = max(1, int(value))
+        except ValueError:
+            continue
+    return limits
+
+
+_host_limits = _parse_host_limits(HTTP_PER_HOST_LIMITS)
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_client_closer: Optional[AsyncGenerator[None, None]] = None
+_transport: Optional[httpx.AsyncBaseTransport] = None
+_host_slots: Dict[str, asyncio.Semaphore] = {}
+_slots_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def default_transport() -> httpx.AsyncHTTPTransport:
+    """The network transport the shared client uses when none is set, for wrappers that forward to it."""
+    return httpx.AsyncHTTPTransport(http2=HTTP_ENABLE_HTTP2 and _http2_available(), limits=_limits())
+
+
+def _build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=HTTP_ENABLE_HTTP2 and _http2_available(),
+        limits=_limits(),
+        timeout=httpx.Timeout(10.0),
+        transport=_transport,
+    )
+
+
+async def _close_with_loop(client: httpx.AsyncClient) -> AsyncGenerator[None, None]:
+    # A live async generator is closed by asyncio.run() before it closes the
+    # loop, so the client's connections are closed on the loop that opened them.
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+def _retire(client: Optional[httpx.AsyncClient], loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """Close a client still open on another event loop, which must do the closing."""
+    if client is not None and not client.is_closed and loop is not None and loop.is_running():
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it on first use.
+
+    httpx connections are bound to the event loop that opened them, so a new
+    client is built if the caller runs on a different loop (e.g. successive
+    `asyncio.run` calls in scripts and tests). A client is closed when its
+    loop is shut down by `asyncio.run()`, or handed back to its loop to close
+    when it is replaced.
+    """
+    global _client, _client_loop, _client_closer
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _retire(_client, _client_loop)
+        _client = _build_client()
+        _client_loop = loop
+        # Run the closer up to its yield now, which registers it with this loop.
+        _client_closer = _close_with_loop(_client)
+        try:
+            _client_closer.asend(None).send(None)
+        except StopIteration:
+            pass
+    return _client
+
+
+def host_slot(url: str) -> asyncio.Semaphore:
+    """Semaphore bounding concurrent requests to the host of `url`."""
+    global _slots_loop
+    loop = asyncio.get_running_loop()
+    if _slots_loop is not loop:
+        # Semaphores bind to the loop that first waits on them.
+        _host_slots.clear()
+        _slots_loop = loop
+    host = (urlsplit(url).hostname or "").lower()
+    slot = _host_slots.get(host)
+    if slot is None:
+        slot = asyncio.Semaphore(_host_limits.get(host, HTTP_PER_HOST_LIMIT))
+        _host_slots[host] = slot
+    return slot
+
+
+async def aclose_client() -> None:
+    """Close the shared client; the next `get_client()` call builds a new one."""
+    global _client, _client_loop
+    client, _client, _client_loop = _client, None, None
+    _host_slots.clear()
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+def set_transport(transport: Optional[httpx.AsyncBaseTransport]) -> None:
+    """Route the shared client through `transport` (tests, stubs, replay)."""
+    global _transport, _client, _client_loop
+    _transport = transport
+    _client = None
+    _client_loop = None
+    _host_slots.clear()
+
+
+@asynccontextmanager
+async def http_lifespan() -> AsyncIterator[httpx.AsyncClient]:
+    """Open the shared client for the lifetime of the block and close it after."""
+    try:
+        yield get_client()
+    finally:
+        await aclose_client()
@@ -0,0 +1,108 @@
+"""Field projection and size bounding for JSON returned to the model.
+
+`project` keeps only the parts of a document named by simple JSONPath
+expressions: `title`, `$.data.items[0].name`, `items[*].id`, `rows[:5]`.
+`summarize` bounds what is left: arrays longer than `max_items` become
+`{"length": n, "first": [...]}`, long strings are clipped and objects keep
+their first keys, recursively, so the size of a tool result no longer depends
+on what the upstream sent.
+"""
+
+import os
+import re
+from typing import Any, Dict, List, Tuple
+
+JSON_MAX_STRING = int(os.getenv("JSON_MAX_STRING", "2000"))
+JSON_MAX_KEYS = int(os.getenv("JSON_MAX_KEYS", "50"))
+
+_SEGMENT = re.compile(r"\.([^.\[\]]+)|\[([^\]]*)\]")
+_SLICE = re.compile(r"^(-?\d*):(-?\d*)$")
+
+
+class PathError(ValueError):
+    """Raised for field expressions outside the supported JSONPath subset."""
+
+
+def _parse(path: str) -> List[Tuple[str, Any]]:
+    text = path.strip()
+    if text.startswith("$"):
+        text = text[1:]
+    if text and text[0] not in ".[":
+        text = "." + text
+    steps: List[Tuple[str, Any]] = []
+    position = 0
+    for match in _SEGMENT.finditer(text):
+        if match.start() != position:
+            break
+        position = match.end()
+        key, bracket = match.group(1), match.group(2)
+        if key is not None:
+            steps.append(("all", None) if key == "*" else ("key", key))
+            continue
+        bracket = bracket.strip()
+        if bracket == "*":
+            steps.append(("all", None))
+        elif re.fullmatch(r"-?\d+", bracket):
+            steps.append(("index", int(bracket)))
+        elif _SLICE.match(bracket):
+            start, stop = _SLICE.match(bracket).groups()
+            steps.append(("slice", slice(int(start) if start else None, int(stop) if stop else None)))
+        elif len(bracket) >= 2 and bracket[0] == bracket[-1] and bracket[0] in "'\"":
+            steps.append(("key", bracket[1:-1]))
+        else:
+            raise PathError(f"Unsupported selector [{bracket}] in field {path!r}.")
+    if position != len(text) or not steps:
+        raise PathError(f"Cannot parse field {path!r}; use forms like 'a.b', 'items[0]', 'items[*].id'.")
+    return steps
+
+
+def select(data: Any, path: str) -> Any:
+    """The value at `path`; a list when it uses `[*]` or a slice; None when absent."""
+    values = [data]
+    many = False
+    for kind, arg in _parse(path):
+        found = []
+        for value in values:
+            if kind == "key" and isinstance(value, dict) and arg in value:
+                found.append(value[arg])
+            elif kind == "index" and isinstance(value, list) and -len(value) <= arg < len(value):
+                found.append(value[arg])
+            elif kind == "slice" and isinstance(value, list):
+                found.extend(value[arg])
+            elif kind == "all" and isinstance(value, (list, dict)):
+                found.extend(value.values() if isinstance(value, dict) else value)
+        many = many or kind in ("slice", "all")
+        values = found
+    if many:
+        return values
+    return values[0] if values else None
+
+
+def project(data: Any, fields: List[str]) -> Dict[str, Any]:
+    """{field: selected value} for each field expression."""
+    return {field: select(data, field) for field in fields}
+
+
+def summarize(
+    value: Any,
+    max_items: int,
+    *,
+    max_string: int = JSON_MAX_STRING,
+    max_keys: int = JSON_MAX_KEYS,
+) -> Any:
+    """Bound arrays, strings and objects in `value` (0 turns a limit off)."""
+    if isinstance(value, list):
+        items = [summarize(item, max_items, max_string=max_string, max_keys=max_keys) for item in value[:max_items or None]]
+        if max_items and len(value) > max_items:
+            return {"length": len(value), "first": items}
+        return items
+    if isinstance(value, dict):
+        keys = list(value)[:max_keys or None]
+        bounded = {key: summarize(value[key], max_items, max_string=max_string, max_keys=max_keys) for key in keys}
+        if len(keys) < len(value):
+            bounded["_omitted_keys"] = len(value) - len(keys)
+        return bounded
+    if isinstance(value, str) and max_string and len(value) > max_string:
+        return f"{value[:max_string]}... [+{len(value) - max_string} chars]"
+    return value
+
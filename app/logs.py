@@ -0,0 +1,217 @@
+"""Structured, non-blocking logging for the plugins.
+
+Callbacks used to `print()` whole argument and result dicts on the event loop.
+They now call `log.event(...)`, which drops records below `LOG_LEVEL` or lost
+to sampling, bounds and redacts the fields, and enqueues the record; a
+background writer thread renders the queue in batches to the sinks:
+
+- `json`: one JSON object per line, to `LOG_FILE` or stderr;
+- `adk`: the human `[ADK][event] ...` lines on stdout.
+
+Records carry the session, user and invocation (request) ids of the callback
+context they were logged from, so one request can be followed across plugins.
+"""
+
+import atexit
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.json_shape import summarize
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_SINKS = os.getenv("LOG_SINKS", "json")
+LOG_FILE = os.getenv("LOG_FILE", "")
+# Fraction of records kept per event, e.g. "tool:end=0.1,ollama-bridge=0.5";
+# warnings and errors are always kept.
+LOG_SAMPLE = os.getenv("LOG_SAMPLE", "")
+LOG_MAX_STRING = int(os.getenv("LOG_MAX_STRING", "200"))
+LOG_MAX_ITEMS = int(os.getenv("LOG_MAX_ITEMS", "5"))
+LOG_MAX_KEYS = int(os.getenv("LOG_MAX_KEYS", "20"))
+LOG_REDACT = os.getenv("LOG_REDACT", "api_key,authorization,cookie,password,secret,token")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+_BATCH = 256
+
+
+def _parse_rates(spec: str) -> Dict[str, float]:
+    rates: Dict[str, float] = {}
+    for item in spec.split(","):
+        name, sep, value = item.partition("=")
+        if not sep:
+            continue
+        try:
+            rates[name.strip()] = min(1.0, max(0.0, float(value)))
+        except ValueError:
+            continue
+    return rates
+
+
+def correlation(context: Any) -> Dict[str, Any]:
+    """Session/user/invocation ids (and the tool call id) of an ADK callback or tool context."""
+    ids: Dict[str, Any] = {}
+    session = getattr(context, "session", None)
+    if session is not None:
+        ids["session_id"] = session.id
+        ids["user_id"] = session.user_id
+    for name in ("invocation_id", "agent_name", "function_call_id"):
+        value = getattr(context, name, None)
+        if value:
+            ids[name] = value
+    return ids
+
+
+class JsonLinesSink:
+    """Appends records as JSON lines to `path`, or to stderr when it is empty."""
+
+    def __init__(self, path: str = "") -> None:
+        self.path = path
+        self._file = None
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8") if self.path else sys.stderr
+        self._file.write("".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records))
+        self._file.flush()
+
+
+class AdkSink:
+    """The original human format: `[ADK][event] message key=value ...` on stdout."""
+
+    _HIDDEN = ("ts", "level", "event", "msg")
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        lines = []
+        for record in records:
+            head = f"[ADK][{record['event']}]"
+            if "msg" in record:
+                head += f" {record['msg']}"
+            fields = " ".join(f"{k}={v}" for k, v in record.items() if k not in self._HIDDEN)
+            lines.append(f"{head} {fields}".rstrip() + "\n")
+        sys.stdout.write("".join(lines))
+        sys.stdout.flush()
+
+
+def make_sinks(spec: str = LOG_SINKS, path: str = LOG_FILE) -> List[Any]:
+    sinks: List[Any] = []
+    for name in (item.strip().lower() for item in spec.split(",")):
+        if name == "json":
+            sinks.append(JsonLinesSink(path))
+        elif name == "adk":
+            sinks.append(AdkSink())
+    return sinks
+
+
+class StructuredLogger:
+    """Leveled, sampled, bounded records handed to `sinks` off the caller's thread.
+
+    A full queue drops records (counted in `dropped`) rather than blocking the
+    event loop.
+    """
+
+    def __init__(
+        self,
+        *,
+        level: str = LOG_LEVEL,
+        sinks: Optional[Iterable[Any]] = None,
+        sample: str = LOG_SAMPLE,
+        max_string: int = LOG_MAX_STRING,
+        max_items: int = LOG_MAX_ITEMS,
+        max_keys: int = LOG_MAX_KEYS,
+        redact: str = LOG_REDACT,
+        queue_size: int = LOG_QUEUE_SIZE,
+    ) -> None:
+        self.level = LEVELS.get(level.upper(), LEVELS["INFO"])
+        self.sinks = list(make_sinks() if sinks is None else sinks)
+        self.rates = _parse_rates(sample)
+        self.max_string = max_string
+        self.max_items = max_items
+        self.max_keys = max_keys
+        self.redact = frozenset(name.strip().lower() for name in redact.split(",") if name.strip())
+        self.dropped = 0
+        self.sampled_out = 0
+        self.sink_errors = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._writer: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def enabled(self, level: str) -> bool:
+        return bool(self.sinks) and LEVELS[level] >= self.level
+
+    def event(self, name: str, level: str = "INFO", *, context: Any = None, **fields: Any) -> None:
+        """Log event `name` with `fields`, tagged with the ids of `context`."""
+        if not self.enabled(level):
+            return
+        rate = self.rates.get(name)
+        if rate is not None and LEVELS[level] < LEVELS["WARNING"] and random.random() >= rate:
+            self.sampled_out += 1
+            return
+        record = {"ts": round(time.time(), 6), "level": level, "event": name}
+        if context is not None:
+            record.update(correlation(context))
+        for key, value in fields.items():
+            record[key] = self._bound(key, value)
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self) -> None:
+        """Block until every queued record has reached the sinks."""
+        if self._writer is not None:
+            self._queue.join()
+
+    def _bound(self, key: str, value: Any) -> Any:
+        if key.lower() in self.redact:
+            return "[redacted]"
+        if isinstance(value, tuple):
+            value = list(value)
+        return self._scrub(summarize(value, self.max_items, max_string=self.max_string, max_keys=self.max_keys))
+
+    def _scrub(self, value: Any) -> Any:
+        """Redact sensitive keys at any depth and stringify what JSON cannot hold."""
+        if isinstance(value, dict):
+            return {
+                str(k): "[redacted]" if str(k).lower() in self.redact else self._scrub(v)
+                for k, v in value.items()
+            }
+        if isinstance(value, list):
+            return [self._scrub(item) for item in value]
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        return summarize(str(value), 0, max_string=self.max_string)
+
+    def _ensure_writer(self) -> None:
+        if self._writer is not None:
+            return
+        with self._start_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._drain, name="log-writer", daemon=True)
+                self._writer.start()
+
+    def _drain(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < _BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for sink in self.sinks:
+                try:
+                    sink.write(batch)
+                except Exception:
+                    self.sink_errors += 1
+            for _ in batch:
+                self._queue.task_done()
+
+
+log = StructuredLogger()
+atexit.register(log.flush)
@@ -1,132 +1,195 @@
-from typing import Any, Dict
-import httpx
-import time
-
-def calc(expression: str) -> str:
-    """Evaluate a simple arithmetic expression, e.g., '12*(3+4)'. POC only."""
-    return str(eval(expression, {"__builtins__": {}}))
-
-def http_get(url: str, *, retries: int = 3, timeout: float = 10.0) -> Dict[str, Any]:
-    """GET a JSON endpoint and return parsed JSON with resilient behavior.
-
-    Returns a dict with keys: ok (bool), status (int|None), data (Any|None), error (str|None).
-    """
-    last_err = None
-    for attempt in range(1, retries + 1):
-        try:
-            with httpx.Client(timeout=timeout) as client:
-                r = client.get(url)
-                status = r.status_code
-                if 200 <= status < 300:
-                    try:
-                        return {"ok": True, "status": status, "data": r.json(), "error": None}
-                    except Exception as parse_err:
-                        return {"ok": False, "status": status, "data": None, "error": f"JSON parse error: {parse_err}"}
-                else:
-                    # Non-2xx: capture and (optionally) retry if 5xx
-                    if 500 <= status < 600 and attempt < retries:
-                        time.sleep(0.5 * attempt)
-                        continue
-                    return {"ok": False, "status": status, "data": None, "error": f"HTTP {status}: {r.text[:300]}"}
-        except Exception as e:
-            last_err = e
-            # Retry on transient network errors
-            if attempt < retries:
-                time.sleep(0.5 * attempt)
-                continue
-    return {"ok": False, "status": None, "data": None, "error": str(last_err) if last_err else "Unknown error"}
-
+import argparse
 import asyncio
 import os
-from importlib import import_module
+import time
+from pathlib import Path
 import google.genai.types as types
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.runners import Runner
-from app.agents import root_agent
-from app.plugins import LoggerPlugin, OllamaToolCallBridgePlugin
+from litellm.litellm_core_utils.logging_worker import GLOBAL_LOGGING_WORKER
+from app.agents import OLLAMA_MODEL, get_root_agent, ollama_api_bases
+from app.batch import default_output_path, run_batch
+from app.cassette import save_cassette
+from app.executor import tool_executor
+from app.http_client import aclose_client
+from app.logs import log
+from app.metrics import start_exporters, stop_exporters
+from app.ollama import OLLAMA_NUM_CTX_BUCKETS, warm_up
+from app.plugins import default_plugins
+from app.sessions import make_session_service
+from app.startup import format_profile, import_profile
 
 APP_NAME = "app"
 USER_ID = os.getenv("ADK_USER_ID", "local-user")
 SESSION_ID = os.getenv("ADK_SESSION_ID", "local-session")
+STREAM = os.getenv("ADK_STREAM", "0") == "1"
+BATCH_CONCURRENCY = int(os.getenv("ADK_BATCH_CONCURRENCY", "4"))
 
 
-def _tool_names() -> set[str]:
-    return _gather_tool_names(root_agent)
-
-
-def _gather_tool_names(agent) -> set[str]:
-    names: set[str] = set()
-    for tool in getattr(agent, "tools", []):
-        name = getattr(tool, "name", getattr(tool, "__name__", None))
-        if not isinstance(name, str):
-            continue
-        if name == agent.name:
-            continue
-        names.add(name)
-
-    for child in getattr(agent, "sub_agents", []) or []:
-        names.update(_gather_tool_names(child))
+def _event_text(event) -> str:
+    parts = getattr(getattr(event, "content", None), "parts", None) or []
+    return "".join(part.text for part in parts if getattr(part, "text", None))
 
-    return names
-
-
-TOOL_NAMES = _tool_names()
+def build_runner(session_service) -> Runner:
+    start_exporters()  # no-op unless METRICS_PORT or METRICS_DUMP_PATH is set
+    return Runner(
+        agent=get_root_agent(),
+        app_name=APP_NAME,
+        session_service=session_service,
+        plugins=default_plugins(),
+    )
 
-def make_session_service():
+async def shutdown(runner: Runner) -> None:
+    await runner.close()
+    close_sessions = getattr(runner.session_service, "aclose", None)
+    if close_sessions is not None:
+        await close_sessions()  # writes any events still buffered
+    await aclose_client()
+    save_cassette()
+    tool_executor.shutdown()
+    await _stop_litellm_logging()
+    stop_exporters()
+    log.flush()
+
+async def _stop_litellm_logging(timeout: float = 5.0) -> None:
+    """Stop LiteLLM's background logging task, which otherwise keeps asyncio.run() from returning.
+
+    Cancelling it mid-callback hangs, so wait for its queue to drain first.
+    The queue is bound to this event loop; drop it so a later loop gets a new one.
     """
-    Try several file-backed session services so the Dev UI (adk web) can see
-    the same sessions. Falls back to InMemory if none exist.
-    """
-    try:
-        sess_mod = import_module("google.adk.sessions")
-    except Exception:
-        from google.adk.sessions import InMemorySessionService
-        return InMemorySessionService()
-
-    candidates = [
-        ("LocalFileSessionService", {"base_dir": ".adk_data"}),
-        ("FileSessionService", {"base_dir": ".adk_data"}),
-        ("SqliteSessionService", {"db_path": ".adk_data/adk.db"}),
-    ]
-    for cls_name, kwargs in candidates:
-        cls = getattr(sess_mod, cls_name, None)
-        if cls:
-            return cls(**kwargs)
-
-    # last resort
-    InMemory = getattr(sess_mod, "InMemorySessionService")
-    return InMemory()
-
-async def run_local_agent_async(message: str):
+    queue = getattr(GLOBAL_LOGGING_WORKER, "_queue", None)
+    if queue is not None:
+        try:
+            await asyncio.wait_for(queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    await GLOBAL_LOGGING_WORKER.stop()
+    if hasattr(GLOBAL_LOGGING_WORKER, "_queue"):  # private; later LiteLLM versions may not have it
+        GLOBAL_LOGGING_WORKER._queue = None
+
+async def run_local_agent_async(message: str, *, stream: bool = STREAM):
     session_service = make_session_service()
-    # Ensure the session exists
-    await session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
+    # Reuse the persisted session, creating it on first run
+    session = await session_service.get_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
+    if session is None:
+        await session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
 
-    runner = Runner(
-        agent=root_agent,
-        app_name=APP_NAME,
-        session_service=session_service,
-        plugins=[OllamaToolCallBridgePlugin(allowed_tool_names=TOOL_NAMES), LoggerPlugin()],
-    )
+    runner = build_runner(session_service)
 
     # User message as ADK Content
     content = types.Content(role="user", parts=[types.Part(text=message)])
 
+    # SSE streaming makes LiteLLM request stream=True; partial events carry token deltas.
+    run_config = RunConfig(streaming_mode=StreamingMode.SSE if stream else StreamingMode.NONE)
+    started = time.perf_counter()
+    first_token = first_tool_call = None
+    streamed = False
+
     got_final = False
-    async for event in runner.run_async(user_id=USER_ID, session_id=SESSION_ID, new_message=content):
-        if hasattr(event, "is_final_response") and event.is_final_response():
-            got_final = True
-            print("\n=== FINAL ANSWER ===")
-            try:
-                print(event.content.parts[0].text)
-            except Exception:
-                print(event)
+    try:
+        async for event in runner.run_async(
+            user_id=USER_ID, session_id=SESSION_ID, new_message=content, run_config=run_config
+        ):
+            if event.partial:
+                text = _event_text(event)
+                if text:
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                        print("\n=== STREAMING ===")
+                    print(text, end="", flush=True)
+                    streamed = True
+                continue
+            if first_tool_call is None and event.get_function_calls():
+                first_tool_call = time.perf_counter() - started
+            if hasattr(event, "is_final_response") and event.is_final_response():
+                got_final = True
+                if streamed:
+                    print()
+                    continue
+                print("\n=== FINAL ANSWER ===")
+                try:
+                    print(event.content.parts[0].text)
+                except Exception:
+                    print(event)
+    finally:
+        await shutdown(runner)
 
     if not got_final:
         print("\n(No final response event received.)")
+    if stream:
+        def fmt(value):
+            return "n/a" if value is None else f"{value:.3f}s"
+        print(
+            f"[ADK][timing] time_to_first_token={fmt(first_token)}"
+            f" time_to_tool_dispatch={fmt(first_tool_call)}"
+            f" total={fmt(time.perf_counter() - started)}"
+        )
+
+async def warm_up_async() -> bool:
+    """Load OLLAMA_MODEL on every configured daemon; False if any failed."""
+    try:
+        num_ctx = OLLAMA_NUM_CTX_BUCKETS[0] if OLLAMA_NUM_CTX_BUCKETS else None
+        results = await warm_up(ollama_api_bases(), OLLAMA_MODEL, num_ctx=num_ctx)
+    finally:
+        await aclose_client()
+        log.flush()
+    for base, seconds in results.items():
+        print(f"{base}: " + ("failed" if seconds is None else f"loaded {OLLAMA_MODEL} in {seconds:.2f}s"))
+    return None not in results.values()
+
+async def run_batch_async(input_path: Path, output_path: Path, *, concurrency: int, resume: bool):
+    """Run every prompt in a JSONL file through one shared Runner."""
+    session_service = make_session_service()
+    runner = build_runner(session_service)
+    started = time.perf_counter()
+    try:
+        counts = await run_batch(
+            runner,
+            session_service,
+            input_path,
+            output_path,
+            app_name=APP_NAME,
+            user_id=USER_ID,
+            concurrency=concurrency,
+            resume=resume,
+        )
+    finally:
+        await shutdown(runner)
+    print(
+        f"\n=== BATCH DONE === {counts['ok']} ok, {counts['failed']} failed,"
+        f" {counts['skipped']} skipped of {counts['total']} in {time.perf_counter() - started:.1f}s"
+        f" -> {output_path}"
+    )
 
 if __name__ == "__main__":
-    msg = os.getenv(
-        "ADK_TEST_MSG",
-        "First compute 2*(5+7) with the calc tool. Then fetch https://jsonplaceholder.typicode.com/todos/1 with http_get and summarize the title. Finally, ask for the weather in ZIP code 94040.",
+    parser = argparse.ArgumentParser(description="Run the ADK agent against a local Ollama model.")
+    parser.add_argument("--stream", action="store_true", default=STREAM, help="print tokens as they arrive (SSE)")
+    parser.add_argument("--batch", metavar="JSONL", help="run every prompt in a JSONL file instead of ADK_TEST_MSG")
+    parser.add_argument("--output", help="batch results file (default: <input>.results.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="prompts run at once in batch mode")
+    parser.add_argument("--resume", action="store_true", help="skip prompts already completed in the results file")
+    parser.add_argument("--warm-up", action="store_true", help="load the model on every Ollama daemon, then exit")
+    parser.add_argument(
+        "--import-profile", action="store_true", help="report where a cold start (imports + runner build) spends its time"
     )
-    asyncio.run(run_local_agent_async(msg))
+    args = parser.parse_args()
+    if args.import_profile:
+        print(format_profile(import_profile()))
+    elif args.warm_up:
+        raise SystemExit(0 if asyncio.run(warm_up_async()) else 1)
+    elif args.batch:
+        batch_path = Path(args.batch)
+        asyncio.run(
+            run_batch_async(
+                batch_path,
+                default_output_path(batch_path, args.output),
+                concurrency=args.concurrency,
+                resume=args.resume,
+            )
+        )
+    else:
+        msg = os.getenv(
+            "ADK_TEST_MSG",
+            "First compute 2*(5+7) with the calc tool. Then fetch https://jsonplaceholder.typicode.com/todos/1 with http_get and summarize the title. Finally, ask for the weather in ZIP code 94040.",
+        )
+        asyncio.run(run_local_agent_async(msg, stream=args.stream))
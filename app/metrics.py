@@ -0,0 +1,271 @@
+"""In-process metrics with Prometheus text exposition.
+
+Histograms keep fixed buckets per label set, so memory stays constant however
+long the process runs. `REGISTRY` is served at `/metrics` on METRICS_PORT and,
+with METRICS_DUMP_PATH, rewritten to a file every METRICS_DUMP_INTERVAL
+seconds; `start_exporters()` / `stop_exporters()` manage both.
+"""
+
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.logs import log
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = no endpoint
+METRICS_DUMP_PATH = os.getenv("METRICS_DUMP_PATH", "")
+METRICS_DUMP_INTERVAL = float(os.getenv("METRICS_DUMP_INTERVAL", "15"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+_Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic total per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[_Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_number(v)}" for key, v in values]
+
+
+class Histogram:
+    """Bucketed observations (count, sum and cumulative buckets) per label set."""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[_Labels, List[float]] = {}  # per-bucket counts, then +Inf, sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self, **labels: str) -> Dict[str, float]:
+        """{"count", "sum"} for one label set (zeros when never observed)."""
+        series = self._series.get(tuple(str(labels.get(name, "")) for name in self.labelnames))
+        if series is None:
+            return {"count": 0, "sum": 0.0}
+        return {"count": sum(series[:-1]), "sum": series[-1]}
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        lines = []
+        for key, values in series:
+            running = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+                running += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_number(running)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_number(values[-1])}")
+            lines.append(f"{self.name}_count{labels} {_number(running)}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Every metric in Prometheus text exposition format (0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+AGENT_SECONDS = REGISTRY.histogram("adk_agent_seconds", "Agent run time per invocation.", ("agent",))
+MODEL_SECONDS = REGISTRY.histogram(
+    "adk_model_seconds", "Model call time, before_model to the final response.", ("model",)
+)
+MODEL_FIRST_CHUNK_SECONDS = REGISTRY.histogram(
+    "adk_model_first_chunk_seconds", "Streaming model calls: time to the first chunk (mostly prompt eval).", ("model",)
+)
+MODEL_PROMPT_TOKENS = REGISTRY.histogram(
+    "adk_model_prompt_tokens", "Prompt tokens per model call (Ollama prompt_eval_count).", ("model",), TOKEN_BUCKETS
+)
+MODEL_OUTPUT_TOKENS = REGISTRY.histogram(
+    "adk_model_output_tokens", "Generated tokens per model call (Ollama eval_count).", ("model",), TOKEN_BUCKETS
+)
+MODEL_ERRORS = REGISTRY.counter("adk_model_errors_total", "Model calls that failed or returned an error.", ("model",))
+MODEL_TRUNCATED = REGISTRY.counter(
+    "adk_model_truncated_total", "Model outputs that used all of their num_predict cap.", ("model",)
+)
+TOOL_SECONDS = REGISTRY.histogram(
+    "adk_tool_seconds", "Tool call time, before_tool to after_tool.", ("tool", "outcome")
+)
+PLUGIN_CALLBACK_SECONDS = REGISTRY.histogram(
+    "adk_plugin_callback_seconds", "Time spent in each plugin callback.", ("plugin", "callback")
+)
+OLLAMA_BACKEND_REQUESTS = REGISTRY.counter(
+    "adk_ollama_backend_requests_total", "Model calls routed to each Ollama backend.", ("backend", "outcome")
+)
+BRIDGE_RESPONSES = REGISTRY.counter(
+    "adk_bridge_responses_total", "Complete model responses seen by the Ollama tool-call bridge."
+)
+BRIDGE_REPAIRS = REGISTRY.counter(
+    "adk_bridge_repairs_total", "Bridge replies the model's tool call could not be used as-is.", ("kind",)
+)
+SERVE_QUEUE_SECONDS = REGISTRY.histogram(
+    "adk_serve_queue_seconds", "Serving mode: time a turn waited for its session and a global slot."
+)
+SERVE_REJECTED = REGISTRY.counter("adk_serve_rejected_total", "Serving mode: turns refused with 429/503.", ("reason",))
+SESSION_FLUSH_SECONDS = REGISTRY.histogram("adk_session_flush_seconds", "Session store write transactions.")
+SESSION_EVENTS_WRITTEN = REGISTRY.counter("adk_session_events_written_total", "Events written to the session store.")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass  # scrapes every few seconds would flood stderr
+
+
+def serve_metrics(port: int = METRICS_PORT, host: str = METRICS_HOST, registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """Serve `registry` at http://host:port/metrics from a daemon thread (port 0 picks a free one)."""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+class MetricsDumper:
+    """Rewrites `path` with the rendered registry every `interval` seconds, and once more on stop."""
+
+    def __init__(self, path: str, interval: float = METRICS_DUMP_INTERVAL, registry: Registry = REGISTRY) -> None:
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "MetricsDumper":
+        self._thread = threading.Thread(target=self._run, name="metrics-dump", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.dump()
+
+    def dump(self) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(f"# dumped at {time.time():.3f}\n")
+            f.write(self.registry.render())
+        os.replace(tmp, self.path)  # scrapers never see a half-written file
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_dumper: Optional[MetricsDumper] = None
+
+
+def start_exporters() -> None:
+    """Start the /metrics endpoint and the file dump if METRICS_PORT / METRICS_DUMP_PATH are set."""
+    global _server, _dumper
+    if METRICS_PORT and _server is None:
+        _server = serve_metrics()
+        log.event("metrics", msg="serving", url=f"http://{METRICS_HOST}:{_server.server_address[1]}/metrics")
+    if METRICS_DUMP_PATH and _dumper is None:
+        _dumper = MetricsDumper(METRICS_DUMP_PATH).start()
+
+
+def stop_exporters() -> None:
+    global _server, _dumper
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
+    if _dumper is not None:
+        _dumper.stop()
+        _dumper = None
@@ -0,0 +1,87 @@
+"""Ollama-specific request options and model warm-up.
+
+ADK's LiteLlm only forwards the generation settings it knows about, so
+per-request Ollama options such as `num_ctx` travel in `request_options`, a
+context variable that OllamaOptionsPlugin sets in before_model and
+`OllamaClient` (the model's LiteLLM client) merges into the completion call;
+LiteLLM passes them on in the request's `options`. The plugin runs in the
+same task as the model call, so concurrent sessions never see each other's
+values.
+
+`warm_up()` loads the model on every daemon before the first request (an
+empty `/api/generate`) and `OLLAMA_KEEP_ALIVE`, also sent with each request,
+keeps it loaded between requests.
+"""
+
+import asyncio
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Sequence
+
+import httpx
+from google.adk.models.lite_llm import LiteLLMClient
+
+from app.http_client import get_client
+from app.logs import log
+
+# How long Ollama keeps the model loaded after a request ("30m", "-1" = forever, "" = daemon default).
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "1") != "0"
+OLLAMA_WARMUP_TIMEOUT = float(os.getenv("OLLAMA_WARMUP_TIMEOUT", "120"))
+# Context sizes OllamaOptionsPlugin picks from (empty leaves num_ctx to the daemon); the first one is warmed.
+OLLAMA_NUM_CTX_BUCKETS = sorted(
+    int(size) for size in os.getenv("OLLAMA_NUM_CTX_BUCKETS", "2048,4096,8192,16384,32768").split(",") if size.strip()
+)
+
+request_options: ContextVar[Optional[Dict[str, Any]]] = ContextVar("ollama_request_options", default=None)
+
+
+def keep_alive_arg(value: str = OLLAMA_KEEP_ALIVE) -> Dict[str, Any]:
+    """LiteLlm kwargs for `keep_alive`; Ollama takes "-1" or a duration such as "30m"."""
+    if not value:
+        return {}
+    return {"keep_alive": int(value) if value.lstrip("-").isdigit() else value}
+
+
+class OllamaClient(LiteLLMClient):
+    """LiteLLM client that adds the options OllamaOptionsPlugin chose for this request."""
+
+    async def acompletion(self, model, messages, tools, **kwargs):
+        options = request_options.get()
+        if options:
+            kwargs = {**kwargs, **options}
+        return await super().acompletion(model, messages, tools, **kwargs)
+
+
+async def warm_up(
+    bases: Sequence[str],
+    model: str,
+    *,
+    keep_alive: str = OLLAMA_KEEP_ALIVE,
+    num_ctx: Optional[int] = None,
+    timeout: float = OLLAMA_WARMUP_TIMEOUT,
+) -> Dict[str, Optional[float]]:
+    """Load `model` on each daemon; seconds each took, or None where it failed.
+
+    Warm with the `num_ctx` the first requests will use: Ollama reloads the
+    model whenever it changes.
+    """
+    body: Dict[str, Any] = {"model": model, "prompt": "", "stream": False, **keep_alive_arg(keep_alive)}
+    if num_ctx:
+        body["options"] = {"num_ctx": num_ctx}
+
+    async def one(base: str) -> Optional[float]:
+        started = time.perf_counter()
+        try:
+            response = await get_client().post(f"{base}/api/generate", json=body, timeout=timeout)
+            response.raise_for_status()
+        except httpx.HTTPError as exc:
+            log.event("ollama-warmup", "WARNING", msg="failed", backend=base, model=model, error=str(exc) or type(exc).__name__)
+            return None
+        seconds = time.perf_counter() - started
+        log.event("ollama-warmup", msg="loaded", backend=base, model=model, seconds=round(seconds, 3))
+        return seconds
+
+    results = await asyncio.gather(*(one(base) for base in bases))
+    return dict(zip(bases, results))
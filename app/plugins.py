@@ -1,43 +1,199 @@
+import asyncio
+import copy
+import hashlib
 import json
-from typing import Any, Optional
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Sequence
 
+from google.adk.models.llm_response import LlmResponse
 from google.adk.plugins.base_plugin import BasePlugin
 from google.genai import types
 
+from app.agents import TOOL_NAMES, TOOLS
+from app.cache import CachePolicy, DiskCache, TTLCache
+from app import metrics
+from app.logs import log
+from app.ollama import OLLAMA_NUM_CTX_BUCKETS, request_options
+from app.tool_schema import SCHEMA_INSTRUCTION, reply_schema
+
 class LoggerPlugin(BasePlugin):
+    """Agent, model and tool lifecycle records for `app.logs.log`."""
+
     def __init__(self) -> None:
         super().__init__(name="logger")
 
     async def before_agent_callback(self, *, agent: Any, callback_context: Any) -> None:
         """Fires before the agent handles a message."""
-        sid = getattr(callback_context, "session_id", "")
-        uid = getattr(callback_context, "user_id", "")
-        rid = getattr(callback_context, "request_id", "")
-        print(f"[ADK][agent:start] {agent.name} | session_id={sid} user_id={uid} request_id={rid}")
+        log.event("agent:start", context=callback_context)
 
     async def after_model_callback(
         self, *, callback_context: Any, llm_response: Any
     ) -> None:
-        model = getattr(callback_context, "agent_name", "?")
-        finish = getattr(llm_response, "finish_reason", "?")
-        print(f"[ADK][model:after] agent={model} finish_reason={finish}")
+        if llm_response.partial:
+            return
+        log.event(
+            "model:after",
+            context=callback_context,
+            finish_reason=llm_response.finish_reason,
+            error_code=llm_response.error_code,
+        )
 
     async def after_agent_callback(self, *, agent: Any, callback_context: Any) -> None:
         """Fires after the agent produces a final response."""
-        sid = getattr(callback_context, "session_id", "")
-        uid = getattr(callback_context, "user_id", "")
-        rid = getattr(callback_context, "request_id", "")
-        print(f"[ADK][agent:end] {agent.name} | session_id={sid} user_id={uid} request_id={rid}")
+        log.event("agent:end", context=callback_context)
 
     async def before_tool_callback(
         self, *, tool: Any, tool_args: dict, tool_context: Any
     ) -> None:
-        print(f"[ADK][tool:start] {getattr(tool, 'name', tool)} args={tool_args}")
+        log.event("tool:start", context=tool_context, tool=getattr(tool, "name", tool), args=tool_args)
 
     async def after_tool_callback(
         self, *, tool: Any, tool_args: dict, tool_context: Any, result: dict
     ) -> None:
-        print(f"[ADK][tool:end] {getattr(tool, 'name', tool)} result={result}")
+        failed = isinstance(result, dict) and result.get("ok") is False
+        log.event(
+            "tool:end",
+            "WARNING" if failed else "INFO",
+            context=tool_context,
+            tool=getattr(tool, "name", tool),
+            result=result,
+        )
+
+
+# Sessions whose normalized history the bridge remembers (LRU beyond this).
+OLLAMA_BRIDGE_MAX_SESSIONS = int(os.getenv("OLLAMA_BRIDGE_MAX_SESSIONS", "1024"))
+
+
+def _content_fingerprint(content: Any) -> Hashable:
+    """Cheap identity for a history entry as ADK rebuilds it each turn."""
+    parts = []
+    for part in getattr(content, "parts", None) or []:
+        call = part.function_call
+        response = part.function_response
+        parts.append((
+            part.text,
+            call.name if call else None,
+            call.id if call else None,
+            response.name if response else None,
+            response.id if response else None,
+        ))
+    return getattr(content, "role", None), tuple(parts)
+
+
+def _json_payloads(text: str) -> Optional[list]:
+    """The JSON values in `text` when it holds nothing else, or None.
+
+    Accepts one object, a JSON array, or objects separated by commas or
+    whitespace (JSON lines).
+    """
+    text = text.strip()
+    if text.startswith("["):
+        try:
+            payload = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+        return payload if isinstance(payload, list) else None
+    decoder = json.JSONDecoder()
+    payloads = []
+    index = 0
+    while index < len(text):
+        if text[index].isspace() or text[index] == ",":
+            index += 1
+            continue
+        if text[index] != "{":
+            return None
+        try:
+            payload, index = decoder.raw_decode(text, index)
+        except json.JSONDecodeError:
+            return None
+        payloads.append(payload)
+    return payloads or None
+
+
+class _HistoryMark:
+    """Normalized prefix of a session's history, as of its last model call."""
+
+    __slots__ = ("count", "head", "tail", "contents")
+
+    def __init__(self, count: int, head: Hashable, tail: Hashable, contents: list) -> None:
+        self.count = count
+        self.head = head
+        self.tail = tail
+        self.contents = contents
+
+
+class _JsonObjectScanner:
+    """Finds complete top-level JSON objects in text that arrives in pieces.
+
+    Only the characters added by each `feed` are scanned, tracking brace depth
+    and string/escape state, so detecting a closed object costs O(chunk).
+    Objects may be wrapped in a JSON array or separated by commas or newlines;
+    `not_json` is set as soon as anything else appears between them.
+    """
+
+    def __init__(self) -> None:
+        self.text = ""
+        self.not_json = False
+        self._depth = 0
+        self._start = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> list[str]:
+        found = []
+        offset = len(self.text)
+        self.text += chunk
+        for i, ch in enumerate(chunk, offset):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif self._depth == 0:
+                if ch == "{":
+                    self._start = i
+                    self._depth = 1
+                elif not ch.isspace() and ch not in "[,]":
+                    self.not_json = True
+                    break
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    found.append(self.text[self._start:i + 1])
+        return found
+
+
+class _StreamScan:
+    """Progress through one streamed model response."""
+
+    __slots__ = ("scanner", "passthrough", "dispatched", "finished")
+
+    def __init__(self) -> None:
+        self.scanner = _JsonObjectScanner()
+        self.passthrough = False
+        self.dispatched = 0  # JSON objects already sent on as tool calls
+        self.finished = False  # the dispatched part ended the turn
+
+
+class _BridgeSession:
+    """Everything the bridge remembers about one conversation."""
+
+    __slots__ = ("last_tool_text", "history", "stream")
+
+    def __init__(self) -> None:
+        self.last_tool_text: Optional[str] = None
+        self.history: Optional[_HistoryMark] = None
+        self.stream: Optional[_StreamScan] = None
 
 
 class OllamaToolCallBridgePlugin(BasePlugin):
@@ -46,6 +202,13 @@ class OllamaToolCallBridgePlugin(BasePlugin):
     Some Ollama models emit `{"name": "...", "arguments": {...}}` as plain text
     instead of using the tool-calling protocol. This plugin converts those blobs
     into `FunctionCall` parts so ADK can execute the tool and continue the flow.
+
+    `responses` counts complete model responses and `repairs` (by kind) the
+    ones whose tool call could not be used: an unknown tool
+    (`unsupported_tool`), arguments that are not an object
+    (`malformed_arguments`) or unusable entries of a call list
+    (`dropped_entry`). Each of those costs the turn a wasted model call, which
+    OllamaOptionsPlugin's tool schema rules out.
     """
 
     def __init__(self, *, allowed_tool_names: Optional[set[str]] = None) -> None:
@@ -56,11 +219,22 @@ class OllamaToolCallBridgePlugin(BasePlugin):
             self._allowed_tool_names = {
                 name for name in allowed_tool_names if isinstance(name, str)
             }
-        self._last_tool_text: Optional[str] = None
+        # One shared plugin serves every session, so per-conversation state is
+        # keyed by session (LRU-bounded) rather than stored on the instance.
+        self._sessions: "OrderedDict[Hashable, _BridgeSession]" = OrderedDict()
+        self.responses = 0
+        self.repairs: dict[str, int] = {}
+
+    def _repaired(self, kind: str, **fields: Any) -> None:
+        self.repairs[kind] = self.repairs.get(kind, 0) + 1
+        metrics.BRIDGE_REPAIRS.inc(kind=kind)
+        log.event("ollama-bridge", "WARNING", msg="repaired tool call", kind=kind, **fields)
 
     async def before_model_callback(
         self, *, callback_context: Any, llm_request: Any
     ) -> None:
+        state = self._session_state(callback_context)
+        state.stream = None  # a new model call starts a new stream
         contents = getattr(llm_request, "contents", None)
         if not contents:
             return
@@ -73,63 +247,114 @@ class OllamaToolCallBridgePlugin(BasePlugin):
         if not allowed_names:
             return
 
-        for content in contents:
+        # ADK rebuilds the full history for every model call. Splice in the
+        # parts normalized on earlier calls and only convert what is new, so a
+        # session's total cost stays linear in its length.
+        head = _content_fingerprint(contents[0])
+        tail = _content_fingerprint(contents[-1])
+        start = 0
+        mark = state.history
+        if (
+            mark is not None
+            and mark.count <= len(contents)
+            and mark.head == head
+            and _content_fingerprint(contents[mark.count - 1]) == mark.tail
+        ):
+            contents[:mark.count] = mark.contents
+            start = mark.count
+
+        for content in contents[start:]:
             if not getattr(content, "parts", None):
                 continue
             new_parts = []
+            results = []
             content_mutated = False
             for part in content.parts:
                 replaced, keep_original, _ = self._maybe_convert_part(
-                    part, allowed_names, for_request=True
+                    part, allowed_names, for_request=True, state=state
                 )
                 if replaced is not None:
                     new_parts.append(replaced)
                     content_mutated = True
+                    if part.function_response:
+                        results.append(replaced)
                 elif keep_original:
                     new_parts.append(part)
                 else:
                     content_mutated = True
+            # Parallel calls answer in one content; LiteLLM joins its text
+            # parts with no separator, so end all but the last with a newline.
+            for result in results[:-1]:
+                result.text += "\n"
             if content_mutated:
                 content.parts = new_parts
 
+        state.history = _HistoryMark(len(contents), head, tail, list(contents))
+
     async def after_model_callback(
         self, *, callback_context: Any, llm_response: Any
     ) -> None:
+        state = self._session_state(callback_context)
+        if not getattr(llm_response, "partial", False):
+            self.responses += 1
+            metrics.BRIDGE_RESPONSES.inc()
+        if state.stream is not None and state.stream.dispatched:
+            # The first call(s) went out from earlier chunks of this stream.
+            # Hold the remaining chunks; LiteLLM's aggregated response carries
+            # any further calls, which are then dispatched together.
+            if getattr(llm_response, "partial", False):
+                llm_response.content = None
+            else:
+                self._dispatch_remaining_calls(callback_context, llm_response, state.stream)
+            return
         content = getattr(llm_response, "content", None)
         if not content or not content.parts:
             return
-        parts_desc = []
-        for idx, part in enumerate(content.parts):
-            if part.text:
-                parts_desc.append(f"{idx}:text={part.text[:80]!r}")
-            elif part.function_call:
-                parts_desc.append(f"{idx}:function_call={part.function_call.name}")
-            elif part.function_response:
-                parts_desc.append(f"{idx}:function_response={part.function_response.name}")
-            else:
-                parts_desc.append(f"{idx}:{type(part)}")
-        print(
-            "[ADK][ollama-bridge] received"
-            f" {len(content.parts)} part(s); finish={getattr(llm_response, 'finish_reason', None)};"
-            f" parts={'; '.join(parts_desc)}"
-        )
+        if getattr(llm_response, "partial", False):
+            self._scan_stream_chunk(callback_context, llm_response, state)
+            return
+        if log.enabled("DEBUG"):
+            parts_desc = []
+            for idx, part in enumerate(content.parts):
+                if part.text:
+                    parts_desc.append(f"{idx}:text={part.text[:80]!r}")
+                elif part.function_call:
+                    parts_desc.append(f"{idx}:function_call={part.function_call.name}")
+                elif part.function_response:
+                    parts_desc.append(f"{idx}:function_response={part.function_response.name}")
+                else:
+                    parts_desc.append(f"{idx}:{type(part)}")
+            log.event(
+                "ollama-bridge", "DEBUG", context=callback_context, msg="received",
+                finish_reason=llm_response.finish_reason, parts=parts_desc,
+            )
 
         allowed_names = (
             self._allowed_tool_names
             if self._allowed_tool_names is not None
             else self._derive_allowed_tool_names(callback_context)
         )
-        print(f"[ADK][ollama-bridge] allowed tool names: {allowed_names}")
         if not allowed_names:
-            print("[ADK][ollama-bridge] no allowed tool names; skipping conversion")
+            log.event("ollama-bridge", context=callback_context, msg="no allowed tool names; skipping conversion")
             return
 
         mutated = False
         new_parts = []
         finish_override = None
         for part in content.parts:
+            calls = self._split_tool_calls(part.text, allowed_names) if part.text else None
+            if calls is not None:
+                # Several calls in one part become separate FunctionCall parts,
+                # which ADK runs concurrently and answers in order.
+                new_parts.extend(calls)
+                mutated = True
+                log.event(
+                    "ollama-bridge", context=callback_context, msg="split tool calls",
+                    tools=[c.function_call.name for c in calls],
+                )
+                continue
             converted, keep_original, part_finish_override = self._maybe_convert_part(
-                part, allowed_names
+                part, allowed_names, state=state
             )
             if part_finish_override is not None:
                 finish_override = part_finish_override
@@ -137,12 +362,12 @@ class OllamaToolCallBridgePlugin(BasePlugin):
                 new_parts.append(converted)
                 mutated = True
                 part_desc = getattr(converted.function_call, "name", None) or getattr(converted, "text", "")
-                print(f"[ADK][ollama-bridge] converted part -> {part_desc!r}")
+                log.event("ollama-bridge", context=callback_context, msg="converted part", to=part_desc)
             elif keep_original:
                 new_parts.append(part)
             else:
                 mutated = True  # text part suppressed
-                print("[ADK][ollama-bridge] suppressed unsupported part")
+                log.event("ollama-bridge", context=callback_context, msg="suppressed unsupported part")
 
         if mutated:
             llm_response.content = types.Content(
@@ -153,18 +378,128 @@ class OllamaToolCallBridgePlugin(BasePlugin):
             llm_response.finish_reason = finish_override
             llm_response.partial = False
             llm_response.turn_complete = True
-            print(f"[ADK][ollama-bridge] forcing finish_reason={finish_override}")
+            log.event("ollama-bridge", "DEBUG", context=callback_context, msg="forcing finish", finish_reason=finish_override)
+
+    def _scan_stream_chunk(
+        self, callback_context: Any, llm_response: Any, state: _BridgeSession
+    ) -> None:
+        """Dispatch a plain-text JSON tool call as soon as its object closes.
+
+        While a streamed response looks like JSON its chunks are held back, so
+        raw tool-call text never reaches the user. Prose streams through as-is.
+        """
+        content = llm_response.content
+        text = "".join(part.text for part in content.parts if part.text)
+        if not text or any(part.function_call for part in content.parts):
+            return
+        scan = state.stream = state.stream or _StreamScan()
+        if scan.passthrough:
+            return
+        objects = scan.scanner.feed(text)
+        if scan.scanner.not_json:
+            self._release_stream_text(llm_response, scan)
+            return
+        if not objects:
+            llm_response.content = None
+            return
+
+        allowed_names = (
+            self._allowed_tool_names
+            if self._allowed_tool_names is not None
+            else self._derive_allowed_tool_names(callback_context)
+        )
+        calls = self._split_tool_calls("\n".join(objects), allowed_names or set()) if len(objects) > 1 else None
+        finish_override = None
+        if calls is not None:
+            parts, scan.dispatched = calls, len(objects)
+        else:
+            converted, _, finish_override = self._maybe_convert_part(
+                types.Part(text=objects[0]), allowed_names or set(), state=state
+            )
+            if converted is None:
+                self._release_stream_text(llm_response, scan)
+                return
+            parts, scan.dispatched = [converted], 1
+
+        llm_response.content = types.Content(role="model", parts=parts)
+        llm_response.partial = False
+        llm_response.custom_metadata = {**(llm_response.custom_metadata or {}), "ollama_bridge": "streamed_call"}
+        if finish_override is not None:
+            scan.finished = True
+            llm_response.finish_reason = finish_override
+            llm_response.turn_complete = True
+        part_desc = [getattr(part.function_call, "name", None) or part.text for part in parts]
+        log.event("ollama-bridge", context=callback_context, msg="streamed parts", to=part_desc)
+
+    def _dispatch_remaining_calls(
+        self, callback_context: Any, llm_response: Any, scan: _StreamScan
+    ) -> None:
+        """Turn the aggregated end of a stream into the calls not yet dispatched."""
+        content = getattr(llm_response, "content", None)
+        text = "".join(part.text for part in content.parts if part.text) if content and content.parts else ""
+        payloads = None if scan.finished else _json_payloads(text)
+        remaining = payloads[scan.dispatched:] if payloads else []
+        allowed_names = (
+            self._allowed_tool_names
+            if self._allowed_tool_names is not None
+            else self._derive_allowed_tool_names(callback_context)
+        )
+        calls = self._payloads_to_calls(remaining, allowed_names or set()) if remaining else []
+        if not calls:
+            llm_response.content = None
+            return
+        llm_response.content = types.Content(role="model", parts=calls)
+        llm_response.custom_metadata = {**(llm_response.custom_metadata or {}), "ollama_bridge": "streamed_call"}
+        log.event(
+            "ollama-bridge", context=callback_context, msg="streamed remaining calls",
+            tools=[c.function_call.name for c in calls],
+        )
+
+    def _split_tool_calls(self, text: str, allowed_names: set[str]) -> Optional[list[types.Part]]:
+        """FunctionCall parts when `text` is a JSON array or several JSON tool calls.
+
+        Returns None for a single object (left to `_maybe_convert_part`), for
+        text that is not purely JSON, and when no entry is an allowed call.
+        """
+        payloads = _json_payloads(text)
+        if payloads is None or (len(payloads) < 2 and not text.lstrip().startswith("[")):
+            return None
+        return self._payloads_to_calls(payloads, allowed_names) or None
+
+    def _payloads_to_calls(self, payloads: list, allowed_names: set[str]) -> list[types.Part]:
+        calls = []
+        for payload in payloads:
+            name = payload.get("name") if isinstance(payload, dict) else None
+            args = (payload.get("arguments") or {}) if isinstance(payload, dict) else None
+            if not isinstance(name, str) or name not in allowed_names or not isinstance(args, dict):
+                self._repaired("dropped_entry", entry=payload)
+                continue
+            calls.append(types.Part(function_call=types.FunctionCall(name=name, args=args, id=payload.get("id"))))
+        return calls
+
+    @staticmethod
+    def _release_stream_text(llm_response: Any, scan: _StreamScan) -> None:
+        scan.passthrough = True
+        llm_response.content = types.Content(
+            role="model", parts=[types.Part(text=scan.scanner.text)]
+        )
 
     def _maybe_convert_part(
-        self, part: types.Part, allowed_names: set[str], *, for_request: bool = False
+        self,
+        part: types.Part,
+        allowed_names: set[str],
+        *,
+        for_request: bool = False,
+        state: Optional[_BridgeSession] = None,
     ) -> tuple[Optional[types.Part], bool, Optional[types.FinishReason]]:
+        state = state or _BridgeSession()
         if part.function_call:
             if for_request:
                 return None, True, None
-            return self._handle_function_call_part(part, allowed_names)
+            return self._handle_function_call_part(part, allowed_names, state)
         if part.function_response:
             return self._handle_function_response_part(
-                part, allowed_names, for_request=for_request
+                part, allowed_names, state, for_request=for_request
             )
         if for_request:
             return None, True, None
@@ -190,6 +525,7 @@ class OllamaToolCallBridgePlugin(BasePlugin):
 
         args = payload.get("arguments", {}) or {}
         if not isinstance(args, dict):
+            self._repaired("malformed_arguments", tool=name)
             message = (
                 f"Ollama emitted malformed tool arguments for '{name}'; ignoring them."
             )
@@ -213,6 +549,7 @@ class OllamaToolCallBridgePlugin(BasePlugin):
             # No usable text; treat as unsupported tool below.
 
         if name not in allowed_names:
+            self._repaired("unsupported_tool", tool=name)
             if name in {"weather_report", "calc_result", "result"}:
                 message = "Finished."
                 return types.Part(text=message), False, types.FinishReason.STOP
@@ -229,7 +566,7 @@ class OllamaToolCallBridgePlugin(BasePlugin):
         return types.Part(function_call=call), False, None
 
     def _handle_function_call_part(
-        self, part: types.Part, allowed_names: set[str]
+        self, part: types.Part, allowed_names: set[str], state: _BridgeSession
     ) -> tuple[Optional[types.Part], bool, Optional[types.FinishReason]]:
         call = part.function_call
         if call is None or not call.name:
@@ -259,11 +596,12 @@ class OllamaToolCallBridgePlugin(BasePlugin):
                 except Exception:
                     text_payload = str(args)
                 return types.Part(text=text_payload), False, types.FinishReason.STOP
-            if self._last_tool_text:
-                return types.Part(text=self._last_tool_text), False, types.FinishReason.STOP
+            if state.last_tool_text:
+                return types.Part(text=state.last_tool_text), False, types.FinishReason.STOP
             # fall back to unsupported handling below
 
         if name not in allowed_names:
+            self._repaired("unsupported_tool", tool=name)
             if name in {"weather_report", "calc_result", "result"}:
                 message = "Finished."
                 return types.Part(text=message), False, types.FinishReason.STOP
@@ -274,7 +612,12 @@ class OllamaToolCallBridgePlugin(BasePlugin):
         return None, True, None
 
     def _handle_function_response_part(
-        self, part: types.Part, allowed_names: set[str], *, for_request: bool = False
+        self,
+        part: types.Part,
+        allowed_names: set[str],
+        state: _BridgeSession,
+        *,
+        for_request: bool = False,
     ) -> tuple[Optional[types.Part], bool, Optional[types.FinishReason]]:
         response = part.function_response
         if response is None or not response.name:
@@ -298,12 +641,37 @@ class OllamaToolCallBridgePlugin(BasePlugin):
         else:
             text_payload = str(payload)
 
-        print(f"[ADK][ollama-bridge] tool '{name}' response payload -> {text_payload!r}")
+        log.event("ollama-bridge", "DEBUG", msg="tool response payload", tool=name, payload=text_payload)
         final_text = f"{name} result: {text_payload}"
-        self._last_tool_text = final_text
+        state.last_tool_text = final_text
         finish = None if for_request else types.FinishReason.STOP
         return types.Part(text=final_text), False, finish
 
+    @staticmethod
+    def _session_key(callback_context: Any) -> Optional[Hashable]:
+        session = getattr(callback_context, "session", None)
+        session_id = getattr(session, "id", None)
+        if session_id:
+            return getattr(session, "app_name", None), getattr(session, "user_id", None), session_id
+        invocation_id = getattr(callback_context, "invocation_id", None)
+        if invocation_id:
+            return ("invocation", invocation_id)
+        return None
+
+    def _session_state(self, callback_context: Any) -> _BridgeSession:
+        key = self._session_key(callback_context)
+        if key is None:
+            # Nothing to scope by: use throwaway state rather than risk sharing.
+            return _BridgeSession()
+        state = self._sessions.get(key)
+        if state is None:
+            state = self._sessions[key] = _BridgeSession()
+            while len(self._sessions) > OLLAMA_BRIDGE_MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(key)
+        return state
+
     def _derive_allowed_tool_names(self, callback_context: Any) -> set[str]:
         agent = getattr(callback_context, "agent", None)
         tools = getattr(agent, "tools", None)
@@ -319,3 +687,728 @@ class OllamaToolCallBridgePlugin(BasePlugin):
             if isinstance(candidate, str):
                 names.add(candidate)
         return names
+
+
+# Token budget for one model request, system instruction and tools included.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+# Most recent user turns that are always sent untouched.
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "2"))
+# Length an old tool result is shrunk to when over budget.
+CONTEXT_TOOL_RESULT_CHARS = int(os.getenv("CONTEXT_TOOL_RESULT_CHARS", "400"))
+CONTEXT_CHARS_PER_TOKEN = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "4"))
+
+# How OllamaToolCallBridgePlugin renders a tool result for the model.
+_BRIDGED_RESULT = re.compile(r"(\w+) result: ")
+_SUPERSEDED = "[superseded by a later call with the same arguments]"
+
+
+def _dumps(value: Any) -> str:
+    try:
+        return json.dumps(value, ensure_ascii=False, default=str)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _part_chars(part: Any) -> int:
+    if part.text:
+        return len(part.text)
+    if part.function_call:
+        return len(part.function_call.name or "") + len(_dumps(part.function_call.args))
+    if part.function_response:
+        return len(part.function_response.name or "") + len(_dumps(part.function_response.response))
+    return 0
+
+
+def _content_chars(content: Any) -> int:
+    return sum(_part_chars(part) for part in getattr(content, "parts", None) or [])
+
+
+def _tool_result(part: Any) -> Optional[tuple[str, str]]:
+    """(tool name, payload text) of a tool result, structured or bridged to text."""
+    if part.function_response:
+        return part.function_response.name or "", _dumps(part.function_response.response)
+    if part.text:
+        match = _BRIDGED_RESULT.match(part.text)
+        if match:
+            return match.group(1), part.text[match.end():]
+    return None
+
+
+def _starts_user_turn(content: Any) -> bool:
+    if getattr(content, "role", None) != "user" or not content.parts:
+        return False
+    return all(part.text and _tool_result(part) is None for part in content.parts)
+
+
+def _outline(value: Any, depth: int = 0) -> Any:
+    """Keep a JSON value's shape but not its bulk."""
+    if isinstance(value, dict):
+        if depth >= 2:
+            return f"{{{len(value)} keys}}"
+        return {key: _outline(item, depth + 1) for key, item in value.items()}
+    if isinstance(value, list):
+        if depth >= 2:
+            return f"[{len(value)} items]"
+        if len(value) > 3:
+            return [_outline(value[0], depth + 1), f"... {len(value) - 1} more items"]
+        return [_outline(item, depth + 1) for item in value]
+    if isinstance(value, str) and len(value) > 80:
+        return value[:80] + "..."
+    return value
+
+
+def _shrink_payload(text: str, limit: int) -> str:
+    try:
+        value = json.loads(text)
+    except ValueError:
+        value = None
+    if isinstance(value, (dict, list)):
+        text = _dumps(_outline(value))
+    if len(text) > limit:
+        text = f"{text[:limit]}... [{len(text) - limit} chars truncated]"
+    return text
+
+
+def _replace_results(content: Any, payloads: dict[int, str]) -> types.Content:
+    """A copy of `content` with the tool results at the given part indexes replaced."""
+    parts = list(content.parts)
+    for index, payload in payloads.items():
+        part = parts[index]
+        if part.function_response:
+            response = part.function_response
+            parts[index] = types.Part(
+                function_response=types.FunctionResponse(
+                    name=response.name, id=response.id, response={"result": payload}
+                )
+            )
+        else:
+            name, _ = _tool_result(part)
+            separator = part.text[len(part.text.rstrip()):]
+            parts[index] = types.Part(text=f"{name} result: {payload}{separator}")
+    return types.Content(role=content.role, parts=parts)
+
+
+class ContextBudgetPlugin(BasePlugin):
+    """Keeps each model request under a token budget.
+
+    Runs after OllamaToolCallBridgePlugin, so tool results are either
+    structured parts or the bridge's "<tool> result: ..." text. Over budget it
+    first stubs out results superseded by a later identical call, then shrinks
+    old results to an outline, then drops the oldest whole turns. The system
+    instruction and the last `keep_turns` user turns are never touched, and
+    history entries are replaced rather than edited, so the bridge's cached
+    copies stay intact. Tokens are estimated from characters.
+    """
+
+    def __init__(
+        self,
+        *,
+        budget: int = CONTEXT_TOKEN_BUDGET,
+        keep_turns: int = CONTEXT_KEEP_TURNS,
+        tool_result_chars: int = CONTEXT_TOOL_RESULT_CHARS,
+        chars_per_token: float = CONTEXT_CHARS_PER_TOKEN,
+    ) -> None:
+        super().__init__(name="context_budget")
+        self.budget = budget
+        self.keep_turns = keep_turns
+        self.tool_result_chars = tool_result_chars
+        self.chars_per_token = chars_per_token
+        self.tokens_saved = 0
+
+    def _tokens(self, chars: int) -> int:
+        return math.ceil(chars / self.chars_per_token)
+
+    async def before_model_callback(
+        self, *, callback_context: Any, llm_request: Any
+    ) -> None:
+        contents = getattr(llm_request, "contents", None)
+        if not contents or self.budget <= 0:
+            return
+        sizes = [_content_chars(content) for content in contents]
+        fixed = self._fixed_chars(llm_request)
+        limit = self.budget * self.chars_per_token
+        before = fixed + sum(sizes)
+        if before <= limit:
+            return
+
+        turn_starts = [i for i, content in enumerate(contents) if _starts_user_turn(content)]
+        if self.keep_turns <= 0:
+            protected = len(contents)
+        elif len(turn_starts) > self.keep_turns:
+            protected = turn_starts[-self.keep_turns]
+        else:
+            return  # everything left is recent enough to keep
+
+        counts = {"superseded": 0, "shrunk": 0, "dropped": 0}
+        results = self._tool_results(contents)
+
+        def rewrite(index: int, payloads: dict[int, str]) -> None:
+            contents[index] = _replace_results(contents[index], payloads)
+            sizes[index] = _content_chars(contents[index])
+
+        # 1. Results repeated later with the same arguments carry nothing new.
+        seen_later: set = set()
+        superseded: dict[int, dict[int, str]] = {}
+        for index, part_index, key, _ in reversed(results):
+            if key in seen_later and index < protected:
+                superseded.setdefault(index, {})[part_index] = _SUPERSEDED
+            if key[1] is not None:
+                seen_later.add(key)
+        for index, payloads in superseded.items():
+            rewrite(index, payloads)
+            counts["superseded"] += len(payloads)
+
+        # 2. Shrink the remaining old results, oldest first.
+        for index, part_index, _, payload in results:
+            if fixed + sum(sizes) <= limit or index >= protected:
+                break
+            if part_index in superseded.get(index, {}) or len(payload) <= self.tool_result_chars:
+                continue
+            rewrite(index, {part_index: _shrink_payload(payload, self.tool_result_chars)})
+            counts["shrunk"] += 1
+
+        # 3. Drop the oldest whole turns until the request fits.
+        cut = 0
+        for start in turn_starts:
+            if start > protected or fixed + sum(sizes[cut:]) <= limit:
+                break
+            cut = start
+        if cut:
+            counts["dropped"] = cut
+            note = types.Content(
+                role="user",
+                parts=[types.Part(text=f"[{cut} earlier messages omitted to fit the context window]")],
+            )
+            contents[:cut] = [note]
+            sizes[:cut] = [_content_chars(note)]
+
+        after = fixed + sum(sizes)
+        saved = self._tokens(before) - self._tokens(after)
+        self.tokens_saved += saved
+        log.event(
+            "context-budget",
+            context=callback_context,
+            tokens_before=self._tokens(before),
+            tokens_after=self._tokens(after),
+            tokens_saved=saved,
+            budget=self.budget,
+            **counts,
+        )
+
+    @staticmethod
+    def _tool_results(contents: list) -> list[tuple[int, int, tuple, str]]:
+        """(content index, part index, (tool, args), payload) for every tool result.
+
+        Results are paired with the oldest unanswered call of the same tool to
+        recover their arguments; bridged text results carry no call id.
+        """
+        pending: dict[str, list[str]] = {}
+        results = []
+        for index, content in enumerate(contents):
+            for part_index, part in enumerate(getattr(content, "parts", None) or []):
+                if part.function_call:
+                    call = part.function_call
+                    args = json.dumps(call.args or {}, sort_keys=True, default=str)
+                    pending.setdefault(call.name or "", []).append(args)
+                    continue
+                result = _tool_result(part)
+                if result is None:
+                    continue
+                name, payload = result
+                calls = pending.get(name)
+                results.append((index, part_index, (name, calls.pop(0) if calls else None), payload))
+        return results
+
+    @staticmethod
+    def _fixed_chars(llm_request: Any) -> int:
+        config = getattr(llm_request, "config", None)
+        if config is None:
+            return 0
+        chars = 0
+        instruction = getattr(config, "system_instruction", None)
+        if isinstance(instruction, str):
+            chars += len(instruction)
+        elif instruction is not None:
+            chars += _content_chars(instruction)
+        for tool in getattr(config, "tools", None) or []:
+            dump = getattr(tool, "model_dump_json", None)
+            chars += len(dump(exclude_none=True)) if dump else len(str(tool))
+        return chars
+
+
+
+# Headroom over the estimated prompt when sizing num_ctx, as a fraction of it.
+OLLAMA_NUM_CTX_HEADROOM = float(os.getenv("OLLAMA_NUM_CTX_HEADROOM", "0.25"))
+# Seconds a larger context is kept before stepping down (each change reloads the model).
+OLLAMA_NUM_CTX_HOLD = float(os.getenv("OLLAMA_NUM_CTX_HOLD", "300"))
+# num_predict for requests that offer tools (0 = uncapped).
+OLLAMA_TOOL_NUM_PREDICT = int(os.getenv("OLLAMA_TOOL_NUM_PREDICT", "512"))
+# Constrain replies to requests that offer tools with a JSON schema of the tools (Ollama `format`).
+OLLAMA_TOOL_SCHEMA = os.getenv("OLLAMA_TOOL_SCHEMA", "0").lower() in {"1", "true", "yes"}
+
+
+class OllamaOptionsPlugin(BasePlugin):
+    """Sizes Ollama's context window and output cap to each request.
+
+    Runs after ContextBudgetPlugin, on the request that will actually be sent.
+    `num_ctx` becomes the smallest bucket that holds the estimated prompt plus
+    headroom and the output cap, instead of the daemon default whatever the
+    prompt; a smaller window means less KV memory and faster prompt
+    evaluation. Ollama reloads the model whenever num_ctx changes, so buckets
+    are coarse and a larger one is held for `hold` seconds before stepping
+    down. Requests that offer tools get `num_predict` capped at
+    `tool_num_predict` (a tool call or a concise answer); outputs that hit the
+    cap are counted in adk_model_truncated_total. With `tool_schema`, those
+    requests also carry app.tool_schema's reply schema as Ollama's `format`,
+    so every reply is a valid call or a final answer (see the bridge's
+    `repairs` for what that saves). num_predict goes through the request
+    config, num_ctx and format through app.ollama.request_options.
+    """
+
+    def __init__(
+        self,
+        *,
+        buckets: Sequence[int] = tuple(OLLAMA_NUM_CTX_BUCKETS),
+        headroom: float = OLLAMA_NUM_CTX_HEADROOM,
+        hold: float = OLLAMA_NUM_CTX_HOLD,
+        tool_num_predict: int = OLLAMA_TOOL_NUM_PREDICT,
+        tool_schema: bool = OLLAMA_TOOL_SCHEMA,
+        tools: Sequence[Callable[..., Any]] = TOOLS,
+        chars_per_token: float = CONTEXT_CHARS_PER_TOKEN,
+    ) -> None:
+        super().__init__(name="ollama_options")
+        self.buckets = sorted(buckets)
+        self.headroom = headroom
+        self.hold = hold
+        self.tool_num_predict = tool_num_predict
+        self.tool_schema = tool_schema
+        self._functions = {tool.__name__: tool for tool in tools}
+        self._schemas: dict[tuple, dict] = {}  # tool names -> reply schema
+        self.chars_per_token = chars_per_token
+        self.num_ctx = 0
+        self._held_until = 0.0
+        self.truncated = 0
+        self._caps: dict[str, tuple[int, str]] = {}  # invocation id -> (num_predict cap, model)
+
+    def size(self, tokens: int) -> Optional[int]:
+        """The num_ctx for a request needing `tokens` (prompt estimate plus output)."""
+        if not self.buckets:
+            return None
+        bucket = next((b for b in self.buckets if b >= tokens), self.buckets[-1])
+        now = time.monotonic()
+        if bucket >= self.num_ctx or now >= self._held_until:
+            if bucket != self.num_ctx:
+                log.event("ollama-options", msg="num_ctx changed", num_ctx=bucket, previous=self.num_ctx or None)
+            self.num_ctx = bucket
+            self._held_until = now + self.hold
+        return self.num_ctx
+
+    def _reply_schema(self, declarations: list) -> dict:
+        key = tuple(declaration.name for declaration in declarations)
+        schema = self._schemas.get(key)
+        if schema is None:
+            schema = self._schemas[key] = reply_schema(declarations, self._functions)
+        return schema
+
+    async def before_model_callback(self, *, callback_context: Any, llm_request: Any) -> None:
+        config = getattr(llm_request, "config", None)
+        options: dict[str, Any] = {}
+        declarations = [
+            declaration
+            for tool in (getattr(config, "tools", None) or [])
+            for declaration in (getattr(tool, "function_declarations", None) or [])
+        ]
+        if self.tool_schema and declarations:
+            options["format"] = self._reply_schema(declarations)
+            llm_request.append_instructions([SCHEMA_INSTRUCTION])
+        if self.tool_num_predict > 0 and config is not None and config.tools and not config.max_output_tokens:
+            config.max_output_tokens = self.tool_num_predict
+            self._caps[callback_context.invocation_id] = (self.tool_num_predict, getattr(llm_request, "model", None) or "?")
+        chars = ContextBudgetPlugin._fixed_chars(llm_request)
+        chars += sum(_content_chars(content) for content in getattr(llm_request, "contents", None) or [])
+        prompt = math.ceil(chars / self.chars_per_token)
+        output = (config.max_output_tokens if config is not None else None) or 0
+        num_ctx = self.size(math.ceil(prompt * (1 + self.headroom)) + output)
+        if num_ctx is not None and prompt + output > num_ctx:
+            log.event(
+                "ollama-options", "WARNING", context=callback_context,
+                msg="prompt exceeds the largest num_ctx; Ollama will truncate it", tokens=prompt, num_ctx=num_ctx,
+            )
+        if num_ctx is not None:
+            options["num_ctx"] = num_ctx
+        request_options.set(options or None)
+
+    async def after_model_callback(self, *, callback_context: Any, llm_response: Any) -> None:
+        if llm_response.partial:
+            return
+        entry = self._caps.pop(callback_context.invocation_id, None)
+        usage = llm_response.usage_metadata
+        if entry is None or usage is None or (usage.candidates_token_count or 0) < entry[0]:
+            return
+        cap, model = entry
+        self.truncated += 1
+        metrics.MODEL_TRUNCATED.inc(model=model)
+        log.event("ollama-options", "WARNING", context=callback_context, msg="output hit num_predict", num_predict=cap)
+
+    async def after_agent_callback(self, *, agent: Any, callback_context: Any) -> None:
+        # A response cache hit skips after_model.
+        self._caps.pop(callback_context.invocation_id, None)
+
+
+# Responses kept in memory (0 disables the cache) and how long they stay valid.
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "256"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+# Optional SQLite file that keeps responses across restarts.
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")
+# Skip lookups (fresh responses are still stored) for every request...
+LLM_CACHE_BYPASS = os.getenv("LLM_CACHE_BYPASS", "0").lower() in {"1", "true", "yes"}
+# ...or for one session, by setting this state key.
+LLM_CACHE_BYPASS_STATE = "llm_cache_bypass"
+
+# Config fields that do not change what the model says.
+_CONFIG_NOT_KEYED = {"labels", "http_options"}
+
+
+def _strip_call_ids(content: Optional[dict]) -> Optional[dict]:
+    """Drop function call/response ids from a dumped Content; ADK makes them per session."""
+    if not content:
+        return content
+    parts = []
+    for part in content.get("parts", []):
+        part = dict(part)
+        for field in ("function_call", "function_response"):
+            if field in part:
+                part[field] = {key: value for key, value in part[field].items() if key != "id"}
+        parts.append(part)
+    return {**content, "parts": parts}
+
+
+def llm_request_key(llm_request: Any) -> str:
+    """`<model>:<sha256>` of the model, config (instruction, tools) and contents."""
+    model = getattr(llm_request, "model", None) or ""
+    config = getattr(llm_request, "config", None)
+    normalized = {
+        "config": config.model_dump(mode="json", exclude_none=True, exclude=_CONFIG_NOT_KEYED) if config else None,
+        "contents": [
+            _strip_call_ids(content.model_dump(mode="json", exclude_none=True))
+            for content in getattr(llm_request, "contents", None) or []
+        ],
+    }
+    digest = hashlib.sha256(json.dumps(normalized, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+    return f"{model}:{digest}"
+
+
+class LlmResponseCachePlugin(BasePlugin):
+    """Answers repeated model requests from a cache instead of calling LiteLLM.
+
+    The key is a hash of the final request, so register this after the plugins
+    that rewrite it (bridge, context budget); its after_model_callback then sees
+    the bridge's converted tool calls. On a hit `before_model_callback` returns
+    the stored response and the model is never called. Only complete,
+    error-free responses are stored; tool calls the bridge dispatched from the
+    middle of a stream are not, since they may be only some of the turn's calls.
+    """
+
+    def __init__(
+        self,
+        *,
+        maxsize: int = LLM_CACHE_SIZE,
+        ttl: float = LLM_CACHE_TTL,
+        path: str = LLM_CACHE_PATH,
+        bypass: bool = LLM_CACHE_BYPASS,
+    ) -> None:
+        super().__init__(name="llm_response_cache")
+        self.cache = TTLCache(
+            maxsize=maxsize,
+            ttl=ttl,
+            disk=DiskCache(path, maxsize=maxsize * 10) if path and maxsize > 0 else None,
+        )
+        self.enabled = maxsize > 0
+        self.bypass = bypass
+        self.seconds_saved = 0.0
+        # invocation id -> (key, started); an invocation makes one model call at a time.
+        self._pending: dict[Hashable, tuple[str, float]] = {}
+
+    def invalidate(self, model: Optional[str] = None) -> None:
+        """Forget cached responses for `model`, or for every model."""
+        self.cache.invalidate(f"{model}:" if model else "")
+
+    def _bypassed(self, callback_context: Any) -> bool:
+        if self.bypass:
+            return True
+        state = getattr(callback_context, "state", None)
+        return bool(state is not None and state.get(LLM_CACHE_BYPASS_STATE))
+
+    async def before_model_callback(
+        self, *, callback_context: Any, llm_request: Any
+    ) -> Optional[LlmResponse]:
+        if not self.enabled or not getattr(llm_request, "contents", None):
+            return None
+        key = llm_request_key(llm_request)
+        invocation = getattr(callback_context, "invocation_id", None)
+        if not self._bypassed(callback_context):
+            entry = self.cache.get(key)
+            if entry is not None:
+                self._pending.pop(invocation, None)
+                self.seconds_saved += entry["seconds"]
+                stats = self.cache.stats()
+                log.event(
+                    "llm-cache", context=callback_context, msg="hit", key=key[-12:],
+                    seconds_saved=entry["seconds"], hit_rate=stats["hit_rate"],
+                )
+                response = LlmResponse.model_validate(entry["response"])
+                response.custom_metadata = {**(response.custom_metadata or {}), "llm_cache": "hit"}
+                return response
+        self._pending[invocation] = (key, time.perf_counter())
+        return None
+
+    async def after_model_callback(
+        self, *, callback_context: Any, llm_response: Any
+    ) -> None:
+        invocation = getattr(callback_context, "invocation_id", None)
+        if invocation not in self._pending or getattr(llm_response, "partial", False):
+            return
+        key, started = self._pending.pop(invocation)
+        content = getattr(llm_response, "content", None)
+        if not content or not content.parts or getattr(llm_response, "error_code", None):
+            return
+        if (llm_response.custom_metadata or {}).get("ollama_bridge") == "streamed_call":
+            return  # only part of the calls in this stream; replaying it would drop the rest
+        stored = llm_response.model_dump(
+            mode="json", exclude_none=True, exclude={"usage_metadata", "custom_metadata"}
+        )
+        stored["content"] = _strip_call_ids(stored["content"])
+        self.cache.set(key, {"response": stored, "seconds": round(time.perf_counter() - started, 4)})
+        log.event("llm-cache", context=callback_context, msg="stored", key=key[-12:], size=len(self.cache))
+
+    async def on_model_error_callback(self, *, callback_context: Any, llm_request: Any, error: Exception) -> None:
+        self._pending.pop(getattr(callback_context, "invocation_id", None), None)
+
+    async def after_agent_callback(self, *, agent: Any, callback_context: Any) -> None:
+        # A turn cut short (cancelled, or a plugin answering after_model) never reaches after_model.
+        self._pending.pop(getattr(callback_context, "invocation_id", None), None)
+
+
+# Tool results kept (0 disables the cache) and how long "pure" results stay valid.
+TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "1024"))
+TOOL_CACHE_PURE_TTL = float(os.getenv("TOOL_CACHE_PURE_TTL", "86400"))
+# Longest an identical call waits for a running one before running itself.
+TOOL_CACHE_JOIN_TIMEOUT = float(os.getenv("TOOL_CACHE_JOIN_TIMEOUT", "60"))
+
+
+def _tool_cache_key(name: str, args: dict) -> str:
+    return f"{name}:{json.dumps(args, sort_keys=True, default=str)}"
+
+
+class ToolResultCachePlugin(BasePlugin):
+    """Reuses tool results according to each tool's declared CachePolicy.
+
+    Tools opt in with `@cache_policy(...)` (app/cache.py); tools without one
+    always run. A repeated call with the same arguments is answered by
+    `before_tool_callback` without running the tool, and identical calls that
+    overlap wait for the first one instead of running again. If the first
+    call's task ends without a result (cancelled, e.g. a client went away),
+    the waiters run the tool themselves; they never wait longer than
+    `join_timeout`. Failed results (`ok` is False) are never stored.
+    """
+
+    def __init__(
+        self,
+        *,
+        maxsize: int = TOOL_CACHE_SIZE,
+        pure_ttl: float = TOOL_CACHE_PURE_TTL,
+        join_timeout: float = TOOL_CACHE_JOIN_TIMEOUT,
+    ) -> None:
+        super().__init__(name="tool_result_cache")
+        self.cache = TTLCache(maxsize=maxsize, ttl=pure_ttl)
+        self.enabled = maxsize > 0
+        self.pure_ttl = pure_ttl
+        self.join_timeout = join_timeout
+        # function call id -> cache key, for calls that are running the tool.
+        self._pending: dict[str, str] = {}
+        self._inflight: dict[str, "asyncio.Future[Any]"] = {}
+
+    @staticmethod
+    def _policy(tool: Any) -> Optional[CachePolicy]:
+        return getattr(getattr(tool, "func", None), "cache_policy", None)
+
+    async def before_tool_callback(
+        self, *, tool: Any, tool_args: dict, tool_context: Any
+    ) -> Optional[Any]:
+        if not self.enabled or self._policy(tool) is None:
+            return None
+        key = _tool_cache_key(tool.name, tool_args)
+        result = self.cache.peek(key)
+        if result is not None:
+            self.cache.hits += 1
+            stats = self.cache.stats()
+            log.event("tool-cache", context=tool_context, msg="hit", tool=tool.name, hit_rate=stats["hit_rate"])
+            return copy.deepcopy(result)
+        running = self._inflight.get(key)
+        if running is not None:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(running), self.join_timeout)
+            except asyncio.TimeoutError:
+                self._release(key, None, running)  # stale: let the next identical call lead
+                log.event("tool-cache", "WARNING", context=tool_context, msg="gave up waiting for a running call", tool=tool.name)
+                result = None
+            if result is not None:
+                self.cache.coalesced += 1
+                log.event("tool-cache", context=tool_context, msg="joined a running call", tool=tool.name)
+                return copy.deepcopy(result)
+            return None  # the first call failed; run this one normally
+        self.cache.misses += 1
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        call_id = tool_context.function_call_id
+        self._pending[call_id] = key
+        task = asyncio.current_task()
+        if task is not None:
+            # after_tool / on_tool_error never run for a cancelled call; release its waiters when its task ends.
+            task.add_done_callback(lambda _: self._abandon(call_id, key, future))
+        return None
+
+    async def after_tool_callback(
+        self, *, tool: Any, tool_args: dict, tool_context: Any, result: Any
+    ) -> None:
+        key = self._pending.pop(tool_context.function_call_id, None)
+        if key is None:
+            return  # served from the cache, or not cacheable
+        reusable = not (isinstance(result, dict) and result.get("ok") is False)
+        if reusable:
+            lifetime = self._policy(tool).lifetime(tool_args, result, pure_ttl=self.pure_ttl)
+            self.cache.set(key, copy.deepcopy(result), ttl=lifetime)
+        self._release(key, result if reusable else None)
+
+    async def on_tool_error_callback(
+        self, *, tool: Any, tool_args: dict, tool_context: Any, error: Exception
+    ) -> None:
+        key = self._pending.pop(tool_context.function_call_id, None)
+        if key is not None:
+            self._release(key, None)
+
+    def _release(self, key: str, result: Any, future: Optional["asyncio.Future[Any]"] = None) -> None:
+        """Resolve the running call for `key` (only if it is still `future`, when given)."""
+        waiter = self._inflight.get(key)
+        if waiter is None or (future is not None and waiter is not future):
+            return
+        del self._inflight[key]
+        if not waiter.done():
+            waiter.set_result(result)
+
+    def _abandon(self, call_id: str, key: str, future: "asyncio.Future[Any]") -> None:
+        if future.done():
+            return
+        if self._pending.get(call_id) == key:
+            del self._pending[call_id]
+        self._release(key, None, future)
+
+
+_PLUGIN_CALLBACKS = tuple(name for name in vars(BasePlugin) if name.endswith("_callback"))
+
+
+class MetricsPlugin(BasePlugin):
+    """Latency and token histograms for agents, model calls and tools (`app.metrics`).
+
+    Put it first so model time includes the other plugins' request handling.
+    `instrument(plugin)` additionally times each callback another plugin
+    overrides, under adk_plugin_callback_seconds{plugin, callback}.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(name="metrics")
+        self._agents: dict[tuple, float] = {}
+        self._models: dict[str, list] = {}  # invocation id -> [model, started, first chunk]
+        self._tools: dict[str, float] = {}
+
+    @staticmethod
+    def instrument(plugin: BasePlugin) -> BasePlugin:
+        for callback in _PLUGIN_CALLBACKS:
+            if getattr(type(plugin), callback) is getattr(BasePlugin, callback):
+                continue
+            original = getattr(plugin, callback)
+
+            async def timed(*args: Any, _original: Any = original, _callback: str = callback, **kwargs: Any) -> Any:
+                started = time.perf_counter()
+                try:
+                    return await _original(*args, **kwargs)
+                finally:
+                    metrics.PLUGIN_CALLBACK_SECONDS.observe(
+                        time.perf_counter() - started, plugin=plugin.name, callback=_callback
+                    )
+
+            setattr(plugin, callback, timed)
+        return plugin
+
+    async def before_agent_callback(self, *, agent: Any, callback_context: Any) -> None:
+        self._agents[(callback_context.invocation_id, agent.name)] = time.perf_counter()
+
+    async def after_agent_callback(self, *, agent: Any, callback_context: Any) -> None:
+        started = self._agents.pop((callback_context.invocation_id, agent.name), None)
+        if started is not None:
+            metrics.AGENT_SECONDS.observe(time.perf_counter() - started, agent=agent.name)
+        # A response cache hit skips after_model; forget the call it started.
+        self._models.pop(callback_context.invocation_id, None)
+
+    async def before_model_callback(self, *, callback_context: Any, llm_request: Any) -> None:
+        model = getattr(llm_request, "model", None) or "?"
+        self._models[callback_context.invocation_id] = [model, time.perf_counter(), None]
+
+    async def after_model_callback(self, *, callback_context: Any, llm_response: Any) -> None:
+        entry = self._models.get(callback_context.invocation_id)
+        if entry is None:
+            return
+        model, started, first_chunk = entry
+        now = time.perf_counter()
+        if llm_response.partial:
+            if first_chunk is None:
+                entry[2] = now
+            return
+        del self._models[callback_context.invocation_id]
+        metrics.MODEL_SECONDS.observe(now - started, model=model)
+        if first_chunk is not None:
+            metrics.MODEL_FIRST_CHUNK_SECONDS.observe(first_chunk - started, model=model)
+        usage = llm_response.usage_metadata
+        if usage is not None:
+            metrics.MODEL_PROMPT_TOKENS.observe(usage.prompt_token_count or 0, model=model)
+            metrics.MODEL_OUTPUT_TOKENS.observe(usage.candidates_token_count or 0, model=model)
+        if llm_response.error_code:
+            metrics.MODEL_ERRORS.inc(model=model)
+
+    async def on_model_error_callback(self, *, callback_context: Any, llm_request: Any, error: Exception) -> None:
+        entry = self._models.pop(callback_context.invocation_id, None)
+        metrics.MODEL_ERRORS.inc(model=entry[0] if entry else getattr(llm_request, "model", None) or "?")
+
+    async def before_tool_callback(self, *, tool: Any, tool_args: dict, tool_context: Any) -> None:
+        self._tools[tool_context.function_call_id] = time.perf_counter()
+
+    async def after_tool_callback(self, *, tool: Any, tool_args: dict, tool_context: Any, result: Any) -> None:
+        failed = isinstance(result, dict) and result.get("ok") is False
+        self._observe_tool(tool, tool_context, "error" if failed else "ok")
+
+    async def on_tool_error_callback(self, *, tool: Any, tool_args: dict, tool_context: Any, error: Exception) -> None:
+        self._observe_tool(tool, tool_context, "exception")
+
+    def _observe_tool(self, tool: Any, tool_context: Any, outcome: str) -> None:
+        started = self._tools.pop(tool_context.function_call_id, None)
+        if started is not None:
+            metrics.TOOL_SECONDS.observe(time.perf_counter() - started, tool=tool.name, outcome=outcome)
+
+
+def default_plugins() -> list[BasePlugin]:
+    """The plugin chain shared by the CLI, the server and `adk web`, in the order it must run.
+
+    Metrics first, so it times the rest; the bridge before the context budget,
+    which must see converted tool calls; the LLM cache after both, since it keys
+    on the final request, and before the logger.
+    """
+    return [
+        MetricsPlugin(),
+        *map(MetricsPlugin.instrument, [
+            OllamaToolCallBridgePlugin(allowed_tool_names=TOOL_NAMES),
+            ContextBudgetPlugin(),
+            OllamaOptionsPlugin(),
+            LlmResponseCachePlugin(),
+            LoggerPlugin(),
+            ToolResultCachePlugin(),
+        ]),
+    ]
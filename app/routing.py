@@ -0,0 +1,210 @@
+"""Routing model calls across several Ollama daemons.
+
+`OllamaRouter` is a LiteLLM client for `LiteLlm(llm_client=...)`; the backends
+come from OLLAMA_API_BASES / OLLAMA_BACKENDS_FILE (see app.agents). For each
+call it picks an api_base:
+
+- least outstanding requests first;
+- a conversation sticks to the backend that served it while that backend is no
+  more than OLLAMA_AFFINITY_SLACK requests busier than the least loaded one,
+  so Ollama's prompt (KV) cache for it stays warm. The key is the system prompt
+  plus first user message, which is stable for the life of a session;
+- backends failing OLLAMA_CIRCUIT_FAILURES times in a row are skipped for
+  OLLAMA_CIRCUIT_COOLDOWN seconds, and a background probe of `/api/version`
+  every OLLAMA_HEALTH_INTERVAL seconds takes dead nodes out and puts
+  recovered ones back.
+
+Connection errors and timeouts fail over to the next backend before any
+response has been returned.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Sequence
+
+import httpx
+import litellm
+
+from app.http_client import get_client
+from app.logs import log
+from app.ollama import OllamaClient
+from app.metrics import OLLAMA_BACKEND_REQUESTS
+
+OLLAMA_AFFINITY_SLACK = int(os.getenv("OLLAMA_AFFINITY_SLACK", "2"))
+OLLAMA_AFFINITY_SIZE = int(os.getenv("OLLAMA_AFFINITY_SIZE", "10000"))
+OLLAMA_CIRCUIT_FAILURES = int(os.getenv("OLLAMA_CIRCUIT_FAILURES", "3"))
+OLLAMA_CIRCUIT_COOLDOWN = float(os.getenv("OLLAMA_CIRCUIT_COOLDOWN", "30"))
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))
+OLLAMA_REQUEST_TIMEOUT = float(os.getenv("OLLAMA_REQUEST_TIMEOUT", "300"))
+
+_BACKEND_FAILURES = (
+    litellm.exceptions.APIConnectionError,
+    litellm.exceptions.Timeout,
+    litellm.exceptions.ServiceUnavailableError,
+    litellm.exceptions.InternalServerError,
+    httpx.TransportError,
+    asyncio.TimeoutError,
+    ConnectionError,
+)
+
+
+def _affinity_key(messages: Sequence[Any]) -> str:
+    head = []
+    for message in messages:
+        head.append(message)
+        if message.get("role") == "user":
+            break
+    return hashlib.sha256(json.dumps(head, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Backend:
+    __slots__ = ("url", "in_flight", "requests", "failures", "open_until", "healthy")
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0  # consecutive
+        self.open_until = 0.0
+        self.healthy = True
+
+    def available(self, now: float) -> bool:
+        """Healthy and not inside a circuit cooldown (after one, a single trial is allowed)."""
+        return self.healthy and now >= self.open_until
+
+
+class OllamaRouter(OllamaClient):
+    def __init__(
+        self,
+        bases: Sequence[str],
+        *,
+        affinity_slack: int = OLLAMA_AFFINITY_SLACK,
+        affinity_size: int = OLLAMA_AFFINITY_SIZE,
+        circuit_failures: int = OLLAMA_CIRCUIT_FAILURES,
+        circuit_cooldown: float = OLLAMA_CIRCUIT_COOLDOWN,
+        health_interval: float = OLLAMA_HEALTH_INTERVAL,
+        timeout: float = OLLAMA_REQUEST_TIMEOUT,
+    ) -> None:
+        if not bases:
+            raise ValueError("OllamaRouter needs at least one api_base")
+        self.backends = [Backend(url) for url in bases]
+        self.affinity_slack = affinity_slack
+        self.affinity_size = affinity_size
+        self.circuit_failures = circuit_failures
+        self.circuit_cooldown = circuit_cooldown
+        self.health_interval = health_interval
+        self.timeout = timeout
+        self._affinity: "OrderedDict[str, Backend]" = OrderedDict()
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def pick(self, key: str, exclude: Sequence[Backend] = ()) -> Backend:
+        """The backend for conversation `key`, skipping `exclude` (already tried)."""
+        now = time.monotonic()
+        remaining = [b for b in self.backends if b not in exclude]
+        candidates = [b for b in remaining if b.available(now)] or remaining  # all down: try anyway
+        least = min(candidates, key=lambda b: (b.in_flight, b.requests))
+        pinned = self._affinity.get(key)
+        chosen = least
+        if pinned in candidates and pinned.in_flight <= least.in_flight + self.affinity_slack:
+            chosen = pinned
+        self._affinity[key] = chosen
+        self._affinity.move_to_end(key)
+        while len(self._affinity) > self.affinity_size:
+            self._affinity.popitem(last=False)
+        if chosen.open_until and now >= chosen.open_until:
+            chosen.open_until = now + self.circuit_cooldown  # half-open: this is the one trial
+        return chosen
+
+    async def acompletion(self, model, messages, tools, **kwargs):
+        self._ensure_probes()
+        kwargs.setdefault("timeout", self.timeout)
+        key = _affinity_key(messages)
+        tried: List[Backend] = []
+        while True:
+            backend = self.pick(key, tried)
+            tried.append(backend)
+            backend.in_flight += 1
+            backend.requests += 1
+            try:
+                response = await super().acompletion(model, messages, tools, **{**kwargs, "api_base": backend.url})
+            except _BACKEND_FAILURES as exc:
+                backend.in_flight -= 1
+                self._failed(backend, exc)
+                if len(tried) == len(self.backends):
+                    raise
+                continue
+            except BaseException:
+                backend.in_flight -= 1
+                raise
+            self._succeeded(backend)
+            if kwargs.get("stream"):
+                return self._stream(response, backend)
+            backend.in_flight -= 1
+            return response
+
+    async def _stream(self, stream: Any, backend: Backend):
+        """Pass `stream` through, keeping the request outstanding until it ends."""
+        try:
+            async for chunk in stream:
+                yield chunk
+        except _BACKEND_FAILURES as exc:
+            self._failed(backend, exc)
+            raise
+        finally:
+            backend.in_flight -= 1
+
+    def _succeeded(self, backend: Backend) -> None:
+        if backend.open_until:
+            log.event("ollama-router", msg="circuit closed", backend=backend.url)
+        backend.failures = 0
+        backend.open_until = 0.0
+        OLLAMA_BACKEND_REQUESTS.inc(backend=backend.url, outcome="ok")
+
+    def _failed(self, backend: Backend, exc: BaseException) -> None:
+        backend.failures += 1
+        OLLAMA_BACKEND_REQUESTS.inc(backend=backend.url, outcome="failed")
+        opened = backend.failures >= self.circuit_failures
+        if opened:
+            backend.open_until = time.monotonic() + self.circuit_cooldown
+        log.event(
+            "ollama-router", "WARNING", msg="backend failed", backend=backend.url,
+            failures=backend.failures, circuit_open=opened, error=str(exc),
+        )
+
+    def _ensure_probes(self) -> None:
+        if self.health_interval <= 0 or len(self.backends) < 2:
+            return
+        loop = asyncio.get_running_loop()
+        task = self._probe_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._probe_task = loop.create_task(self._probe_forever(), name="ollama-health")
+
+    async def _probe_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self.probe()
+
+    async def probe(self) -> None:
+        """Check every backend's /api/version once."""
+
+        async def one(backend: Backend) -> None:
+            try:
+                response = await get_client().get(f"{backend.url}/api/version", timeout=min(5.0, self.health_interval or 5.0))
+                healthy = response.status_code == 200
+            except httpx.HTTPError:
+                healthy = False
+            if healthy != backend.healthy:
+                log.event(
+                    "ollama-router", "INFO" if healthy else "WARNING",
+                    msg="backend up" if healthy else "backend down", backend=backend.url,
+                )
+            backend.healthy = healthy
+            if healthy and backend.open_until:
+                backend.failures = 0
+                backend.open_until = 0.0
+
+        await asyncio.gather(*(one(backend) for backend in self.backends))
@@ -0,0 +1,236 @@
+"""Safe arithmetic evaluator behind the `calc` tool.
+
+Expressions are parsed once with `ast`, checked against a whitelist of
+operators, functions and constants, and compiled into a tree of closures that
+is cached by expression text. Evaluation enforces limits on integer size (so
+`9**9**9` fails fast instead of hanging a worker) and on wall-clock time.
+The same compiled expression runs over NumPy arrays when variables are bound
+to lists, giving vectorized evaluation for free.
+"""
+
+import ast
+import math
+import operator
+import os
+import time
+from functools import lru_cache, reduce
+from typing import Any, Callable, Dict, Mapping, Optional
+
+CALC_MAX_EXPRESSION_LENGTH = int(os.getenv("CALC_MAX_EXPRESSION_LENGTH", "500"))
+CALC_MAX_INT_BITS = int(os.getenv("CALC_MAX_INT_BITS", "4096"))
+CALC_TIME_LIMIT = float(os.getenv("CALC_TIME_LIMIT", "1.0"))
+CALC_CACHE_SIZE = int(os.getenv("CALC_CACHE_SIZE", "1024"))
+
+
+class CalcError(ValueError):
+    """Raised for expressions that are invalid, unsupported or too expensive."""
+
+
+_CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau}
+
+_SCALAR_FUNCS: Dict[str, Callable[..., Any]] = {
+    "abs": abs,
+    "round": round,
+    "min": min,
+    "max": max,
+    "sqrt": math.sqrt,
+    "exp": math.exp,
+    "log": math.log,
+    "log10": math.log10,
+    "log2": math.log2,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "asin": math.asin,
+    "acos": math.acos,
+    "atan": math.atan,
+    "floor": math.floor,
+    "ceil": math.ceil,
+}
+
+
+def _vector_funcs() -> Dict[str, Callable[..., Any]]:
+    import numpy as np
+
+    return {
+        "abs": np.abs,
+        "round": np.round,
+        # One array reduces over its elements, like the builtins; several compare
+        # element-wise (the ufuncs alone would take a third argument as `out`).
+        "min": lambda *args: np.min(args[0]) if len(args) == 1 else reduce(np.minimum, args),
+        "max": lambda *args: np.max(args[0]) if len(args) == 1 else reduce(np.maximum, args),
+        "sqrt": np.sqrt,
+        "exp": np.exp,
+        "log": np.log,
+        "log10": np.log10,
+        "log2": np.log2,
+        "sin": np.sin,
+        "cos": np.cos,
+        "tan": np.tan,
+        "asin": np.arcsin,
+        "acos": np.arccos,
+        "atan": np.arctan,
+        "floor": np.floor,
+        "ceil": np.ceil,
+    }
+
+
+class _Context:
+    __slots__ = ("env", "funcs", "deadline")
+
+    def __init__(self, env: Mapping[str, Any], funcs: Mapping[str, Callable[..., Any]], deadline: float) -> None:
+        self.env = env
+        self.funcs = funcs
+        self.deadline = deadline
+
+
+def _check_time(ctx: _Context) -> None:
+    if time.monotonic() > ctx.deadline:
+        raise CalcError("Expression took too long to evaluate.")
+
+
+def _pow(base: Any, exponent: Any) -> Any:
+    # Powers of -1, 0 and 1 never grow, however large the exponent.
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0 and abs(base) > 1:
+        if base.bit_length() * exponent > CALC_MAX_INT_BITS:
+            raise CalcError("Exponent too large.")
+    return operator.pow(base, exponent)
+
+
+def _mul(left: Any, right: Any) -> Any:
+    if isinstance(left, int) and isinstance(right, int):
+        if left.bit_length() + right.bit_length() > CALC_MAX_INT_BITS:
+            raise CalcError("Result too large.")
+    return operator.mul(left, right)
+
+
+_BIN_OPS: Dict[type, Callable[[Any, Any], Any]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: _mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: _pow,
+}
+
+_UNARY_OPS: Dict[type, Callable[[Any], Any]] = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+_Node = Callable[[_Context], Any]
+
+
+def _compile_node(node: ast.AST) -> _Node:
+    if isinstance(node, ast.Constant):
+        value = node.value
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise CalcError(f"Unsupported constant: {value!r}")
+        return lambda ctx: value
+
+    if isinstance(node, ast.Name):
+        name = node.id
+        if name in _CONSTANTS:
+            constant = _CONSTANTS[name]
+            return lambda ctx: constant
+
+        def variable(ctx: _Context) -> Any:
+            try:
+                return ctx.env[name]
+            except KeyError:
+                raise CalcError(f"Unknown name: {name}") from None
+
+        return variable
+
+    if isinstance(node, ast.BinOp):
+        op = _BIN_OPS.get(type(node.op))
+        if op is None:
+            raise CalcError(f"Unsupported operator: {type(node.op).__name__}")
+        left, right = _compile_node(node.left), _compile_node(node.right)
+
+        def binop(ctx: _Context) -> Any:
+            _check_time(ctx)
+            return op(left(ctx), right(ctx))
+
+        return binop
+
+    if isinstance(node, ast.UnaryOp):
+        op = _UNARY_OPS.get(type(node.op))
+        if op is None:
+            raise CalcError(f"Unsupported operator: {type(node.op).__name__}")
+        operand = _compile_node(node.operand)
+        return lambda ctx: op(operand(ctx))
+
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in _SCALAR_FUNCS:
+            raise CalcError(f"Unsupported function: {ast.unparse(node.func)}")
+        if node.keywords:
+            raise CalcError("Keyword arguments are not supported.")
+        name = node.func.id
+        args = [_compile_node(arg) for arg in node.args]
+
+        def call(ctx: _Context) -> Any:
+            _check_time(ctx)
+            return ctx.funcs[name](*(arg(ctx) for arg in args))
+
+        return call
+
+    raise CalcError(f"Unsupported syntax: {type(node).__name__}")
+
+
+@lru_cache(maxsize=CALC_CACHE_SIZE)
+def compile_expression(expression: str) -> _Node:
+    """Parse and compile `expression` once; repeated texts hit the LRU cache."""
+    if len(expression) > CALC_MAX_EXPRESSION_LENGTH:
+        raise CalcError("Expression is too long.")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as exc:
+        raise CalcError(f"Invalid expression: {exc.msg}") from None
+    return _compile_node(tree.body)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_variables(variables: Mapping[str, Any]) -> None:
+    """Only numbers and flat lists of numbers; the size limits do not cover strings or containers."""
+    for name, value in variables.items():
+        if _is_number(value):
+            continue
+        if isinstance(value, (list, tuple)) and all(_is_number(item) for item in value):
+            continue
+        raise CalcError(f"Variable {name!r} must be a number or a list of numbers.")
+
+
+def evaluate(expression: str, variables: Optional[Mapping[str, Any]] = None) -> Any:
+    """Evaluate `expression`; list-valued variables are evaluated element-wise."""
+    if variables:
+        _check_variables(variables)
+    compiled = compile_expression(expression)
+    deadline = time.monotonic() + CALC_TIME_LIMIT
+    try:
+        if variables and any(isinstance(v, (list, tuple)) for v in variables.values()):
+            return _evaluate_vectorized(compiled, variables, deadline)
+        result = compiled(_Context(variables or {}, _SCALAR_FUNCS, deadline))
+    except CalcError:
+        raise
+    except (ArithmeticError, ValueError, TypeError) as exc:
+        raise CalcError(str(exc)) from None
+    if isinstance(result, complex):
+        raise CalcError("Result is not a real number.")
+    return result
+
+
+def _evaluate_vectorized(compiled: _Node, variables: Mapping[str, Any], deadline: float) -> Any:
+    import numpy as np
+
+    env = {name: np.asarray(value, dtype=float) for name, value in variables.items()}
+    shape = np.broadcast_shapes(*(value.shape for value in env.values()))
+    with np.errstate(all="ignore"):
+        result = compiled(_Context(env, _vector_funcs(), deadline))
+    if isinstance(result, np.generic):  # reduced to one number, e.g. max(x)
+        return result.item()
+    return np.broadcast_to(result, shape).tolist()
@@ -0,0 +1,319 @@
+"""Long-lived HTTP serving mode: one warm Runner per process, with admission control.
+
+    python -m app.server [--host 127.0.0.1] [--port 8080]
+
+    POST /sessions/{session_id}/turns  {"message": "...", "user_id": "...", "stream": false}
+    GET  /healthz
+    GET  /metrics
+
+A turn replies with {"session_id", "text", "events"}, or with `"stream": true`
+as Server-Sent Events: one `data:` line per ADK event, then `event: done`.
+
+`TurnScheduler` gives every session its own FIFO lane, so a session's turns
+run one after another in arrival order while different sessions run in
+parallel, at most SERVE_CONCURRENCY at once (size it to what the Ollama
+daemons can run in parallel). Turns waiting beyond SERVE_QUEUE_SIZE, or
+SERVE_SESSION_QUEUE for one session, are refused at once with 429 and
+Retry-After rather than piling up. On SIGTERM the scheduler stops admitting
+at once (new turns on open connections get 503) while uvicorn closes the
+listener; admitted turns then get SERVE_DRAIN_TIMEOUT seconds in all to
+finish (the rest are cancelled and answered 503) before the runner is closed,
+which writes any buffered session events.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+import google.genai.types as types
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.sessions.base_session_service import GetSessionConfig
+from pydantic import BaseModel
+
+from app.agents import OLLAMA_MODEL, ollama_api_bases
+from app.logs import log
+from app.main import APP_NAME, USER_ID, _event_text, build_runner, shutdown
+from app.metrics import REGISTRY, SERVE_QUEUE_SECONDS, SERVE_REJECTED
+from app.ollama import OLLAMA_NUM_CTX_BUCKETS, OLLAMA_WARMUP, warm_up
+from app.sessions import make_session_service
+
+SERVE_CONCURRENCY = int(os.getenv("SERVE_CONCURRENCY", "4"))
+SERVE_QUEUE_SIZE = int(os.getenv("SERVE_QUEUE_SIZE", "64"))
+SERVE_SESSION_QUEUE = int(os.getenv("SERVE_SESSION_QUEUE", "4"))
+SERVE_DRAIN_TIMEOUT = float(os.getenv("SERVE_DRAIN_TIMEOUT", "30"))
+SERVE_RETRY_AFTER = int(os.getenv("SERVE_RETRY_AFTER", "2"))
+# Sessions remembered as existing, so their turns skip the lookup (LRU).
+SERVE_KNOWN_SESSIONS = int(os.getenv("SERVE_KNOWN_SESSIONS", "10000"))
+
+_DONE = object()
+
+
+class Rejected(Exception):
+    """A turn the scheduler will not take: the server is full (429) or draining (503)."""
+
+    def __init__(self, reason: str, status: int) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.status = status
+
+
+class TurnScheduler:
+    """Per-session FIFO lanes under one global concurrency limit."""
+
+    def __init__(
+        self,
+        concurrency: int = SERVE_CONCURRENCY,
+        queue_size: int = SERVE_QUEUE_SIZE,
+        session_queue: int = SERVE_SESSION_QUEUE,
+    ) -> None:
+        self.concurrency = max(1, concurrency)
+        self.queue_size = queue_size
+        self.session_queue = max(1, session_queue)
+        self.running = 0
+        self.queued = 0
+        self.draining = False
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._lanes: Dict[Hashable, Deque[Tuple[Callable[[], Awaitable[Any]], asyncio.Future, float]]] = {}
+        self._workers: Dict[Hashable, asyncio.Task] = {}
+        self._idle: Optional[asyncio.Event] = None
+        self._drain_started: Optional[float] = None
+
+    def submit(self, key: Hashable, turn: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """Queue `turn` behind the session's earlier turns; raises Rejected instead of waiting."""
+        if self.draining:
+            raise self._reject("draining", 503)
+        lane = self._lanes.get(key)
+        if self.queued >= self.queue_size:
+            raise self._reject("server_queue_full", 429)
+        if lane is not None and len(lane) >= self.session_queue:
+            raise self._reject("session_queue_full", 429)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._idle = asyncio.Event()
+        future = asyncio.get_running_loop().create_future()
+        if lane is None:
+            lane = self._lanes[key] = deque()
+            self._workers[key] = asyncio.create_task(self._work(key, lane))
+        lane.append((turn, future, time.perf_counter()))
+        self.queued += 1
+        self._idle.clear()
+        return future
+
+    def _reject(self, reason: str, status: int) -> Rejected:
+        SERVE_REJECTED.inc(reason=reason)
+        return Rejected(reason, status)
+
+    async def _work(self, key: Hashable, lane: Deque) -> None:
+        try:
+            while lane:
+                turn, future, queued_at = lane[0]
+                async with self._slots:
+                    lane.popleft()
+                    self.queued -= 1
+                    if future.cancelled():
+                        continue
+                    SERVE_QUEUE_SECONDS.observe(time.perf_counter() - queued_at)
+                    self.running += 1
+                    try:
+                        result = await turn()
+                    except asyncio.CancelledError:
+                        future.cancel()
+                        raise
+                    except Exception as exc:
+                        if not future.done():
+                            future.set_exception(exc)
+                    else:
+                        if not future.done():
+                            future.set_result(result)
+                    finally:
+                        self.running -= 1
+        finally:
+            for _, future, _ in lane:
+                future.cancel()
+            self.queued -= len(lane)
+            del self._lanes[key]
+            del self._workers[key]
+            if not self._lanes:
+                self._idle.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "sessions": len(self._lanes),
+            "concurrency": self.concurrency,
+            "draining": self.draining,
+        }
+
+    def begin_drain(self) -> None:
+        """Stop admitting; safe to call from a signal handler."""
+        if self._drain_started is None:
+            self._drain_started = time.monotonic()
+        self.draining = True
+
+    async def drain(self, timeout: float = SERVE_DRAIN_TIMEOUT) -> bool:
+        """Stop admitting, then wait for admitted turns; cancels the rest `timeout` seconds after draining began.
+
+        True if all finished.
+        """
+        self.begin_drain()
+        if self._idle is None or not self._lanes:
+            return True
+        remaining = max(0.0, timeout - (time.monotonic() - self._drain_started))
+        try:
+            await asyncio.wait_for(self._idle.wait(), remaining)
+            return True
+        except asyncio.TimeoutError:
+            workers = list(self._workers.values())
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            return False
+
+
+class TurnRequest(BaseModel):
+    message: str
+    user_id: str = USER_ID
+    stream: bool = False
+
+
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+def build_server_app(
+    runner: Any = None,
+    scheduler: Optional[TurnScheduler] = None,
+    *,
+    drain_timeout: float = SERVE_DRAIN_TIMEOUT,
+) -> FastAPI:
+    """The serving app; builds the runner on startup unless one is given."""
+    scheduler = scheduler or TurnScheduler()
+    state: Dict[str, Any] = {"runner": runner}
+    known_sessions: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+
+    @asynccontextmanager
+    async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+        if state["runner"] is None:
+            state["runner"] = build_runner(make_session_service())
+            if OLLAMA_WARMUP:
+                # Load the model before taking traffic rather than on the first turn.
+                num_ctx = OLLAMA_NUM_CTX_BUCKETS[0] if OLLAMA_NUM_CTX_BUCKETS else None
+                await warm_up(ollama_api_bases(), OLLAMA_MODEL, num_ctx=num_ctx)
+        log.event("serve", msg="ready", concurrency=scheduler.concurrency, queue_size=scheduler.queue_size)
+        yield
+        drained = await scheduler.drain(drain_timeout)
+        log.event("serve", "INFO" if drained else "WARNING", msg="drained" if drained else "drain timed out")
+        await shutdown(state["runner"])
+
+    app = FastAPI(title="ADK agent", lifespan=lifespan)
+    app.state.scheduler = scheduler
+
+    async def ensure_session(user_id: str, session_id: str) -> None:
+        key = (user_id, session_id)
+        if key in known_sessions:
+            known_sessions.move_to_end(key)
+            return
+        service = state["runner"].session_service
+        session = await service.get_session(
+            app_name=APP_NAME, user_id=user_id, session_id=session_id, config=GetSessionConfig(num_recent_events=1)
+        )
+        if session is None:
+            await service.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+        known_sessions[key] = None
+        while len(known_sessions) > SERVE_KNOWN_SESSIONS:
+            known_sessions.popitem(last=False)
+
+    async def run_turn(user_id: str, session_id: str, text: str, stream: bool, sink: Optional[asyncio.Queue]) -> Dict[str, Any]:
+        await ensure_session(user_id, session_id)
+        message = types.Content(role="user", parts=[types.Part(text=text)])
+        run_config = RunConfig(streaming_mode=StreamingMode.SSE if stream else StreamingMode.NONE)
+        final, events = "", 0
+        async for event in state["runner"].run_async(
+            user_id=user_id, session_id=session_id, new_message=message, run_config=run_config
+        ):
+            events += 1
+            if sink is not None:
+                sink.put_nowait(event)
+            if event.is_final_response() and not event.partial:
+                final = _event_text(event) or final
+        return {"session_id": session_id, "text": final, "events": events}
+
+    @app.post("/sessions/{session_id}/turns")
+    async def turn(session_id: str, body: TurnRequest):
+        sink: Optional[asyncio.Queue] = asyncio.Queue() if body.stream else None
+        try:
+            future = scheduler.submit(
+                (body.user_id, session_id),
+                lambda: run_turn(body.user_id, session_id, body.message, body.stream, sink),
+            )
+        except Rejected as exc:
+            headers = {"Retry-After": str(SERVE_RETRY_AFTER)} if exc.status == 429 else {}
+            return JSONResponse({"error": exc.reason}, status_code=exc.status, headers=headers)
+        if sink is None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # the request itself was cancelled; the turn carries on
+                # Cut off by drain or shutdown: worth retrying on another worker.
+                return JSONResponse(
+                    {"error": "cancelled"}, status_code=503, headers={"Retry-After": str(SERVE_RETRY_AFTER)}
+                )
+            except Exception as exc:
+                return JSONResponse({"error": f"{type(exc).__name__}: {exc}"}, status_code=500)
+        future.add_done_callback(lambda _: sink.put_nowait(_DONE))
+
+        async def events() -> AsyncIterator[str]:
+            # The turn keeps running if the client goes away, so the session stays consistent.
+            while (event := await sink.get()) is not _DONE:
+                yield _sse("event", event.model_dump_json(exclude_none=True, by_alias=True))
+            if future.cancelled():
+                yield _sse("error", json.dumps({"error": "cancelled"}))
+            elif future.exception() is not None:
+                exc = future.exception()
+                yield _sse("error", json.dumps({"error": f"{type(exc).__name__}: {exc}"}))
+            else:
+                yield _sse("done", json.dumps(future.result()))
+
+        return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    @app.get("/healthz")
+    async def healthz():
+        return JSONResponse(scheduler.stats(), status_code=503 if scheduler.draining else 200)
+
+    @app.get("/metrics")
+    async def metrics():
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    return app
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn server that stops the scheduler admitting as soon as the exit signal arrives.
+
+    uvicorn only runs the lifespan shutdown after waiting for open requests,
+    so without this turns would still be admitted during that wait.
+    """
+
+    def handle_exit(self, sig: int, frame: Any) -> None:
+        self.config.app.state.scheduler.begin_drain()
+        super().handle_exit(sig, frame)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the agent over HTTP with a warm Runner.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    # uvicorn waits for open requests on SIGTERM, then the lifespan drains anything left; both share one budget.
+    config = uvicorn.Config(build_server_app(), host=args.host, port=args.port, timeout_graceful_shutdown=SERVE_DRAIN_TIMEOUT)
+    DrainingServer(config).run()
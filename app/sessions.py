@@ -0,0 +1,529 @@
+"""Persistent ADK session service on SQLite, shared by the CLI, batch mode and the web UI.
+
+Appended events are buffered and written in one transaction per turn: when the
+agent's final response arrives, once SESSION_FLUSH_EVENTS are pending, at most
+SESSION_FLUSH_INTERVAL seconds after the first pending event, and before any
+read. Writes run on one writer thread, so a slow or locked database never
+stalls the event loop; a batch that fails is kept and retried. With
+SESSION_LOAD_EVENTS set, `get_session` loads only the most recent events
+(starting at a user turn) instead of the whole history, and `iter_events`
+pages through the rest. `prune()` applies the retention policy, which is off
+unless configured: sessions idle for SESSION_RETENTION_DAYS are deleted and
+sessions longer than SESSION_MAX_EVENTS lose their oldest turns.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from google.adk.events.event import Event
+from google.adk.sessions import BaseSessionService, InMemorySessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.state import State
+
+from app.logs import log
+from app.metrics import SESSION_EVENTS_WRITTEN, SESSION_FLUSH_SECONDS
+
+SESSION_DB_PATH = os.getenv("ADK_SESSION_DB", ".adk_data/sessions.db")
+SESSION_FLUSH_EVENTS = int(os.getenv("SESSION_FLUSH_EVENTS", "64"))
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "0.5"))
+# Seconds a write waits for another process's lock before the batch is retried later.
+SESSION_BUSY_TIMEOUT = float(os.getenv("SESSION_BUSY_TIMEOUT", "5"))
+# Most recent events loaded per get_session (0 loads the full history).
+SESSION_LOAD_EVENTS = int(os.getenv("SESSION_LOAD_EVENTS", "0"))
+# Sessions idle longer than this are deleted by prune() (0 keeps them forever).
+SESSION_RETENTION_DAYS = float(os.getenv("SESSION_RETENTION_DAYS", "0"))
+# Events kept per session by prune(), oldest turns first to go (0 is unlimited).
+SESSION_MAX_EVENTS = int(os.getenv("SESSION_MAX_EVENTS", "0"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    create_time REAL NOT NULL,
+    update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, id)
+);
+CREATE INDEX IF NOT EXISTS sessions_by_update_time ON sessions (update_time);
+CREATE TABLE IF NOT EXISTS events (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    turn_start INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id, session_id, seq)
+);
+CREATE INDEX IF NOT EXISTS events_by_timestamp ON events (app_name, user_id, session_id, timestamp);
+CREATE TABLE IF NOT EXISTS app_states (
+    app_name TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_states (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id)
+);
+"""
+
+_Key = Tuple[str, str, str]
+
+
+def _split_state(delta: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """Split a state delta into (app, user, session) parts; temp: keys are dropped."""
+    app: Dict[str, Any] = {}
+    user: Dict[str, Any] = {}
+    session: Dict[str, Any] = {}
+    for key, value in delta.items():
+        if key.startswith(State.APP_PREFIX):
+            app[key.removeprefix(State.APP_PREFIX)] = value
+        elif key.startswith(State.USER_PREFIX):
+            user[key.removeprefix(State.USER_PREFIX)] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session[key] = value
+    return app, user, session
+
+
+def _starts_turn(event: Event) -> bool:
+    """A user message (not a tool result): history can safely start here."""
+    if event.author != "user" or event.content is None:
+        return False
+    return not any(part.function_response for part in event.content.parts or [])
+
+
+class SqliteSessionService(BaseSessionService):
+    """Sessions, events and app/user state in one SQLite file (WAL mode)."""
+
+    def __init__(
+        self,
+        path: str = SESSION_DB_PATH,
+        *,
+        flush_events: int = SESSION_FLUSH_EVENTS,
+        flush_interval: float = SESSION_FLUSH_INTERVAL,
+        load_events: int = SESSION_LOAD_EVENTS,
+        retention_days: float = SESSION_RETENTION_DAYS,
+        max_events: int = SESSION_MAX_EVENTS,
+        busy_timeout: float = SESSION_BUSY_TIMEOUT,
+    ) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.flush_events = max(1, flush_events)
+        self.flush_interval = flush_interval
+        self.load_events = load_events
+        self.retention_days = retention_days
+        self.max_events = max_events
+        self.busy_timeout = busy_timeout
+        # Writes run on a single writer thread, so batches land in append order
+        # without blocking the loop; reads run in a worker thread on their own
+        # connection (WAL readers don't block the writer).
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sessions-writer")
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        self._conn.executescript(_SCHEMA)
+        self._read_lock = threading.Lock()
+        self._reader = self._connect()
+        self._pending: List[Tuple[_Key, Event, str]] = []
+        # Rows of a batch whose write failed; only the writer thread touches it.
+        self._retry: List[Tuple[_Key, Event, str]] = []
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.events_written = 0
+        if retention_days > 0 or max_events > 0:
+            self.prune()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    async def _read(self, fn: Any, *args: Any) -> Any:
+        def run() -> Any:
+            with self._read_lock:
+                return fn(self._reader, *args)
+
+        return await asyncio.to_thread(run)
+
+    async def _run_write(self, fn: Any, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._writer, fn, *args)
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        await self.aflush()
+        session_id = session_id.strip() if session_id and session_id.strip() else str(uuid.uuid4())
+        app_delta, user_delta, session_state = _split_state(state or {})
+        now = time.time()
+
+        def insert() -> None:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._conn.execute(
+                        "INSERT INTO sessions (app_name, user_id, id, state, create_time, update_time)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        (app_name, user_id, session_id, json.dumps(session_state), now, now),
+                    )
+                    self._merge_shared_state({app_name: app_delta}, {(app_name, user_id): user_delta})
+                    self._conn.execute("COMMIT")
+                except sqlite3.IntegrityError:
+                    self._conn.execute("ROLLBACK")
+                    raise ValueError(f"Session {session_id} already exists for {app_name}/{user_id}.") from None
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+
+        await self._run_write(insert)
+        session = Session(
+            app_name=app_name, user_id=user_id, id=session_id, state=session_state, last_update_time=now
+        )
+        return await self._read(self._with_shared_state, session)
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        await self.aflush()
+        return await self._read(self._load_session, (app_name, user_id, session_id), config)
+
+    def _load_session(
+        self, conn: sqlite3.Connection, key: _Key, config: Optional[GetSessionConfig]
+    ) -> Optional[Session]:
+        row = conn.execute(
+            "SELECT state, update_time FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        where = "app_name = ? AND user_id = ? AND session_id = ?"
+        params: List[Any] = list(key)
+        if config and config.after_timestamp:
+            where += " AND timestamp >= ?"
+            params.append(config.after_timestamp)
+        limit = config.num_recent_events if config and config.num_recent_events else 0
+        if not limit and self.load_events > 0:
+            # Window the history, but start it at a user turn so no tool
+            # response is loaded without the call that produced it.
+            start = conn.execute(
+                f"SELECT seq FROM events WHERE {where} ORDER BY seq DESC LIMIT 1 OFFSET ?",
+                (*params, self.load_events - 1),
+            ).fetchone()
+            if start is not None:
+                turn = conn.execute(
+                    f"SELECT MIN(seq) FROM events WHERE {where} AND seq >= ? AND turn_start = 1",
+                    (*params, start[0]),
+                ).fetchone()
+                where += " AND seq >= ?"
+                params.append(turn[0] if turn[0] is not None else start[0])
+        if limit:
+            rows = conn.execute(
+                f"SELECT data FROM (SELECT seq, data FROM events WHERE {where} ORDER BY seq DESC LIMIT ?)"
+                " ORDER BY seq",
+                (*params, limit),
+            ).fetchall()
+        else:
+            rows = conn.execute(f"SELECT data FROM events WHERE {where} ORDER BY seq", params).fetchall()
+        session = Session(
+            app_name=key[0],
+            user_id=key[1],
+            id=key[2],
+            state=json.loads(row[0]),
+            events=[Event.model_validate_json(data) for (data,) in rows],
+            last_update_time=row[1],
+        )
+        return self._with_shared_state(conn, session)
+
+    @staticmethod
+    def _with_shared_state(conn: sqlite3.Connection, session: Session) -> Session:
+        app_row = conn.execute("SELECT state FROM app_states WHERE app_name = ?", (session.app_name,)).fetchone()
+        user_row = conn.execute(
+            "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?", (session.app_name, session.user_id)
+        ).fetchone()
+        for key, value in (json.loads(app_row[0]) if app_row else {}).items():
+            session.state[State.APP_PREFIX + key] = value
+        for key, value in (json.loads(user_row[0]) if user_row else {}).items():
+            session.state[State.USER_PREFIX + key] = value
+        return session
+
+    async def iter_events(
+        self, *, app_name: str, user_id: str, session_id: str, page_size: int = 500
+    ) -> AsyncIterator[List[Event]]:
+        """Yield a session's full history in pages of `page_size` events, oldest first."""
+        await self.aflush()
+        key = (app_name, user_id, session_id)
+        after = -1
+        while True:
+            rows = await self._read(
+                lambda conn: conn.execute(
+                    "SELECT seq, data FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?"
+                    " AND seq > ? ORDER BY seq LIMIT ?",
+                    (*key, after, page_size),
+                ).fetchall()
+            )
+            if not rows:
+                return
+            after = rows[-1][0]
+            yield [Event.model_validate_json(data) for _, data in rows]
+
+    async def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        await self.aflush()
+
+        def load(conn: sqlite3.Connection) -> List[Session]:
+            rows = conn.execute(
+                "SELECT id, state, update_time FROM sessions WHERE app_name = ? AND user_id = ?"
+                " ORDER BY update_time DESC",
+                (app_name, user_id),
+            ).fetchall()
+            return [
+                self._with_shared_state(
+                    conn,
+                    Session(
+                        app_name=app_name, user_id=user_id, id=sid, state=json.loads(state), last_update_time=updated
+                    ),
+                )
+                for sid, state, updated in rows
+            ]
+
+        return ListSessionsResponse(sessions=await self._read(load))
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await self.aflush()
+        key = (app_name, user_id, session_id)
+
+        def delete() -> None:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.execute("DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?", key)
+                self._conn.execute("DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", key)
+                self._conn.execute("COMMIT")
+
+        await self._run_write(delete)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        await super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+        key = (session.app_name, session.user_id, session.id)
+        # Serialize now: callers may keep mutating the event after it is appended.
+        self._pending.append((key, event, event.model_dump_json(exclude_none=True)))
+        if len(self._pending) >= self.flush_events or (event.author != "user" and event.is_final_response()):
+            await self.aflush()
+        else:
+            self._schedule_flush()
+        return event
+
+    def _schedule_flush(self) -> None:
+        if self._flush_timer is None and self.flush_interval > 0:
+            self._flush_timer = asyncio.get_running_loop().call_later(self.flush_interval, self._flush_later)
+
+    def _flush_later(self) -> None:
+        self._flush_timer = None
+        self._flush_task = asyncio.get_running_loop().create_task(self.aflush())
+
+    def _take_pending(self) -> List[Tuple[_Key, Event, str]]:
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        pending, self._pending = self._pending, []
+        return pending
+
+    async def aflush(self) -> bool:
+        """Write every buffered event on the writer thread; False if the write failed and will be retried.
+
+        Called with nothing buffered, it still waits for writes already under way.
+        """
+        try:
+            await self._run_write(self._write, self._take_pending())
+        except sqlite3.Error as exc:
+            log.event("sessions", "WARNING", msg="flush failed, will retry", error=str(exc), events=len(self._retry))
+            self._schedule_flush()
+            return False
+        return True
+
+    def flush(self) -> None:
+        """Blocking `aflush` for callers outside the event loop; raises if the write fails."""
+        self._writer.submit(self._write, self._take_pending()).result()
+
+    def _write(self, batch: List[Tuple[_Key, Event, str]]) -> None:
+        """Write `batch`, after any rows a failed write left behind, and the state it changes, in one transaction."""
+        pending, self._retry = self._retry + batch, []
+        if not pending:
+            return
+        try:
+            self._write_events(pending)
+        except BaseException:
+            self._retry = pending
+            raise
+
+    def _write_events(self, pending: List[Tuple[_Key, Event, str]]) -> None:
+        updated: Dict[_Key, float] = {}
+        session_deltas: Dict[_Key, Dict[str, Any]] = {}
+        app_deltas: Dict[str, Dict[str, Any]] = {}
+        user_deltas: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for key, event, data in pending:
+            updated[key] = max(updated.get(key, 0.0), event.timestamp)
+            if event.actions and event.actions.state_delta:
+                app, user, own = _split_state(event.actions.state_delta)
+                app_deltas.setdefault(key[0], {}).update(app)
+                user_deltas.setdefault(key[:2], {}).update(user)
+                session_deltas.setdefault(key, {}).update(own)
+        started = time.perf_counter()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Numbered inside the write lock, so processes sharing the file never hand out the same seq;
+                # a plain INSERT makes any collision fail instead of overwriting.
+                rows = []
+                next_seq: Dict[_Key, int] = {}
+                for key, event, data in pending:
+                    seq = next_seq.get(key)
+                    if seq is None:
+                        (last,) = self._conn.execute(
+                            "SELECT MAX(seq) FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?", key
+                        ).fetchone()
+                        seq = 0 if last is None else last + 1
+                    next_seq[key] = seq + 1
+                    rows.append((*key, seq, event.timestamp, int(_starts_turn(event)), data))
+                self._conn.executemany(
+                    "INSERT INTO events (app_name, user_id, session_id, seq, timestamp, turn_start, data)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                for key, delta in session_deltas.items():
+                    row = self._conn.execute(
+                        "SELECT state FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", key
+                    ).fetchone()
+                    if row is not None:
+                        state = json.loads(row[0])
+                        state.update(delta)
+                        self._conn.execute(
+                            "UPDATE sessions SET state = ? WHERE app_name = ? AND user_id = ? AND id = ?",
+                            (json.dumps(state), *key),
+                        )
+                self._conn.executemany(
+                    "UPDATE sessions SET update_time = MAX(update_time, ?) WHERE app_name = ? AND user_id = ? AND id = ?",
+                    [(ts, *key) for key, ts in updated.items()],
+                )
+                self._merge_shared_state(app_deltas, user_deltas)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        self.flushes += 1
+        self.events_written += len(rows)
+        SESSION_FLUSH_SECONDS.observe(time.perf_counter() - started)
+        SESSION_EVENTS_WRITTEN.inc(len(rows))
+
+    def _merge_shared_state(
+        self, app_deltas: Dict[str, Dict[str, Any]], user_deltas: Dict[Tuple[str, str], Dict[str, Any]]
+    ) -> None:
+        for app_name, delta in app_deltas.items():
+            if delta:
+                row = self._conn.execute("SELECT state FROM app_states WHERE app_name = ?", (app_name,)).fetchone()
+                state = {**(json.loads(row[0]) if row else {}), **delta}
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO app_states (app_name, state) VALUES (?, ?)", (app_name, json.dumps(state))
+                )
+        for (app_name, user_id), delta in user_deltas.items():
+            if delta:
+                row = self._conn.execute(
+                    "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?", (app_name, user_id)
+                ).fetchone()
+                state = {**(json.loads(row[0]) if row else {}), **delta}
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO user_states (app_name, user_id, state) VALUES (?, ?, ?)",
+                    (app_name, user_id, json.dumps(state)),
+                )
+
+    def prune(self) -> Dict[str, int]:
+        """Apply the retention policy; returns how many sessions and events were removed."""
+        self.flush()
+        removed = {"sessions": 0, "events": 0}
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.retention_days > 0:
+                    cutoff = time.time() - self.retention_days * 86400
+                    removed["events"] += self._conn.execute(
+                        "DELETE FROM events WHERE (app_name, user_id, session_id) IN"
+                        " (SELECT app_name, user_id, id FROM sessions WHERE update_time < ?)",
+                        (cutoff,),
+                    ).rowcount
+                    removed["sessions"] = self._conn.execute(
+                        "DELETE FROM sessions WHERE update_time < ?", (cutoff,)
+                    ).rowcount
+                if self.max_events > 0:
+                    removed["events"] += self._compact()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return removed
+
+    def _compact(self) -> int:
+        """Trim sessions over max_events down to their most recent whole turns."""
+        removed = 0
+        oversized = self._conn.execute(
+            "SELECT app_name, user_id, session_id, MAX(seq) FROM events"
+            " GROUP BY app_name, user_id, session_id HAVING COUNT(*) > ?",
+            (self.max_events,),
+        ).fetchall()
+        for app_name, user_id, session_id, last in oversized:
+            key = (app_name, user_id, session_id)
+            (keep_from,) = self._conn.execute(
+                "SELECT MIN(seq) FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?"
+                " AND seq > ? AND turn_start = 1",
+                (*key, last - self.max_events),
+            ).fetchone()
+            if keep_from is None:
+                keep_from = last - self.max_events + 1
+            removed += self._conn.execute(
+                "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? AND seq < ?",
+                (*key, keep_from),
+            ).rowcount
+        return removed
+
+    async def aclose(self) -> None:
+        """Write what is still buffered without blocking the loop, then close."""
+        await self.aflush()
+        self.close()
+
+    def close(self) -> None:
+        self.flush()
+        self._writer.shutdown()
+        with self._lock:
+            self._conn.close()
+        with self._read_lock:
+            self._reader.close()
+
+
+def make_session_service() -> BaseSessionService:
+    """The session service shared by the CLI, batch runs and `python -m app.web`.
+
+    Sessions persist in SQLite at ADK_SESSION_DB; set it to an empty string to
+    keep them in memory instead.
+    """
+    if not SESSION_DB_PATH:
+        return InMemorySessionService()
+    return SqliteSessionService(SESSION_DB_PATH)
@@ -0,0 +1,74 @@
+"""Cold-start measurement in fresh interpreters.
+
+`time_stage()` times one startup stage, e.g. importing the tools or building
+the CLI's Runner. `import_profile()` runs a stage under `python -X importtime`
+and totals the self time per package, which shows where a cold start goes.
+`python -m app.main --import-profile` prints it, and
+benchmarks/cold_start.py checks the stages against targets.
+"""
+
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# What each startup path runs, cheapest first.
+STAGES = {
+    "tools": "import app.tools",
+    "app package": "import app",
+    "runner": (
+        "from google.adk.sessions import InMemorySessionService; "
+        "from app.main import build_runner; build_runner(InMemorySessionService())"
+    ),
+    "web app": "from app import get_app; get_app()",
+}
+
+
+def _run(args: List[str]) -> subprocess.CompletedProcess:
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")]))}
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+def time_stage(statement: str) -> float:
+    """Seconds `statement` takes in a new interpreter (interpreter start-up excluded)."""
+    out = _run(["-c", f"import time\nstarted = time.perf_counter()\n{statement}\nprint(time.perf_counter() - started)"])
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _package(module: str) -> str:
+    parts = module.split(".")
+    # google.* and similar namespaces only mean something one level down.
+    return ".".join(parts[:2]) if parts[0] in {"google", "opentelemetry"} and len(parts) > 1 else parts[0]
+
+
+def import_profile(statement: str = STAGES["runner"], top: int = 15) -> Dict[str, Any]:
+    """{"total_s", "packages": [(package, self seconds)], "modules": [(module, cumulative seconds)]}."""
+    out = _run(["-X", "importtime", "-c", statement])
+    packages: Dict[str, float] = defaultdict(float)
+    modules = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = (field.strip() for field in line[len("import time:"):].split("|"))
+        if not self_us.isdigit():
+            continue  # header
+        packages[_package(name)] += int(self_us) / 1e6
+        modules.append((name, int(cumulative_us) / 1e6))
+    modules.sort(key=lambda item: item[1], reverse=True)
+    return {
+        "total_s": round(sum(packages.values()), 3),
+        "packages": sorted(((p, round(s, 3)) for p, s in packages.items()), key=lambda item: item[1], reverse=True)[:top],
+        "modules": [(m, round(s, 3)) for m, s in modules[:top]],
+    }
+
+
+def format_profile(profile: Dict[str, Any]) -> str:
+    lines = [f"import time {profile['total_s']:.2f}s", "", "  self s  package"]
+    lines += [f"  {seconds:6.2f}  {name}" for name, seconds in profile["packages"]]
+    lines += ["", "   cum s  module"]
+    lines += [f"  {seconds:6.2f}  {name}" for name, seconds in profile["modules"]]
+    return "\n".join(lines)
@@ -0,0 +1,86 @@
+"""A JSON schema that only admits valid tool calls or a final answer.
+
+`reply_schema()` turns the function declarations ADK builds from the agent's
+tools (for the types) and the tools' signatures (for which arguments are
+required; ADK's declarations mark defaulted ones required too) into a `oneOf`
+with one variant per tool, `{"name": <tool>, "arguments": {<typed parameters>}}`,
+an array of those for independent calls, and `{"name": "response", "arguments": {"text": ...}}` for
+the final answer: the pseudo-tool OllamaToolCallBridgePlugin already unwraps
+into plain text. Given as Ollama's `format`, the grammar built from it makes
+every reply parse as one of these, so the model can no longer invent tool
+names or malformed arguments.
+"""
+
+import inspect
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional
+
+from google.genai import types
+
+FINAL_ANSWER = "response"
+
+SCHEMA_INSTRUCTION = (
+    "Reply with JSON only: {\"name\": <tool>, \"arguments\": {...}} to call a tool, a JSON array of such objects "
+    "for calls that do not depend on each other, or {\"name\": \"response\", \"arguments\": {\"text\": <answer>}} "
+    "with the final answer in plain language."
+)
+
+
+def schema_json(schema: types.Schema) -> Dict[str, Any]:
+    """JSON schema for a genai Schema; descriptions are dropped, they do not constrain anything."""
+    out: Dict[str, Any] = {}
+    if schema.any_of:
+        out["anyOf"] = [schema_json(option) for option in schema.any_of]
+    if schema.type is not None and schema.type != types.Type.TYPE_UNSPECIFIED:
+        out["type"] = schema.type.value.lower()
+    if schema.enum:
+        out["enum"] = list(schema.enum)
+    if schema.properties:
+        out["properties"] = {name: schema_json(value) for name, value in schema.properties.items()}
+        out["required"] = list(schema.required or [])
+    if schema.items is not None:
+        out["items"] = schema_json(schema.items)
+    if schema.nullable and "type" in out:
+        out["type"] = [out["type"], "null"]
+    return out
+
+
+def required_params(func: Callable[..., Any]) -> set:
+    """Parameters of `func` without a default."""
+    return {
+        name
+        for name, param in inspect.signature(func).parameters.items()
+        if param.default is param.empty and param.kind in (param.POSITIONAL_OR_KEYWORD, param.KEYWORD_ONLY)
+    }
+
+
+def _call(name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "object",
+        "properties": {"name": {"const": name}, "arguments": arguments},
+        "required": ["name", "arguments"],
+    }
+
+
+def reply_schema(
+    declarations: Iterable[types.FunctionDeclaration], functions: Optional[Mapping[str, Callable[..., Any]]] = None
+) -> Dict[str, Any]:
+    """The reply schema for `declarations`; `functions` (name -> tool) supply the required arguments."""
+    calls = []
+    for declaration in declarations:
+        if declaration.parameters is not None:
+            arguments = schema_json(declaration.parameters)
+        else:
+            arguments = {"type": "object", "properties": {}}
+        func = (functions or {}).get(declaration.name)
+        if func is not None and "properties" in arguments:
+            required = required_params(func)
+            arguments["required"] = [name for name in arguments["properties"] if name in required]
+        calls.append(_call(declaration.name, arguments))
+    answer = _call(
+        FINAL_ANSWER,
+        {"type": "object", "properties": {"text": {"type": "string"}}, "required": ["text"]},
+    )
+    variants = [*calls, answer]
+    if calls:
+        variants.append({"type": "array", "items": {"oneOf": calls}, "minItems": 1})
+    return {"oneOf": variants}
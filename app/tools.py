@@ -1,54 +1,216 @@
-from typing import Any, Dict
-import httpx
+import asyncio
+import json
+import os
 import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.cache import DiskCache, TTLCache, cache_policy
+from app.executor import Deadline
+from app.http_client import get_client, host_slot
+from app.json_shape import PathError, project, summarize
+from app.safe_eval import CalcError, evaluate
+from app.zip_index import ZipPlace, lookup_zip
+
+# Open-Meteo refreshes current_weather every 15 minutes; cache per ~1 km cell.
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "1024"))
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "900"))
+WEATHER_CACHE_MIN_TTL = float(os.getenv("WEATHER_CACHE_MIN_TTL", "30"))
+WEATHER_CACHE_PATH = os.getenv("WEATHER_CACHE_PATH", "")
+# weather_by_zips: most ZIPs per call, concurrent remote geocodes, points per Open-Meteo request.
+WEATHER_BATCH_MAX_ZIPS = int(os.getenv("WEATHER_BATCH_MAX_ZIPS", "100"))
+WEATHER_BATCH_CONCURRENCY = int(os.getenv("WEATHER_BATCH_CONCURRENCY", "8"))
+WEATHER_BATCH_CHUNK = int(os.getenv("WEATHER_BATCH_CHUNK", "50"))
+# How long ToolResultCachePlugin may reuse a weather answer for the same arguments.
+WEATHER_RESULT_TTL = float(os.getenv("WEATHER_RESULT_TTL", "120"))
+# http_get responses kept for reuse; stale ones with an ETag/Last-Modified are
+# kept HTTP_CACHE_KEEP seconds for conditional revalidation.
+HTTP_CACHE_SIZE = int(os.getenv("HTTP_CACHE_SIZE", "512"))
+HTTP_CACHE_KEEP = float(os.getenv("HTTP_CACHE_KEEP", "86400"))
+# http_get defaults: bodies past HTTP_MAX_BYTES are abandoned mid-download and
+# arrays longer than HTTP_MAX_ITEMS reach the model as {"length", "first"}.
+HTTP_MAX_BYTES = int(os.getenv("HTTP_MAX_BYTES", "1000000"))
+HTTP_MAX_ITEMS = int(os.getenv("HTTP_MAX_ITEMS", "20"))
+
+WEATHER_CACHE = TTLCache(
+    maxsize=WEATHER_CACHE_SIZE,
+    ttl=WEATHER_CACHE_TTL,
+    disk=DiskCache(WEATHER_CACHE_PATH, maxsize=WEATHER_CACHE_SIZE * 10) if WEATHER_CACHE_PATH else None,
+)
+HTTP_CACHE = TTLCache(maxsize=HTTP_CACHE_SIZE, ttl=HTTP_CACHE_KEEP)
+
+@cache_policy("pure")
+def calc(
+    expression: str = "",
+    expressions: Optional[List[str]] = None,
+    variables: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Evaluate an arithmetic expression, e.g., '12*(3+4)' or 'sqrt(2)*pi'.
+
+    Pass `expressions` to evaluate several at once, and `variables` to bind names;
+    binding a name to a list of numbers evaluates the expression element-wise.
+    """
+    texts = expressions if expressions else [expression]
+    try:
+        results = [evaluate(text, variables) for text in texts]
+    except CalcError as exc:
+        return f"Error: {exc}"
+    if expressions:
+        return json.dumps(results)
+    return str(results[0])
+
+async def _get(url: str, *, timeout: float, headers: Optional[Dict[str, str]] = None):
+    async with host_slot(url):
+        return await get_client().get(url, timeout=timeout, headers=headers)
+
+class _BodyTooLarge(Exception):
+    def __init__(self, status: int, size: int, max_bytes: int) -> None:
+        super().__init__(f"Response exceeds max_bytes={max_bytes} (at least {size} bytes)")
+        self.status = status
 
-def calc(expression: str) -> str:
-    """Evaluate a simple arithmetic expression, e.g., '12*(3+4)'. POC only."""
-    return str(eval(expression, {"__builtins__": {}}))  # POC only
+async def _get_capped(url: str, *, timeout: float, headers: Optional[Dict[str, str]], max_bytes: int):
+    """GET `url` streaming the body, giving up as soon as it passes `max_bytes` (0 = no cap)."""
+    async with host_slot(url):
+        async with get_client().stream("GET", url, timeout=timeout, headers=headers) as r:
+            declared = r.headers.get("content-length", "")
+            if max_bytes and declared.isdigit() and int(declared) > max_bytes:
+                raise _BodyTooLarge(r.status_code, int(declared), max_bytes)
+            body = bytearray()
+            async for chunk in r.aiter_bytes():
+                body += chunk
+                if max_bytes and len(body) > max_bytes:
+                    raise _BodyTooLarge(r.status_code, len(body), max_bytes)
+            return r, bytes(body)
 
-def http_get(url: str, *, retries: int = 3, timeout: float = 10.0) -> Dict[str, Any]:
-    """GET a JSON endpoint and return parsed JSON with resilient behavior."""
+def _freshness_lifetime(headers: httpx.Headers) -> Optional[float]:
+    """Seconds a response stays fresh per Cache-Control/Expires; None for no-store."""
+    directives = {}
+    for item in headers.get("cache-control", "").split(","):
+        name, _, value = item.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"')
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0.0
+    try:
+        age = float(headers.get("age") or 0)
+        if "max-age" in directives:
+            return max(0.0, float(directives["max-age"]) - age)
+        if "expires" in headers:
+            expires = parsedate_to_datetime(headers["expires"]).timestamp()
+            date = parsedate_to_datetime(headers["date"]).timestamp() if "date" in headers else time.time()
+            return max(0.0, expires - date - age)
+    except (TypeError, ValueError):
+        pass
+    return 0.0
+
+def _remember_response(url: str, headers: httpx.Headers, data: Any, cached: Optional[Dict[str, Any]] = None) -> None:
+    """Store a 200 (or refresh a revalidated entry) in HTTP_CACHE when its headers allow it."""
+    lifetime = _freshness_lifetime(headers)
+    if lifetime is None:
+        return
+    entry = {
+        "data": data,
+        "etag": headers.get("etag") or (cached or {}).get("etag"),
+        "last_modified": headers.get("last-modified") or (cached or {}).get("last_modified"),
+        "fresh_until": time.time() + lifetime,
+    }
+    if lifetime > 0 or entry["etag"] or entry["last_modified"]:
+        HTTP_CACHE.set(url, entry, ttl=max(HTTP_CACHE_KEEP, lifetime))
+
+def _http_get_freshness(args: Dict[str, Any], result: Any) -> float:
+    """CachePolicy hook: how long an http_get result stays fresh, from its response headers."""
+    entry = HTTP_CACHE.peek(str(args.get("url", "")))
+    if entry is None or not (isinstance(result, dict) and result.get("ok")):
+        return 0.0
+    return max(0.0, entry["fresh_until"] - time.time())
+
+def _shape(data: Any, fields: Optional[List[str]], max_items: int) -> Dict[str, Any]:
+    try:
+        data = project(data, fields) if fields else data
+    except PathError as exc:
+        return {"ok": False, "status": 200, "data": None, "error": str(exc)}
+    return {"ok": True, "status": 200, "data": summarize(data, max_items), "error": None}
+
+@cache_policy("http", freshness=_http_get_freshness)
+async def http_get(
+    url: str,
+    *,
+    fields: Optional[List[str]] = None,
+    max_items: int = HTTP_MAX_ITEMS,
+    max_bytes: int = HTTP_MAX_BYTES,
+    retries: int = 3,
+    timeout: float = 10.0,
+    deadline: float = 30.0,
+) -> Dict[str, Any]:
+    """GET a JSON endpoint and return parsed JSON with resilient behavior.
+
+    Pass `fields` to return only those parts of the document, as JSONPath-like
+    expressions such as ["title", "items[*].name", "data.rows[:5]"]; `data` is then
+    {expression: value}. Arrays longer than `max_items` come back as
+    {"length": n, "first": [...]}, and bodies larger than `max_bytes` are refused.
+
+    Retries 5xx responses and network errors with jittered exponential backoff,
+    giving up once `deadline` seconds have passed across all attempts.
+    Responses are reused while Cache-Control/Expires says they are fresh; stale
+    ones with an ETag or Last-Modified are revalidated with a conditional GET.
+    """
+    cached = HTTP_CACHE.get(url)
+    if cached is not None and cached["fresh_until"] > time.time():
+        return _shape(cached["data"], fields, max_items)
+    validators = {}
+    if cached is not None and cached["etag"]:
+        validators["If-None-Match"] = cached["etag"]
+    if cached is not None and cached["last_modified"]:
+        validators["If-Modified-Since"] = cached["last_modified"]
+
+    budget = Deadline(deadline)
     last_err = None
     for attempt in range(1, retries + 1):
         try:
-            with httpx.Client(timeout=timeout) as client:
-                r = client.get(url)
-                status = r.status_code
-                if r.is_success:
-                    try:
-                        return {"ok": True, "status": status, "data": r.json(), "error": None}
-                    except Exception as parse_err:
-                        return {"ok": False, "status": status, "data": None, "error": f"JSON parse error: {parse_err}"}
-                # Retry on 5xx server errors
-                if 500 <= status < 600 and attempt < retries:
-                    time.sleep(0.5 * attempt)
-                    continue
-                return {"ok": False, "status": status, "data": None, "error": f"HTTP {status}: {r.text[:300]}"}
+            r, body = await _get_capped(
+                url, timeout=min(timeout, budget.remaining()), headers=validators or None, max_bytes=max_bytes
+            )
+            status = r.status_code
+            if status == 304 and cached is not None:
+                _remember_response(url, r.headers, cached["data"], cached)
+                return _shape(cached["data"], fields, max_items)
+            if r.is_success:
+                try:
+                    data = json.loads(body)
+                except Exception as parse_err:
+                    return {"ok": False, "status": status, "data": None, "error": f"JSON parse error: {parse_err}"}
+                if status == 200:
+                    _remember_response(url, r.headers, data)
+                return {**_shape(data, fields, max_items), "status": status}
+            # Retry on 5xx server errors
+            if 500 <= status < 600 and attempt < retries and await budget.backoff(attempt):
+                continue
+            text = body[:300].decode(r.encoding or "utf-8", errors="replace")
+            return {"ok": False, "status": status, "data": None, "error": f"HTTP {status}: {text}"}
+        except _BodyTooLarge as too_large:
+            # Retrying would download the same oversized body again.
+            return {"ok": False, "status": too_large.status, "data": None, "error": str(too_large)}
         except Exception as e:
             last_err = e
-            if attempt < retries: # Retry on transient network errors
-                time.sleep(0.5 * attempt)
+            if attempt < retries and await budget.backoff(attempt): # Retry on transient network errors
                 continue
+            break
     return {"ok": False, "status": None, "data": None, "error": str(last_err) if last_err else "Unknown error"}
 
-def weather_by_zip(zip_code: str, *, timeout: float = 10.0) -> Dict[str, Any]:
-    """Fetch current weather for a US ZIP code using zippopotam.us + Open-Meteo."""
-    postal_code = zip_code.strip()
-    if len(postal_code) != 5 or not postal_code.isdigit():
-        return {
-            "ok": False,
-            "error": "ZIP codes must be exactly 5 digits (US only).",
-            "status": None,
-            "data": None,
-        }
-
+async def _remote_geocode(postal_code: str, *, timeout: float):
+    """Resolve a ZIP via zippopotam.us; returns (place, None) or (None, error dict)."""
     try:
-        zip_resp = httpx.get(
+        zip_resp = await _get(
             f"https://api.zippopotam.us/us/{postal_code}",
             timeout=timeout,
         )
     except Exception as exc:
-        return {
+        return None, {
             "ok": False,
             "status": None,
             "data": None,
@@ -56,7 +218,7 @@ def weather_by_zip(zip_code: str, *, timeout: float = 10.0) -> Dict[str, Any]:
         }
 
     if zip_resp.status_code != 200:
-        return {
+        return None, {
             "ok": False,
             "status": zip_resp.status_code,
             "data": None,
@@ -71,78 +233,266 @@ def weather_by_zip(zip_code: str, *, timeout: float = 10.0) -> Dict[str, Any]:
         city = place.get("place name", "")
         state = place.get("state abbreviation", "")
     except Exception as exc:
-        return {
+        return None, {
             "ok": False,
             "status": None,
             "data": None,
             "error": f"Malformed ZIP response: {exc}",
         }
+    return ZipPlace(postal_code, latitude, longitude, city, state), None
 
+class _ToolError(Exception):
+    """Carries a tool's `{"ok": False, ...}` result out of a shared fetch."""
+
+    def __init__(self, result: Dict[str, Any]) -> None:
+        super().__init__(result.get("error"))
+        self.result = result
+
+def _weather_key(latitude: float, longitude: float) -> str:
+    # ~1 km grid: nearby ZIPs share one forecast cell.
+    return f"{latitude:.2f},{longitude:.2f}"
+
+def _freshness_ttl(current: Dict[str, Any]) -> float:
+    """Seconds until Open-Meteo publishes the next `current_weather` sample."""
+    try:
+        observed = datetime.fromisoformat(current["time"]).replace(tzinfo=timezone.utc)
+        interval = float(current.get("interval") or WEATHER_CACHE_TTL)
+    except (KeyError, TypeError, ValueError):
+        return WEATHER_CACHE_TTL
+    next_update = observed.timestamp() + interval
+    return min(WEATHER_CACHE_TTL, max(WEATHER_CACHE_MIN_TTL, next_update - time.time()))
+
+async def _fetch_current_weathers(
+    points: List[Tuple[float, float]], *, timeout: float
+) -> List[Dict[str, Any]]:
+    """One Open-Meteo request for every (lat, lon) in `points`, results in order."""
+    latitudes = ",".join(f"{lat:.4f}" for lat, _ in points)
+    longitudes = ",".join(f"{lon:.4f}" for _, lon in points)
     try:
-        weather_resp = httpx.get(
+        weather_resp = await _get(
             (
                 "https://api.open-meteo.com/v1/forecast"
-                f"?latitude={latitude:.4f}&longitude={longitude:.4f}"
+                f"?latitude={latitudes}&longitude={longitudes}"
                 "&current_weather=true&temperature_unit=fahrenheit"
                 "&wind_speed_unit=mph"
             ),
             timeout=timeout,
         )
     except Exception as exc:
-        return {
+        raise _ToolError({
             "ok": False,
             "status": None,
             "data": None,
             "error": f"Failed to fetch weather data: {exc}",
-        }
+        })
 
     if weather_resp.status_code != 200:
-        return {
+        raise _ToolError({
             "ok": False,
             "status": weather_resp.status_code,
             "data": None,
             "error": f"Weather service error ({weather_resp.status_code}).",
-        }
+        })
 
     try:
-        weather_json = weather_resp.json()
-        current = weather_json.get("current_weather")
-        if not current:
+        payload = weather_resp.json()
+        # Open-Meteo answers a multi-coordinate request with a list.
+        items = payload if isinstance(payload, list) else [payload]
+        currents = [item.get("current_weather") for item in items]
+        if len(currents) != len(points) or not all(currents):
             raise ValueError("Missing current_weather field.")
-        summary = {
-            "location": {
-                "zip": postal_code,
-                "city": city,
-                "state": state,
-                "latitude": latitude,
-                "longitude": longitude,
-            },
-            "temperature_f": current.get("temperature"),
-            "windspeed_mph": current.get("windspeed"),
-            "wind_direction_deg": current.get("winddirection"),
-            "weather_code": current.get("weathercode"),
-            "observed_at": current.get("time"),
-        }
     except Exception as exc:
-        return {
+        raise _ToolError({
             "ok": False,
             "status": None,
             "data": None,
             "error": f"Malformed weather response: {exc}",
-        }
+        })
+    return currents
+
+async def _fetch_current_weather(latitude: float, longitude: float, *, timeout: float):
+    (current,) = await _fetch_current_weathers([(latitude, longitude)], timeout=timeout)
+    return current, _freshness_ttl(current)
+
+async def _current_weather(latitude: float, longitude: float, *, timeout: float) -> Dict[str, Any]:
+    """Open-Meteo `current_weather` for a point, served from WEATHER_CACHE when fresh."""
+    return await WEATHER_CACHE.get_or_fetch(
+        _weather_key(latitude, longitude),
+        lambda: _fetch_current_weather(latitude, longitude, timeout=timeout),
+    )
+
+def _weather_summary(place: ZipPlace, current: Dict[str, Any]) -> Dict[str, Any]:
+    summary = {
+        "location": {
+            "zip": place.zip,
+            "city": place.city,
+            "state": place.state,
+            "latitude": place.latitude,
+            "longitude": place.longitude,
+        },
+        "temperature_f": current.get("temperature"),
+        "windspeed_mph": current.get("windspeed"),
+        "wind_direction_deg": current.get("winddirection"),
+        "weather_code": current.get("weathercode"),
+        "observed_at": current.get("time"),
+    }
 
     summary_text_parts = [
-        f"Current weather for {city}, {state} {postal_code}:",
+        f"Current weather for {place.city}, {place.state} {place.zip}:",
         f"Temperature {summary['temperature_f']} °F",
     ]
     if summary["windspeed_mph"] is not None:
         summary_text_parts.append(f"Wind {summary['windspeed_mph']} mph")
 
     summary["summary"] = "; ".join(summary_text_parts)
+    return summary
+
+@cache_policy("ttl", ttl=WEATHER_RESULT_TTL)
+async def weather_by_zip(zip_code: str, *, timeout: float = 10.0) -> Dict[str, Any]:
+    """Fetch current weather for a US ZIP code using zippopotam.us + Open-Meteo.
+
+    ZIP centroids come from the bundled offline index; zippopotam.us is only
+    queried for ZIPs the index does not contain. Readings are cached until
+    Open-Meteo's next update, and `observed_at` is the upstream sample time.
+    """
+    postal_code = zip_code.strip()
+    if not _valid_zip(postal_code):
+        return {
+            "ok": False,
+            "error": "ZIP codes must be exactly 5 digits (US only).",
+            "status": None,
+            "data": None,
+        }
+
+    place = lookup_zip(postal_code)
+    if place is None:
+        place, error = await _remote_geocode(postal_code, timeout=timeout)
+        if error is not None:
+            return error
+    try:
+        current = await _current_weather(place.latitude, place.longitude, timeout=timeout)
+    except _ToolError as exc:
+        return exc.result
 
     return {
         "ok": True,
         "status": 200,
-        "data": summary,
+        "data": _weather_summary(place, current),
         "error": None,
     }
+
+def _valid_zip(postal_code: str) -> bool:
+    return len(postal_code) == 5 and postal_code.isdigit()
+
+@cache_policy("ttl", ttl=WEATHER_RESULT_TTL)
+async def weather_by_zips(zip_codes: List[str], *, timeout: float = 10.0) -> Dict[str, Any]:
+    """Fetch current weather for several US ZIP codes at once and return one compact table.
+
+    Prefer this over repeated weather_by_zip calls when comparing locations.
+    """
+    codes = list(dict.fromkeys(str(code).strip() for code in zip_codes or []))
+    invalid = [code for code in codes if not _valid_zip(code)]
+    if not codes or invalid:
+        detail = f" Invalid: {', '.join(invalid)}." if invalid else ""
+        return {
+            "ok": False,
+            "status": None,
+            "data": None,
+            "error": f"Provide one or more 5-digit US ZIP codes.{detail}",
+        }
+    if len(codes) > WEATHER_BATCH_MAX_ZIPS:
+        return {
+            "ok": False,
+            "status": None,
+            "data": None,
+            "error": f"At most {WEATHER_BATCH_MAX_ZIPS} ZIP codes per call.",
+        }
+
+    failures: Dict[str, str] = {}
+    places: Dict[str, ZipPlace] = {}
+    slots = asyncio.Semaphore(WEATHER_BATCH_CONCURRENCY)
+
+    async def geocode(code: str) -> None:
+        async with slots:
+            place, error = await _remote_geocode(code, timeout=timeout)
+        if error is not None:
+            failures[code] = error["error"]
+        else:
+            places[code] = place
+
+    remote = []
+    for code in codes:
+        place = lookup_zip(code)
+        if place is None:
+            remote.append(code)
+        else:
+            places[code] = place
+    await asyncio.gather(*(geocode(code) for code in remote))
+
+    # Serve fresh cells from the cache and fetch the rest with multi-coordinate requests.
+    currents: Dict[str, Dict[str, Any]] = {}
+    pending: Dict[str, Tuple[float, float]] = {}
+    for code in codes:
+        place = places.get(code)
+        if place is None:
+            continue
+        key = _weather_key(place.latitude, place.longitude)
+        cached = WEATHER_CACHE.get(key)
+        if cached is not None:
+            currents[key] = cached
+        else:
+            pending.setdefault(key, (place.latitude, place.longitude))
+
+    cell_errors: Dict[str, str] = {}
+
+    async def fetch_chunk(keys: List[str]) -> None:
+        async with slots:
+            try:
+                results = await _fetch_current_weathers([pending[k] for k in keys], timeout=timeout)
+            except _ToolError as exc:
+                cell_errors.update(dict.fromkeys(keys, exc.result["error"]))
+                return
+        for key, current in zip(keys, results):
+            WEATHER_CACHE.set(key, current, _freshness_ttl(current))
+            currents[key] = current
+
+    keys = list(pending)
+    chunks = [keys[i:i + WEATHER_BATCH_CHUNK] for i in range(0, len(keys), WEATHER_BATCH_CHUNK)]
+    await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks))
+
+    columns = ["zip", "city", "state", "temperature_f", "windspeed_mph", "weather_code", "observed_at"]
+    rows = []
+    for code in codes:
+        place = places.get(code)
+        if place is None:
+            continue
+        key = _weather_key(place.latitude, place.longitude)
+        current = currents.get(key)
+        if current is None:
+            failures[code] = cell_errors.get(key, "Weather unavailable.")
+            continue
+        rows.append([
+            code,
+            place.city,
+            place.state,
+            current.get("temperature"),
+            current.get("windspeed"),
+            current.get("weathercode"),
+            current.get("time"),
+        ])
+
+    table_lines = ["ZIP | City | °F | Wind mph"]
+    table_lines += [f"{r[0]} | {r[1]}, {r[2]} | {r[3]} | {r[4]}" for r in rows]
+    table_lines += [f"{code} | error: {message}" for code, message in failures.items()]
+
+    return {
+        "ok": bool(rows),
+        "status": 200 if rows else None,
+        "data": {
+            "columns": columns,
+            "rows": rows,
+            "failed": failures,
+            "table": "\n".join(table_lines),
+        },
+        "error": None if rows else "No weather could be retrieved for the requested ZIP codes.",
+    }
@@ -0,0 +1,50 @@
+"""ADK Dev UI backed by the project's session service.
+
+`adk web` only knows its built-in session backends, so this launcher builds the
+same FastAPI app around `make_session_service()`, so UI sessions survive
+restarts. The UI lists sessions under the agent's folder name (`interactive`);
+the CLI, batch runs and `app.server` write theirs under `app.main.APP_NAME`
+("app") to the same file, so they do not show up here.
+
+    python -m app.web [agents_dir] [--host 127.0.0.1] [--port 8000]
+"""
+
+import argparse
+from pathlib import Path
+
+import google.adk.cli as adk_cli
+import uvicorn
+from google.adk.artifacts.in_memory_artifact_service import InMemoryArtifactService
+from google.adk.auth.credential_service.in_memory_credential_service import InMemoryCredentialService
+from google.adk.cli.adk_web_server import AdkWebServer
+from google.adk.cli.utils.agent_loader import AgentLoader
+from google.adk.evaluation.local_eval_set_results_manager import LocalEvalSetResultsManager
+from google.adk.evaluation.local_eval_sets_manager import LocalEvalSetsManager
+from google.adk.memory.in_memory_memory_service import InMemoryMemoryService
+
+from app.metrics import start_exporters
+from app.sessions import make_session_service
+
+
+def build_web_app(agents_dir: str = "agents"):
+    start_exporters()
+    server = AdkWebServer(
+        agent_loader=AgentLoader(agents_dir),
+        session_service=make_session_service(),
+        memory_service=InMemoryMemoryService(),
+        artifact_service=InMemoryArtifactService(),
+        credential_service=InMemoryCredentialService(),
+        eval_sets_manager=LocalEvalSetsManager(agents_dir=agents_dir),
+        eval_set_results_manager=LocalEvalSetResultsManager(agents_dir=agents_dir),
+        agents_dir=agents_dir,
+    )
+    return server.get_fast_api_app(web_assets_dir=Path(adk_cli.__file__).parent / "browser")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the ADK Dev UI with persistent sessions.")
+    parser.add_argument("agents_dir", nargs="?", default="agents")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    uvicorn.run(build_web_app(args.agents_dir), host=args.host, port=args.port)
@@ -0,0 +1,133 @@
+"""Offline ZIP -> (lat, lon, city, state) index backed by a memory-mapped file.
+
+The index is a sorted array of fixed-size records followed by a UTF-8 string
+table, so a lookup is a binary search over the mapped bytes with no parsing at
+load time. It is opened lazily on first use; `weather_by_zip` falls back to
+zippopotam.us for ZIPs the index does not contain.
+
+The bundled file covers every civilian US ZIP; coordinates are from GeoNames
+(CC BY 4.0). Regenerate it with `python scripts/build_zip_index.py`.
+"""
+
+import mmap
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional
+
+DEFAULT_INDEX_PATH = Path(__file__).resolve().parent / "data" / "zip_centroids.bin"
+ZIP_INDEX_PATH = Path(os.getenv("ZIP_INDEX_PATH", str(DEFAULT_INDEX_PATH)))
+
+_MAGIC = b"ZIPI"
+_VERSION = 1
+# magic, version, reserved, record count, string table offset
+_HEADER = struct.Struct("<4sHHII")
+# zip, latitude, longitude, city offset, city length, state
+_RECORD = struct.Struct("<IffIH2s")
+_ZIP = struct.Struct("<I")
+
+
+class ZipPlace(NamedTuple):
+    zip: str
+    latitude: float
+    longitude: float
+    city: str
+    state: str
+
+
+class ZipIndex:
+    """Read-only view over an index file."""
+
+    def __init__(self, path: Path) -> None:
+        with open(path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, count, strings_at = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} is not a v{_VERSION} ZIP index")
+        self._count = count
+        self._strings_at = strings_at
+
+    def __len__(self) -> int:
+        return self._count
+
+    def lookup(self, zip_code: str) -> Optional[ZipPlace]:
+        try:
+            key = int(zip_code)
+        except ValueError:
+            return None
+        lo, hi = 0, self._count
+        mm, base, size = self._mm, _HEADER.size, _RECORD.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            (value,) = _ZIP.unpack_from(mm, base + mid * size)
+            if value < key:
+                lo = mid + 1
+            elif value > key:
+                hi = mid
+            else:
+                _, lat, lon, city_at, city_len, state = _RECORD.unpack_from(
+                    mm, base + mid * size
+                )
+                start = self._strings_at + city_at
+                city = mm[start:start + city_len].decode("utf-8")
+                return ZipPlace(f"{key:05d}", round(lat, 4), round(lon, 4), city, state.decode("ascii").strip())
+        return None
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+def write_index(places: Iterable[ZipPlace], path: Path) -> int:
+    """Write `places` to `path` in index format and return the record count."""
+    by_zip = {int(place.zip): place for place in places}
+    strings = bytearray()
+    records = []
+    for key in sorted(by_zip):
+        place = by_zip[key]
+        city = place.city.encode("utf-8")
+        records.append(
+            _RECORD.pack(
+                key,
+                place.latitude,
+                place.longitude,
+                len(strings),
+                len(city),
+                place.state.encode("ascii")[:2].ljust(2),
+            )
+        )
+        strings += city
+    strings_at = _HEADER.size + len(records) * _RECORD.size
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as fh:
+        fh.write(_HEADER.pack(_MAGIC, _VERSION, 0, len(records), strings_at))
+        fh.writelines(records)
+        fh.write(strings)
+    return len(records)
+
+
+_index: Optional[ZipIndex] = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+
+def _load_index() -> Optional[ZipIndex]:
+    global _index, _index_loaded
+    if not _index_loaded:
+        with _index_lock:
+            if not _index_loaded:
+                try:
+                    _index = ZipIndex(ZIP_INDEX_PATH)
+                except (OSError, ValueError):
+                    _index = None
+                _index_loaded = True
+    return _index
+
+
+def lookup_zip(zip_code: str) -> Optional[ZipPlace]:
+    """Return the bundled centroid for `zip_code`, or None if it isn't indexed."""
+    index = _load_index()
+    if index is None:
+        return None
+    return index.lookup(zip_code)
@@ -0,0 +1,82 @@
+"""Per-turn cost of OllamaToolCallBridgePlugin.before_model_callback vs history length.
+
+Usage:
+    python benchmarks/bench_bridge_history.py [--sizes 10,100,1000] [--turns 20]
+
+For each size, a session is primed with that many history entries and then
+grown by one tool round trip per turn. "warm" is the mean callback time once
+the plugin has seen the session; "cold" is the first call, which normalizes
+the full history. Warm cost should stay flat as history grows.
+"""
+
+import argparse
+import asyncio
+import copy
+import gc
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from google.genai import types  # noqa: E402
+
+from app.plugins import OllamaToolCallBridgePlugin  # noqa: E402
+
+PAYLOAD = {"result": {"items": [{"id": i, "title": f"item {i}"} for i in range(20)]}}
+
+
+def _turn(i: int) -> list:
+    return [
+        types.Content(role="user", parts=[types.Part(text=f"fetch page {i}")]),
+        types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name="http_get", args={"url": f"https://example.test/{i}"}))]),
+        types.Content(role="user", parts=[types.Part(function_response=types.FunctionResponse(name="http_get", response=PAYLOAD))]),
+    ]
+
+
+async def _run(size: int, turns: int) -> tuple[float, float]:
+    plugin = OllamaToolCallBridgePlugin(allowed_tool_names={"calc", "http_get", "weather_by_zip"})
+    ctx = SimpleNamespace(session=SimpleNamespace(id=f"bench-{size}", app_name="bench", user_id="u"), agent=None)
+    history = []
+    while len(history) < size:
+        history += _turn(len(history))
+    history = history[:size]
+
+    request = SimpleNamespace(contents=copy.deepcopy(history))
+    started = time.perf_counter()
+    await plugin.before_model_callback(callback_context=ctx, llm_request=request)
+    cold = time.perf_counter() - started
+
+    elapsed = 0.0
+    for i in range(turns):
+        history += _turn(size + i)
+        request = SimpleNamespace(contents=copy.deepcopy(history))
+        # The plugin swaps ADK's per-call copies for its cached entries; hold the
+        # copies so freeing them (ADK's cost, paid whenever the request is
+        # dropped) and collector pauses stay out of the timing.
+        adk_copies = list(request.contents)
+        gc.collect()
+        gc.disable()
+        started = time.perf_counter()
+        await plugin.before_model_callback(callback_context=ctx, llm_request=request)
+        elapsed += time.perf_counter() - started
+        gc.enable()
+        del adk_copies
+    return cold, elapsed / turns
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,100,1000")
+    parser.add_argument("--turns", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'history':>8} {'cold ms':>10} {'warm ms/turn':>14}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        cold, warm = asyncio.run(_run(size, args.turns))
+        print(f"{size:>8} {cold * 1000:>10.3f} {warm * 1000:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Append and load throughput of SqliteSessionService on long sessions.
+
+Usage:
+    python benchmarks/bench_sessions.py [--events 10000] [--sessions 2] [--window 200]
+
+Each session is filled with tool-call turns (user message, function call,
+function response, answer). "per-turn" is the default batching, with one
+transaction per turn; "per-event" commits every event, as an unbatched store
+would. Loads are timed for the full history, the SESSION_LOAD_EVENTS window,
+and paging through `iter_events`.
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from google.adk.events.event import Event  # noqa: E402
+from google.adk.sessions import InMemorySessionService  # noqa: E402
+from google.genai import types  # noqa: E402
+
+from app.sessions import SqliteSessionService  # noqa: E402
+
+PAYLOAD = {"result": {"items": [{"id": i, "title": f"item {i}"} for i in range(5)]}}
+
+
+def _turn(i: int) -> list:
+    call = types.FunctionCall(name="http_get", args={"url": f"https://example.test/{i}"}, id=f"call-{i}")
+    reply = types.FunctionResponse(name="http_get", response=PAYLOAD, id=f"call-{i}")
+    return [
+        Event(author="user", invocation_id=f"inv-{i}", content=types.Content(role="user", parts=[types.Part(text=f"fetch page {i}")])),
+        Event(author="root", invocation_id=f"inv-{i}", content=types.Content(role="model", parts=[types.Part(function_call=call)])),
+        Event(author="user", invocation_id=f"inv-{i}", content=types.Content(role="user", parts=[types.Part(function_response=reply)])),
+        Event(author="root", invocation_id=f"inv-{i}", content=types.Content(role="model", parts=[types.Part(text=f"page {i} has 5 items")])),
+    ]
+
+
+async def _fill(service, sessions: int, events: int) -> float:
+    turns = [_turn(i) for i in range(events // 4)]
+    elapsed = 0.0
+    for s in range(sessions):
+        session = await service.create_session(app_name="bench", user_id="u", session_id=f"s{s}")
+        started = time.perf_counter()
+        for turn in turns:
+            for event in turn:
+                await service.append_event(session, event)
+        if hasattr(service, "aflush"):
+            await service.aflush()
+        elapsed += time.perf_counter() - started
+    return sessions * len(turns) * 4 / elapsed
+
+
+async def _timed(coro) -> tuple:
+    started = time.perf_counter()
+    result = await coro
+    return time.perf_counter() - started, result
+
+
+async def main(events: int, sessions: int, window: int) -> None:
+    print(f"{sessions} session(s) x {events} events")
+    rate = await _fill(InMemorySessionService(), sessions, events)
+    print(f"  append  in-memory     {rate:>10,.0f} events/s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        per_event = SqliteSessionService(f"{tmp}/per_event.db", flush_events=1, retention_days=0)
+        rate = await _fill(per_event, sessions, events)
+        print(f"  append  per-event     {rate:>10,.0f} events/s  ({per_event.flushes} transactions)")
+        await per_event.aclose()
+
+        path = f"{tmp}/per_turn.db"
+        batched = SqliteSessionService(path, retention_days=0)
+        rate = await _fill(batched, sessions, events)
+        print(f"  append  per-turn      {rate:>10,.0f} events/s  ({batched.flushes} transactions)")
+        await batched.aclose()
+
+        full = SqliteSessionService(path, retention_days=0)
+        seconds, session = await _timed(full.get_session(app_name="bench", user_id="u", session_id="s0"))
+        print(f"  load    full          {seconds * 1000:>10.1f} ms  ({len(session.events)} events, {len(session.events) / seconds:,.0f} events/s)")
+
+        async def pages() -> int:
+            count = 0
+            async for page in full.iter_events(app_name="bench", user_id="u", session_id="s0"):
+                count += len(page)
+            return count
+
+        seconds, count = await _timed(pages())
+        print(f"  load    paged (500)   {seconds * 1000:>10.1f} ms  ({count} events)")
+        await full.aclose()
+
+        windowed = SqliteSessionService(path, load_events=window, retention_days=0)
+        seconds, session = await _timed(windowed.get_session(app_name="bench", user_id="u", session_id="s0"))
+        print(f"  load    window {window:<6} {seconds * 1000:>10.1f} ms  ({len(session.events)} events)")
+        await windowed.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=10_000, help="events per session")
+    parser.add_argument("--sessions", type=int, default=2)
+    parser.add_argument("--window", type=int, default=200, help="SESSION_LOAD_EVENTS for the windowed load")
+    args = parser.parse_args()
+    asyncio.run(main(args.events, args.sessions, args.window))
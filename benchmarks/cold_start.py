@@ -0,0 +1,59 @@
+"""Cold-start time of each startup path, in fresh interpreters, against targets.
+
+Usage:
+    python benchmarks/cold_start.py [--repeat 3] [--target runner=8] [--output cold_start.json] [--profile]
+
+Stages (app/startup.py): "tools" imports the tools alone (scripts, workers),
+"app package" imports `app` without building anything, "runner" builds the
+CLI's Runner and "web app" the App that `adk web` serves. The two last are
+dominated by google.adk's own imports. Exits non-zero when a stage's median
+exceeds its target.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.startup import STAGES, format_profile, import_profile, time_stage  # noqa: E402
+
+# Seconds; "runner" and "web app" leave headroom over the ~9 s google.adk import on a laptop.
+TARGETS = {"tools": 0.5, "app package": 0.1, "runner": 12.0, "web app": 12.0}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per stage")
+    parser.add_argument("--target", action="append", default=[], metavar="STAGE=SECONDS", help="override a target")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--profile", action="store_true", help="also print the runner's import profile")
+    args = parser.parse_args()
+
+    targets = dict(TARGETS)
+    for item in args.target:
+        stage, _, seconds = item.partition("=")
+        targets[stage] = float(seconds)
+
+    results = {}
+    print(f"{'stage':<12} {'median':>8} {'min':>8} {'target':>8}")
+    for stage, statement in STAGES.items():
+        samples = [time_stage(statement) for _ in range(args.repeat)]
+        median = statistics.median(samples)
+        results[stage] = {"median_s": round(median, 3), "min_s": round(min(samples), 3), "target_s": targets.get(stage)}
+        verdict = "" if targets.get(stage) is None or median <= targets[stage] else "  SLOW"
+        print(f"{stage:<12} {median:>8.3f} {min(samples):>8.3f} {targets.get(stage, float('nan')):>8.2f}{verdict}")
+
+    if args.profile:
+        print()
+        print(format_profile(import_profile()))
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    slow = [s for s, r in results.items() if r["target_s"] is not None and r["median_s"] > r["target_s"]]
+    return 1 if slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
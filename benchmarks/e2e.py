@@ -0,0 +1,459 @@
+"""Offline end-to-end benchmark: root_agent + plugins + tools against fakes.
+
+Usage:
+    python benchmarks/e2e.py [--levels 1,10,100] [--tool-style native|text|mixed]
+                             [--stream] [--parallel-calls] [--llm-cache] [--tool-cache] [--backends 1]
+                             [--tool-schema] [--cassette PATH --cassette-mode record|replay]
+                             [--output results.json] [--baseline old.json]
+
+A FakeOllama server stands in for the model and scripts a calc -> http_get ->
+weather_by_zip chain, one call per model turn or, with `--parallel-calls`, all
+three in one turn; zippopotam.us, Open-Meteo and jsonplaceholder are
+answered by an in-process httpx transport with `--upstream-latency`. For each
+concurrency level the harness runs that many sessions at once (at least
+`--min-sessions`) through a Runner and reports p50/p95/p99 end-to-end latency,
+throughput, per-callback plugin overhead and per-tool latency.
+
+With `--baseline`, the run is compared to a previous results file and exits
+non-zero when any level's p95 latency or throughput regresses by more than
+`--tolerance`.
+
+With `--backends N` (N > 1) that many FakeOllama servers run and the model's
+calls go through app.routing.OllamaRouter; each level reports the requests
+each backend served.
+
+With `--tool-schema` requests that offer tools carry the reply schema as
+Ollama's `format` (OllamaOptionsPlugin) and the fake model answers as a
+constrained one would. Each level reports the bridge's `bridge_repairs`.
+
+`--cassette PATH --cassette-mode record` saves the model and upstream traffic
+of the run (app.cassette); `--cassette-mode replay` then runs the same levels
+from the file alone, with no FakeOllama, so latency is plugin, tool and
+framework overhead unless `--cassette-timing real` restores the recorded
+durations. A cassette recorded by `python -m app.main` replays too, if it
+was recorded with this harness's prompt.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import functools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import httpx  # noqa: E402
+from google.adk.agents.run_config import RunConfig, StreamingMode  # noqa: E402
+from google.adk.models.lite_llm import LiteLlm  # noqa: E402
+from google.adk.plugins.base_plugin import BasePlugin  # noqa: E402
+from google.adk.runners import Runner  # noqa: E402
+from google.adk.sessions import InMemorySessionService  # noqa: E402
+from google.genai import types  # noqa: E402
+
+from app import http_client  # noqa: E402
+from app.agents import OLLAMA_MODEL, TOOL_NAMES, get_root_agent  # noqa: E402
+from app.cassette import Cassette  # noqa: E402
+from app.logs import LOG_FILE, log, make_sinks  # noqa: E402
+from app.main import shutdown  # noqa: E402
+from app.ollama import OllamaClient  # noqa: E402
+from app.plugins import (  # noqa: E402
+    ContextBudgetPlugin,
+    LlmResponseCachePlugin,
+    LoggerPlugin,
+    OllamaOptionsPlugin,
+    OllamaToolCallBridgePlugin,
+    ToolResultCachePlugin,
+)
+from app.tools import HTTP_CACHE, WEATHER_CACHE  # noqa: E402
+from benchmarks.fake_ollama import FakeOllama, tool_chain_script  # noqa: E402
+
+APP_NAME = "bench"
+REPLAY_API_BASE = "http://127.0.0.1:9"  # never contacted when replaying
+PROMPT = (
+    "First compute 2*(5+7) with the calc tool. Then fetch https://jsonplaceholder.typicode.com/todos/1 "
+    "with http_get and summarize the title. Finally, ask for the weather in ZIP code 94040."
+)
+_CALLBACKS = (
+    "before_agent_callback",
+    "after_agent_callback",
+    "before_model_callback",
+    "after_model_callback",
+    "before_tool_callback",
+    "after_tool_callback",
+)
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+    return {
+        "p50": round(pick(0.50), 6),
+        "p95": round(pick(0.95), 6),
+        "p99": round(pick(0.99), 6),
+        "mean": round(statistics.fmean(ordered), 6),
+    }
+
+
+def upstream_transport(latency: float) -> httpx.AsyncBaseTransport:
+    """Canned zippopotam.us / Open-Meteo / jsonplaceholder answers after `latency` seconds."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        host = request.url.host
+        if host == "api.zippopotam.us":
+            return httpx.Response(200, json={"places": [{
+                "latitude": "37.3855", "longitude": "-122.0880",
+                "place name": "Mountain View", "state abbreviation": "CA",
+            }]})
+        if host == "api.open-meteo.com":
+            current = {
+                "temperature": 61.2, "windspeed": 4.5, "winddirection": 270,
+                "weathercode": 1, "time": "2025-01-01T12:00", "interval": 900,
+            }
+            count = len(request.url.params.get("latitude", "").split(","))
+            if count > 1:
+                return httpx.Response(200, json=[{"current_weather": current}] * count)
+            return httpx.Response(200, json={"current_weather": current})
+        if host == "jsonplaceholder.typicode.com":
+            # Like the real service: cacheable for 12 h, with an ETag for revalidation.
+            headers = {"Cache-Control": "max-age=43200", "ETag": 'W/"53-todo1"'}
+            if request.headers.get("If-None-Match") == headers["ETag"]:
+                return httpx.Response(304, headers=headers)
+            todo = {"userId": 1, "id": 1, "title": "delectus aut autem", "completed": False}
+            return httpx.Response(200, json=todo, headers=headers)
+        return httpx.Response(404, json={"error": "unknown upstream"})
+
+    return httpx.MockTransport(handler)
+
+
+def time_plugin(plugin: BasePlugin, samples: Dict[str, List[float]]) -> BasePlugin:
+    """Record the wall time of each callback `plugin` overrides under "<name>.<callback>"."""
+    for callback in _CALLBACKS:
+        if getattr(type(plugin), callback) is getattr(BasePlugin, callback):
+            continue
+        original = getattr(plugin, callback)
+
+        @functools.wraps(original)
+        async def timed(*args: Any, _original: Any = original, _key: str = f"{plugin.name}.{callback}", **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return await _original(*args, **kwargs)
+            finally:
+                samples[_key].append(time.perf_counter() - started)
+
+        setattr(plugin, callback, timed)
+    return plugin
+
+
+class ToolTimerPlugin(BasePlugin):
+    """Measures each tool call from before_tool to after_tool (tool body + later plugins)."""
+
+    def __init__(self, samples: Dict[str, List[float]]) -> None:
+        super().__init__(name="bench_tool_timer")
+        self._samples = samples
+        self._started: Dict[str, float] = {}
+
+    async def before_tool_callback(self, *, tool: Any, tool_args: dict, tool_context: Any) -> None:
+        self._started[tool_context.function_call_id] = time.perf_counter()
+
+    async def after_tool_callback(self, *, tool: Any, tool_args: dict, tool_context: Any, result: dict) -> None:
+        started = self._started.pop(tool_context.function_call_id, None)
+        if started is not None:
+            self._samples[tool.name].append(time.perf_counter() - started)
+
+
+def bench_agent(api_base: str, *more: str, cassette: Optional[Cassette] = None) -> Any:
+    """root_agent with its model pointed at `api_base` (routed across `more` too) instead of OLLAMA_API_BASE.
+
+    With `cassette` the model's calls are recorded to it or replayed from it.
+    """
+    if more:
+        from app.routing import OllamaRouter
+
+        client = OllamaRouter([api_base, *more])
+        kwargs = {}
+    else:
+        client, kwargs = OllamaClient(), {"api_base": api_base}
+    if cassette is not None:
+        client = cassette.client(client)
+    model = LiteLlm(model=f"ollama_chat/{OLLAMA_MODEL}", llm_client=client, **kwargs)
+    return get_root_agent().model_copy(update={"model": model})
+
+
+async def run_level(
+    agent: Any,
+    *,
+    concurrency: int,
+    sessions: int,
+    stream: bool,
+    llm_cache: bool = False,
+    tool_cache: bool = False,
+    tool_schema: bool = False,
+) -> Dict[str, Any]:
+    plugin_samples: Dict[str, List[float]] = defaultdict(list)
+    tool_samples: Dict[str, List[float]] = defaultdict(list)
+    session_service = InMemorySessionService()
+    # Off by default: every session sends the same prompt, so caches would hide the model and tools.
+    response_cache = LlmResponseCachePlugin(maxsize=1024 if llm_cache else 0)
+    result_cache = ToolResultCachePlugin(maxsize=1024 if tool_cache else 0)
+    bridge = OllamaToolCallBridgePlugin(allowed_tool_names=TOOL_NAMES)
+    runner = Runner(
+        agent=agent,
+        app_name=APP_NAME,
+        session_service=session_service,
+        plugins=[
+            time_plugin(bridge, plugin_samples),
+            time_plugin(ContextBudgetPlugin(), plugin_samples),
+            time_plugin(OllamaOptionsPlugin(tool_schema=tool_schema), plugin_samples),
+            time_plugin(response_cache, plugin_samples),
+            time_plugin(LoggerPlugin(), plugin_samples),
+            ToolTimerPlugin(tool_samples),
+            result_cache,  # after the timer: hits and joined calls count as (fast) tool calls
+        ],
+    )
+    run_config = RunConfig(streaming_mode=StreamingMode.SSE if stream else StreamingMode.NONE)
+    slots = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors: List[str] = []
+    completed = 0
+
+    async def one() -> None:
+        nonlocal completed
+        async with slots:
+            session_id = f"bench-{uuid.uuid4().hex[:12]}"
+            started = time.perf_counter()
+            final = None
+            try:
+                await session_service.create_session(app_name=APP_NAME, user_id="bench", session_id=session_id)
+                message = types.Content(role="user", parts=[types.Part(text=PROMPT)])
+                async for event in runner.run_async(
+                    user_id="bench", session_id=session_id, new_message=message, run_config=run_config
+                ):
+                    if event.is_final_response() and not event.partial:
+                        final = event
+            except Exception as exc:
+                errors.append(f"{type(exc).__name__}: {exc}")
+                return
+            latencies.append(time.perf_counter() - started)
+            if final is not None and final.content and final.content.parts:
+                completed += 1
+
+    WEATHER_CACHE.invalidate()
+    HTTP_CACHE.invalidate()
+    # Records are still built, queued and rendered as JSON; LOG_FILE keeps them.
+    log.sinks = make_sinks("json", LOG_FILE or os.devnull)
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        await asyncio.gather(*(one() for _ in range(sessions)))
+    wall = time.perf_counter() - started
+    await shutdown(runner)
+
+    per_session = sum(sum(v) for v in plugin_samples.values()) / max(1, sessions)
+    return {
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "completed": completed,
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "wall_s": round(wall, 4),
+        "throughput_sessions_per_s": round(sessions / wall, 3),
+        "latency_s": percentiles(latencies),
+        "plugin_overhead": {
+            "per_session_s": round(per_session, 6),
+            "callbacks": {name: {"calls": len(v), **percentiles(v)} for name, v in sorted(plugin_samples.items())},
+        },
+        "tool_latency_s": {name: {"calls": len(v), **percentiles(v)} for name, v in sorted(tool_samples.items())},
+        "weather_cache": WEATHER_CACHE.stats(),
+        "llm_cache": {**response_cache.cache.stats(), "seconds_saved": round(response_cache.seconds_saved, 3)},
+        "tool_cache": result_cache.cache.stats(),
+        "bridge_repairs": {"responses": bridge.responses, **bridge.repairs},
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).resolve().parents[1],
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+async def run_benchmark(
+    levels: List[int],
+    *,
+    min_sessions: int = 20,
+    tool_style: str = "native",
+    parallel_calls: bool = False,
+    stream: bool = False,
+    base_latency: float = 0.05,
+    prompt_rate: float = 2000.0,
+    gen_rate: float = 200.0,
+    upstream_latency: float = 0.02,
+    llm_cache: bool = False,
+    tool_cache: bool = False,
+    backends: int = 1,
+    tool_schema: bool = False,
+    cassette: Optional[Cassette] = None,
+) -> Dict[str, Any]:
+    results: Dict[str, Any] = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            "levels": levels,
+            "min_sessions": min_sessions,
+            "tool_style": tool_style,
+            "parallel_calls": parallel_calls,
+            "stream": stream,
+            "model_base_latency_s": base_latency,
+            "model_prompt_tokens_per_s": prompt_rate,
+            "model_gen_tokens_per_s": gen_rate,
+            "upstream_latency_s": upstream_latency,
+            "llm_cache": llm_cache,
+            "tool_cache": tool_cache,
+            "backends": backends,
+            "tool_schema": tool_schema,
+            "cassette": None if cassette is None else {"path": str(cassette.path), "mode": cassette.mode, "timing": cassette.timing},
+        },
+        "levels": [],
+    }
+    servers = [
+        FakeOllama(
+            tool_chain_script(tool_style=tool_style, parallel=parallel_calls), base_latency=base_latency, prompt_rate=prompt_rate, gen_rate=gen_rate
+        )
+        for _ in range(max(1, backends))
+    ]
+    upstream = upstream_transport(upstream_latency)
+    if cassette is not None and not cassette.recording:
+        servers = []  # replay: neither the model nor the upstreams are needed
+    http_client.set_transport(upstream if cassette is None else cassette.transport(inner=upstream))
+    try:
+        for server in servers:
+            server.start()
+        agent = bench_agent(*([server.url for server in servers] or [REPLAY_API_BASE]), cassette=cassette)
+        for level in levels:
+            level_result = await run_level(
+                agent,
+                concurrency=level,
+                sessions=max(level, min_sessions),
+                stream=stream,
+                llm_cache=llm_cache,
+                tool_cache=tool_cache,
+                tool_schema=tool_schema,
+            )
+            requests = [len(server.requests) for server in servers]
+            if not servers:
+                requests = [cassette.played["llm"]]
+                cassette.played.clear()
+            level_result["model_requests"] = sum(requests)
+            level_result["model_turns_per_session"] = round(sum(requests) / level_result["sessions"], 2)
+            if len(servers) > 1:
+                level_result["backend_requests"] = requests
+            for server in servers:
+                server.requests.clear()
+            results["levels"].append(level_result)
+    finally:
+        for server in servers:
+            server.stop()
+        http_client.set_transport(None)
+        if cassette is not None:
+            cassette.save()
+    return results
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions of p95 latency or throughput beyond `tolerance` (a fraction)."""
+    previous = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    problems = []
+    for level in current["levels"]:
+        old = previous.get(level["concurrency"])
+        if old is None:
+            continue
+        p95, old_p95 = level["latency_s"]["p95"], old["latency_s"]["p95"]
+        if p95 and old_p95 and p95 > old_p95 * (1 + tolerance):
+            problems.append(f"c={level['concurrency']}: p95 {old_p95:.3f}s -> {p95:.3f}s")
+        rate, old_rate = level["throughput_sessions_per_s"], old["throughput_sessions_per_s"]
+        if rate < old_rate * (1 - tolerance):
+            problems.append(f"c={level['concurrency']}: throughput {old_rate:.2f}/s -> {rate:.2f}/s")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--levels", default="1,10,100", help="comma-separated concurrent session counts")
+    parser.add_argument("--min-sessions", type=int, default=20, help="sessions run per level, at least")
+    parser.add_argument("--tool-style", choices=("native", "text", "mixed"), default="native")
+    parser.add_argument("--stream", action="store_true", help="run with SSE streaming")
+    parser.add_argument("--parallel-calls", action="store_true", help="fake model emits all tool calls in one turn")
+    parser.add_argument("--model-latency", type=float, default=0.05, help="fake model time to first token (s)")
+    parser.add_argument("--prompt-rate", type=float, default=2000.0, help="fake model prompt tokens per second")
+    parser.add_argument("--gen-rate", type=float, default=200.0, help="fake model tokens per second")
+    parser.add_argument("--upstream-latency", type=float, default=0.02, help="stub upstream latency (s)")
+    parser.add_argument("--llm-cache", action="store_true", help="answer repeated model requests from LlmResponseCachePlugin")
+    parser.add_argument("--tool-cache", action="store_true", help="reuse tool results via ToolResultCachePlugin")
+    parser.add_argument("--backends", type=int, default=1, help="fake Ollama servers, routed by OllamaRouter when > 1")
+    parser.add_argument("--tool-schema", action="store_true", help="constrain tool-deciding replies to the tool schema")
+    parser.add_argument("--cassette", help="record model and upstream traffic here, or replay it from here")
+    parser.add_argument("--cassette-mode", choices=("record", "replay"), default="replay")
+    parser.add_argument("--cassette-timing", choices=("none", "real"), default="none", help="replay at once or at recorded pace")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression fraction")
+    args = parser.parse_args()
+
+    results = asyncio.run(
+        run_benchmark(
+            [int(level) for level in args.levels.split(",")],
+            min_sessions=args.min_sessions,
+            tool_style=args.tool_style,
+            parallel_calls=args.parallel_calls,
+            stream=args.stream,
+            base_latency=args.model_latency,
+            prompt_rate=args.prompt_rate,
+            gen_rate=args.gen_rate,
+            upstream_latency=args.upstream_latency,
+            llm_cache=args.llm_cache,
+            tool_cache=args.tool_cache,
+            backends=args.backends,
+            tool_schema=args.tool_schema,
+            cassette=Cassette(args.cassette, args.cassette_mode, args.cassette_timing) if args.cassette else None,
+        )
+    )
+    print(f"{'conc':>5} {'sess':>5} {'err':>4} {'turns':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'sess/s':>8} {'plugin/sess':>12}")
+    for level in results["levels"]:
+        lat = level["latency_s"]
+        print(
+            f"{level['concurrency']:>5} {level['sessions']:>5} {level['errors']:>4} {level['model_turns_per_session']:>6.1f}"
+            f" {lat['p50']:>8.3f} {lat['p95']:>8.3f} {lat['p99']:>8.3f}"
+            f" {level['throughput_sessions_per_s']:>8.2f} {level['plugin_overhead']['per_session_s'] * 1000:>10.2f}ms"
+        )
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print(f"results -> {args.output}")
+    if args.baseline:
+        problems = compare(results, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
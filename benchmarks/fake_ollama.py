@@ -0,0 +1,247 @@
+"""Scriptable stand-in for an Ollama daemon's `/api/chat` endpoint.
+
+The server runs on its own thread and event loop so it never competes with the
+code under test. Latency follows a simple cost model: a fixed `base_latency`,
+plus prompt tokens divided by `prompt_rate`, plus completion tokens divided by
+`gen_rate`. Tokens are estimated as characters / 4. Streaming requests get
+NDJSON chunks paced at `gen_rate`, like the real daemon.
+
+What the "model" says is decided by a `script(request) -> Reply` callable. The
+default `tool_chain_script` walks calc -> http_get -> weather_by_zip -> answer,
+emitting each call either as native Ollama `tool_calls` or as the plain-text
+JSON that OllamaToolCallBridgePlugin rewrites. With `parallel=True` every
+remaining step is emitted in one reply (several tool_calls, or JSON lines).
+
+A request whose `format` is a JSON schema (app.tool_schema) is answered the way
+a schema-constrained model answers: calls as JSON text (an array for several)
+and the answer as `{"name": "response", "arguments": {"text": ...}}`.
+"""
+
+import asyncio
+import json
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from aiohttp import web
+
+DEFAULT_STEPS = [
+    ("calc", {"expression": "2*(5+7)"}),
+    ("http_get", {"url": "https://jsonplaceholder.typicode.com/todos/1"}),
+    ("weather_by_zip", {"zip_code": "94040"}),
+]
+
+_TOOL_RESULT = re.compile(r"^\w+ result: ", re.MULTILINE)
+
+
+@dataclass
+class Reply:
+    content: str = ""
+    tool_calls: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def completed_tool_calls(request: Dict[str, Any]) -> int:
+    """Tool results already in this conversation.
+
+    Native results arrive as role "tool"; the bridge plugin rewrites them into
+    user text of the form "<tool> result: ...", one line per parallel call.
+    """
+    count = 0
+    for message in request.get("messages", []):
+        role, content = message.get("role"), message.get("content") or ""
+        if role == "tool":
+            count += 1
+        elif role == "user":
+            count += len(_TOOL_RESULT.findall(content))
+    return count
+
+
+def tool_chain_script(
+    steps: Optional[List[tuple]] = None,
+    *,
+    tool_style: str = "native",
+    parallel: bool = False,
+    answer: str = "All done: 24, delectus aut autem, 61 °F.",
+) -> Callable[[Dict[str, Any]], Reply]:
+    """Call each (name, args) in `steps` in turn, then answer.
+
+    `tool_style` is "native" (Ollama tool_calls), "text" (plain-text JSON) or
+    "mixed" (alternating, starting with text). `parallel` emits all remaining
+    steps at once, as independent calls.
+    """
+    steps = list(DEFAULT_STEPS if steps is None else steps)
+
+    def script(request: Dict[str, Any]) -> Reply:
+        done = completed_tool_calls(request)
+        if done >= len(steps):
+            return Reply(content=answer)
+        batch = steps[done:] if parallel else steps[done:done + 1]
+        as_text = tool_style == "text" or (tool_style == "mixed" and done % 2 == 0)
+        if as_text:
+            return Reply(content="\n".join(json.dumps({"name": name, "arguments": args}) for name, args in batch))
+        return Reply(tool_calls=[{"function": {"name": name, "arguments": args}} for name, args in batch])
+
+    return script
+
+
+def constrained(reply: Reply) -> Reply:
+    """`reply` as it comes out under app.tool_schema's reply schema."""
+    calls = [{"name": call["function"]["name"], "arguments": call["function"]["arguments"]} for call in reply.tool_calls]
+    if not calls:
+        try:
+            calls = [json.loads(line) for line in reply.content.splitlines() if line.strip()]
+        except json.JSONDecodeError:
+            calls = []
+        if not calls or not all(isinstance(call, dict) and "name" in call for call in calls):
+            return Reply(content=json.dumps({"name": "response", "arguments": {"text": reply.content}}))
+    return Reply(content=json.dumps(calls if len(calls) > 1 else calls[0]))
+
+
+class FakeOllama:
+    """Background `/api/chat` server; use as a context manager or start()/stop()."""
+
+    def __init__(
+        self,
+        script: Optional[Callable[[Dict[str, Any]], Reply]] = None,
+        *,
+        base_latency: float = 0.05,
+        prompt_rate: float = 2000.0,
+        gen_rate: float = 50.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.script = script or tool_chain_script()
+        self.base_latency = base_latency
+        self.prompt_rate = prompt_rate
+        self.gen_rate = gen_rate
+        self.host = host
+        self.port = port
+        self.requests: List[Dict[str, Any]] = []
+        self.loads: List[Dict[str, Any]] = []  # /api/generate bodies (model warm-up)
+        self.in_flight = 0
+        self.healthy = True
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def __enter__(self) -> "FakeOllama":
+        self.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._serve, name="fake-ollama", daemon=True)
+        self._thread.start()
+        self._ready.wait(10)
+
+    def stop(self) -> None:
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(10)
+        self._loop = None
+
+    def _serve(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        app = web.Application()
+        app.router.add_post("/api/chat", self._chat)
+        app.router.add_post("/api/generate", self._generate)
+        app.router.add_get("/api/tags", self._tags)
+        app.router.add_get("/api/version", self._version)
+        self._runner = web.AppRunner(app)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, self.host, self.port)
+        self._loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _version(self, request: web.Request) -> web.Response:
+        if not self.healthy:
+            return web.json_response({"error": "unhealthy"}, status=503)
+        return web.json_response({"version": "0.0.0-fake"})
+
+    async def _tags(self, request: web.Request) -> web.Response:
+        if not self.healthy:
+            return web.json_response({"error": "unhealthy"}, status=503)
+        return web.json_response({"models": [{"name": "llama3:8b"}]})
+
+    async def _generate(self, request: web.Request) -> web.Response:
+        """Only the empty-prompt form, which just loads the model."""
+        body = await request.json()
+        self.loads.append(body)
+        if not self.healthy:
+            return web.json_response({"error": "unhealthy"}, status=503)
+        await asyncio.sleep(self.base_latency)
+        return web.json_response({"model": body.get("model"), "response": "", "done": True, "done_reason": "load"})
+
+    async def _chat(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.requests.append(body)
+        if not self.healthy:
+            return web.json_response({"error": "unhealthy"}, status=503)
+        self.in_flight += 1
+        try:
+            return await self._respond(request, body)
+        finally:
+            self.in_flight -= 1
+
+    async def _respond(self, request: web.Request, body: Dict[str, Any]) -> web.StreamResponse:
+        started = time.perf_counter()
+        reply = self.script(body)
+        if isinstance(body.get("format"), dict):
+            reply = constrained(reply)
+        prompt_tokens = estimate_tokens(json.dumps(body.get("messages", [])))
+        output = reply.content or json.dumps(reply.tool_calls)
+        eval_tokens = estimate_tokens(output)
+        prompt_time = self.base_latency + prompt_tokens / self.prompt_rate
+        await asyncio.sleep(prompt_time)
+
+        def stats() -> Dict[str, Any]:
+            total = time.perf_counter() - started
+            return {
+                "done": True,
+                "done_reason": "stop",
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(prompt_time * 1e9),
+                "eval_count": eval_tokens,
+                "eval_duration": int((total - prompt_time) * 1e9),
+                "total_duration": int(total * 1e9),
+            }
+
+        model = body.get("model", "llama3:8b")
+        if not body.get("stream"):
+            await asyncio.sleep(eval_tokens / self.gen_rate)
+            message = {"role": "assistant", "content": reply.content}
+            if reply.tool_calls:
+                message["tool_calls"] = reply.tool_calls
+            return web.json_response({"model": model, "message": message, **stats()})
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        text = reply.content
+        for i in range(0, len(text), 4):
+            await asyncio.sleep(1 / self.gen_rate)
+            chunk = {"model": model, "message": {"role": "assistant", "content": text[i:i + 4]}, "done": False}
+            await response.write((json.dumps(chunk) + "\n").encode())
+        final = {"model": model, "message": {"role": "assistant", "content": ""}, **stats()}
+        if reply.tool_calls:
+            final["message"]["tool_calls"] = reply.tool_calls
+        await response.write((json.dumps(final) + "\n").encode())
+        await response.write_eof()
+        return response
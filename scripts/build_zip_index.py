@@ -0,0 +1,89 @@
+"""Regenerate the memory-mapped ZIP centroid index used by weather_by_zip.
+
+Usage:
+    python scripts/build_zip_index.py [SOURCE] [--output PATH] [--geonames]
+    python scripts/build_zip_index.py --from-zipcodes [--csv PATH]
+
+SOURCE defaults to app/data/zip_centroids.csv, a CSV with the header
+`zip,latitude,longitude,city,state`. Pass `--geonames` to read the tab-separated
+GeoNames postal-code dump instead (e.g. US.txt from download.geonames.org), which
+is the same data zippopotam.us serves. `--from-zipcodes` reads the dataset
+embedded in the `zipcodes` package (`pip install zipcodes`; coordinates from
+GeoNames, CC BY 4.0) and with `--csv` also rewrites the bundled CSV; this is
+how the shipped files are made.
+"""
+
+import argparse
+import csv
+import sys
+from pathlib import Path
+from typing import Iterator
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.zip_index import DEFAULT_INDEX_PATH, ZipPlace, write_index  # noqa: E402
+
+DEFAULT_SOURCE = DEFAULT_INDEX_PATH.with_suffix(".csv")
+
+
+def _read_csv(path: Path) -> Iterator[ZipPlace]:
+    with open(path, newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh):
+            yield ZipPlace(
+                row["zip"].strip().zfill(5),
+                float(row["latitude"]),
+                float(row["longitude"]),
+                row["city"].strip(),
+                row["state"].strip(),
+            )
+
+
+def _read_geonames(path: Path) -> Iterator[ZipPlace]:
+    with open(path, newline="", encoding="utf-8") as fh:
+        for cols in csv.reader(fh, delimiter="\t"):
+            if len(cols) < 11 or not cols[1].isdigit():
+                continue
+            yield ZipPlace(cols[1].zfill(5), float(cols[9]), float(cols[10]), cols[2], cols[4])
+
+
+def _read_zipcodes() -> Iterator[ZipPlace]:
+    import zipcodes  # only needed to regenerate the bundled data
+
+    for row in zipcodes.list_all():
+        # APO/FPO ZIPs sit at overseas bases; zippopotam.us has no entry for them either.
+        if row["zip_code_type"] == "MILITARY" or row["state"] in ("AA", "AE", "AP") or not row["lat"]:
+            continue
+        yield ZipPlace(row["zip_code"], float(row["lat"]), float(row["long"]), row["city"], row["state"])
+
+
+def _write_csv(places: Iterator[ZipPlace], path: Path) -> Iterator[ZipPlace]:
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["zip", "latitude", "longitude", "city", "state"])
+        for place in places:
+            writer.writerow(place)
+            yield place
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", nargs="?", type=Path, default=DEFAULT_SOURCE)
+    parser.add_argument("--output", type=Path, default=DEFAULT_INDEX_PATH)
+    parser.add_argument("--geonames", action="store_true", help="read a GeoNames tab-separated dump")
+    parser.add_argument("--from-zipcodes", action="store_true", help="read the dataset of the zipcodes package")
+    parser.add_argument("--csv", type=Path, help="with --from-zipcodes, also write the places to this CSV")
+    args = parser.parse_args()
+
+    if args.from_zipcodes:
+        places = _read_zipcodes()
+        if args.csv:
+            places = _write_csv(places, args.csv)
+    else:
+        places = (_read_geonames if args.geonames else _read_csv)(args.source)
+    count = write_index(places, args.output)
+    size = args.output.stat().st_size
+    print(f"Wrote {count} ZIPs to {args.output} ({size} bytes)")
+
+
+if __name__ == "__main__":
+    main()
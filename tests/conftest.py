@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from app import http_client
+from app.tools import HTTP_CACHE, WEATHER_CACHE
+
+
+@pytest.fixture(autouse=True)
+def _isolate_shared_state():
+    """Tools share a pooled client and response caches; reset them per test."""
+    WEATHER_CACHE.invalidate()
+    HTTP_CACHE.invalidate()
+    yield
+    WEATHER_CACHE.invalidate()
+    HTTP_CACHE.invalidate()
+    http_client.set_transport(None)
+
+
+class EchoModel(BaseLlm):
+    """Answers "echo: <last user text>" after a short delay, reporting token usage."""
+
+    async def generate_content_async(self, llm_request, stream=False):
+        await asyncio.sleep(0.01)
+        prompt = llm_request.contents[-1].parts[0].text
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=f"echo: {prompt}")]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=3, candidates_token_count=2, total_token_count=5
+            ),
+        )
+
+
+@pytest.fixture
+def echo_model() -> EchoModel:
+    return EchoModel(model="echo")
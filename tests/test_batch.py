@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+from google.adk.agents import LlmAgent
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+
+from app.batch import run_batch
+
+
+def _run(model, input_path, output_path, *, resume):
+    sessions = InMemorySessionService()
+    runner = Runner(agent=LlmAgent(name="root", model=model), app_name="app", session_service=sessions)
+    return asyncio.run(
+        run_batch(runner, sessions, input_path, output_path, app_name="app", user_id="u", concurrency=3, resume=resume)
+    )
+
+
+def test_batch_writes_results_and_resumes(tmp_path, echo_model):
+    source = tmp_path / "prompts.jsonl"
+    source.write_text(
+        "\n".join(json.dumps({"id": f"p{i}", "prompt": f"question {i}"}) for i in range(5)) + "\n",
+        encoding="utf-8",
+    )
+    output = tmp_path / "results.jsonl"
+    output.write_text(
+        json.dumps({"id": "p0", "final_text": "old", "error": None}) + "\n"
+        + json.dumps({"id": "p1", "final_text": None, "error": "Timeout"}) + "\n",
+        encoding="utf-8",
+    )
+
+    counts = _run(echo_model, source, output, resume=True)
+    assert counts == {"total": 5, "skipped": 1, "ok": 4, "failed": 0}
+
+    results = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    fresh = {r["id"]: r for r in results[2:]}
+    assert sorted(fresh) == ["p1", "p2", "p3", "p4"]
+    assert fresh["p3"]["final_text"] == "echo: question 3"
+    assert fresh["p3"]["usage"] == {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5}
+    assert fresh["p3"]["latency_s"] >= 0
+
+
+def test_malformed_lines_become_failed_rows(tmp_path, echo_model):
+    source = tmp_path / "prompts.jsonl"
+    source.write_text('"first"\n{"id": "p2", "prompt": \n{"id": "p3"}\n[1, 2]\n"last"\n', encoding="utf-8")
+    output = tmp_path / "results.jsonl"
+
+    counts = _run(echo_model, source, output, resume=False)
+    assert counts == {"total": 5, "skipped": 0, "ok": 2, "failed": 3}
+    results = {r["id"]: r for r in map(json.loads, output.read_text(encoding="utf-8").splitlines())}
+    assert results["1"]["final_text"] == "echo: first" and results["5"]["final_text"] == "echo: last"
+    assert results["2"]["error"].startswith("line 2: invalid JSON")
+    assert results["p3"]["error"].startswith("line 3: no prompt field")
+    assert results["4"]["error"] == "line 4: expected a string or an object"
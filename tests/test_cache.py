@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+import httpx
+
+from app import http_client
+from app.cache import DiskCache, TTLCache
+from app.tools import HTTP_CACHE, WEATHER_CACHE, http_get, weather_by_zip
+
+
+def test_lru_ttl_and_counters():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" is now most recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    cache.set("d", 4, ttl=-1)  # not cached
+    assert cache.get("d") is None
+    assert cache.stats()["evictions"] == 1
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_disk_tier_survives_a_new_process_cache(tmp_path):
+    path = str(tmp_path / "cache.db")
+    TTLCache(disk=DiskCache(path)).set("k", {"v": 1})
+    fresh = TTLCache(disk=DiskCache(path))
+    assert fresh.get("k") == {"v": 1}
+    assert fresh.disk_hits == 1
+
+
+def test_concurrent_weather_requests_share_one_upstream_call():
+    calls = []
+    observed = time.strftime("%Y-%m-%dT%H:%M", time.gmtime())
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.host)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"current_weather": {
+            "temperature": 60.1, "windspeed": 5.0, "winddirection": 180,
+            "weathercode": 0, "time": observed, "interval": 900,
+        }})
+
+    http_client.set_transport(httpx.MockTransport(handler))
+
+    async def scenario():
+        return await asyncio.gather(*(weather_by_zip("94040") for _ in range(50)))
+
+    results = asyncio.run(scenario())
+    assert calls == ["api.open-meteo.com"]
+    assert all(r["ok"] and r["data"]["observed_at"] == observed for r in results)
+    assert WEATHER_CACHE.stats()["coalesced"] == 49
+
+    again = asyncio.run(weather_by_zip("94040"))
+    assert again["data"]["observed_at"] == observed
+    assert calls == ["api.open-meteo.com"]
+
+
+def test_http_get_honours_freshness_and_revalidates_with_etag():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append((request.url.path, request.headers.get("If-None-Match")))
+        if request.url.path == "/fresh":
+            return httpx.Response(200, json={"n": 1}, headers={"Cache-Control": "public, max-age=60"})
+        if request.url.path == "/private":
+            return httpx.Response(200, json={"n": 2}, headers={"Cache-Control": "no-store", "ETag": '"p"'})
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304, headers={"ETag": '"v1"', "Cache-Control": "no-cache"})
+        return httpx.Response(200, json={"n": 3}, headers={"ETag": '"v1"', "Cache-Control": "no-cache"})
+
+    http_client.set_transport(httpx.MockTransport(handler))
+
+    async def scenario():
+        return [await http_get(f"https://example.test/{path}") for path in ("fresh", "fresh", "private", "private", "etag", "etag")]
+
+    results = asyncio.run(scenario())
+    assert [r["data"] for r in results] == [{"n": 1}, {"n": 1}, {"n": 2}, {"n": 2}, {"n": 3}, {"n": 3}]
+    assert all(r["ok"] and r["status"] == 200 for r in results)
+    assert seen == [("/fresh", None), ("/private", None), ("/private", None), ("/etag", None), ("/etag", '"v1"')]
+    assert HTTP_CACHE.peek("https://example.test/private") is None
@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+import litellm
+import pytest
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from app import http_client
+from app.agents import TOOL_NAMES
+from app.cassette import Cassette, CassetteClient, CassetteMiss, _digest
+from app.ollama import request_options
+from app.plugins import OllamaToolCallBridgePlugin
+from benchmarks.e2e import bench_agent, upstream_transport
+from benchmarks.fake_ollama import FakeOllama
+
+PROMPT = "Compute 2*(5+7), fetch todo 1 and tell me the weather in 94040."
+
+
+def _converse(cassette, api_base, *, stream=False, prompt=PROMPT):
+    http_client.set_transport(cassette.transport(inner=upstream_transport(0)))
+    runner = Runner(
+        agent=bench_agent(api_base, cassette=cassette),
+        app_name="app",
+        session_service=InMemorySessionService(),
+        plugins=[OllamaToolCallBridgePlugin(allowed_tool_names=TOOL_NAMES)],
+    )
+
+    async def ask():
+        await runner.session_service.create_session(app_name="app", user_id="u", session_id="s")
+        message = types.Content(role="user", parts=[types.Part(text=prompt)])
+        run_config = RunConfig(streaming_mode=StreamingMode.SSE if stream else StreamingMode.NONE)
+        final, tools = "", []
+        async for event in runner.run_async(user_id="u", session_id="s", new_message=message, run_config=run_config):
+            tools += [call.name for call in event.get_function_calls()]
+            if event.is_final_response() and not event.partial and event.content and event.content.parts:
+                final = "".join(part.text or "" for part in event.content.parts)
+        await http_client.aclose_client()
+        return final, tools
+
+    return asyncio.run(ask())
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_replay_serves_the_recorded_conversation_offline(tmp_path, stream):
+    path = tmp_path / "incident.json.gz"
+    with FakeOllama(base_latency=0.001) as ollama:
+        recorder = Cassette(path, mode="record")
+        recorded = _converse(recorder, ollama.url, stream=stream)
+        recorder.save()
+        served = len(ollama.requests)
+    assert recorded[1] == ["calc", "http_get", "weather_by_zip"]
+
+    # The daemon is gone and the upstreams would answer differently; replay needs neither.
+    replayer = Cassette(path, mode="replay")
+    assert _converse(replayer, "http://127.0.0.1:9", stream=stream) == recorded
+    kinds = [interaction["kind"] for interaction in replayer.interactions]
+    assert kinds.count("llm-stream" if stream else "llm") == served
+    hosts = {interaction["url"].split("/")[2] for interaction in replayer.interactions if interaction["kind"] == "http"}
+    assert hosts == {"jsonplaceholder.typicode.com", "api.open-meteo.com"}  # the ZIP is in the offline index
+
+    with pytest.raises(CassetteMiss):
+        _converse(Cassette(path, mode="replay"), "http://127.0.0.1:9", stream=stream, prompt="Something else")
+
+
+def test_repeated_content_is_stored_once(tmp_path):
+    path = tmp_path / "incident.json"
+    with FakeOllama(base_latency=0.001) as ollama:
+        recorder = Cassette(path, mode="record")
+        _converse(recorder, ollama.url)
+        recorder.save()
+    data = json.loads(path.read_text())
+    requests = [data["blobs"][i["request"]] for i in data["interactions"] if i["kind"] == "llm"]
+    # Every request carries the system prompt and the tool list; the file holds one copy of each.
+    assert len({request["messages"][0] for request in requests}) == 1
+    assert len({request["tools"] for request in requests}) == 1
+    assert path.read_text().count("You are a helpful assistant") == 1
+
+
+def test_request_options_are_part_of_the_key(tmp_path):
+    client = CassetteClient(Cassette(tmp_path / "c.json", mode="record"))
+    messages = [{"role": "user", "content": "hi"}]
+
+    def key(options):
+        token = request_options.set(options)
+        try:
+            return _digest(client._request("ollama_chat/m", messages, None, {"api_base": "http://a"}))
+        finally:
+            request_options.reset(token)
+
+    plain = key(None)
+    assert key({"num_ctx": 8192}) == plain  # only sizes the context window
+    assert key({"format": "json"}) != plain  # a schema run must not replay a free-text answer
+
+
+def test_a_stream_that_breaks_off_is_not_recorded(tmp_path):
+    chunk = {"id": "c", "choices": [{"index": 0, "delta": {"content": "par"}}]}
+
+    class Inner:
+        async def acompletion(self, model, messages, tools, **kwargs):
+            async def stream():
+                yield litellm.ModelResponseStream(**chunk)
+                raise ConnectionError("daemon went away")
+
+            return stream()
+
+    client = CassetteClient(Cassette(tmp_path / "c.json", mode="record"), inner=Inner())
+
+    async def consume():
+        async for _ in await client.acompletion("ollama_chat/m", [{"role": "user", "content": "hi"}], None, stream=True):
+            pass
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(consume())
+    assert client.cassette.interactions == []
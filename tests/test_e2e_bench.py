@@ -0,0 +1,53 @@
+import asyncio
+
+from benchmarks.e2e import compare, run_benchmark
+
+
+def test_e2e_benchmark_runs_tool_chain_offline():
+    results = asyncio.run(
+        run_benchmark(
+            [1, 4],
+            min_sessions=4,
+            tool_style="mixed",
+            base_latency=0.001,
+            prompt_rate=1e6,
+            gen_rate=1e5,
+            upstream_latency=0.0,
+        )
+    )
+
+    for level in results["levels"]:
+        assert level["errors"] == 0, level["error_samples"]
+        assert level["completed"] == level["sessions"] == 4
+        # calc -> http_get -> weather_by_zip -> answer
+        assert level["model_requests"] == 4 * level["sessions"]
+        assert {name: t["calls"] for name, t in level["tool_latency_s"].items()} == {
+            "calc": 4, "http_get": 4, "weather_by_zip": 4,
+        }
+        assert "ollama_tool_call_bridge.before_model_callback" in level["plugin_overhead"]["callbacks"]
+        assert level["latency_s"]["p50"] <= level["latency_s"]["p99"]
+
+    slower = {"levels": [dict(level, latency_s=dict(level["latency_s"], p95=level["latency_s"]["p95"] * 2))
+                         for level in results["levels"]]}
+    assert compare(results, results, 0.2) == []
+    assert len(compare(slower, results, 0.2)) == 2
+
+
+def test_parallel_tool_calls_take_fewer_model_turns():
+    fast = dict(min_sessions=2, base_latency=0.001, prompt_rate=1e6, gen_rate=1e5, upstream_latency=0.0)
+    for tool_style in ("native", "text"):
+        (level,) = asyncio.run(run_benchmark([2], tool_style=tool_style, parallel_calls=True, **fast))["levels"]
+        assert level["errors"] == 0 and level["completed"] == 2, level["error_samples"]
+        # all three calls in one turn, then the answer
+        assert level["model_turns_per_session"] == 2
+        assert {name: t["calls"] for name, t in level["tool_latency_s"].items()} == {
+            "calc": 2, "http_get": 2, "weather_by_zip": 2,
+        }
+
+
+def test_streaming_sessions_route_across_backends():
+    fast = dict(min_sessions=4, base_latency=0.001, prompt_rate=1e6, gen_rate=1e5, upstream_latency=0.0)
+    (level,) = asyncio.run(run_benchmark([4], stream=True, backends=2, **fast))["levels"]
+    assert level["errors"] == 0 and level["completed"] == 4, level["error_samples"]
+    assert sum(level["backend_requests"]) == level["model_requests"] == 16
+    assert min(level["backend_requests"]) > 0
@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+from app.executor import Deadline, ToolExecutor
+
+
+def slow_tool(seconds: float) -> str:
+    """Blocking stand-in for a sync tool."""
+    time.sleep(seconds)
+    return "done"
+
+
+def test_sync_tools_run_off_the_event_loop():
+    executor = ToolExecutor(max_workers=4)
+    tool = executor.wrap(slow_tool)
+    assert tool.__name__ == "slow_tool"
+
+    async def scenario():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        beat = asyncio.create_task(heartbeat())
+        results = await asyncio.gather(*(tool(0.2) for _ in range(4)))
+        beat.cancel()
+        return results, ticks
+
+    started = time.monotonic()
+    results, ticks = asyncio.run(scenario())
+    executor.shutdown()
+    assert results == ["done"] * 4
+    assert time.monotonic() - started < 0.6
+    assert ticks >= 5
+
+
+def test_per_tool_concurrency_limit():
+    executor = ToolExecutor(limits={"probe": 2})
+    active = peak = 0
+
+    async def probe() -> None:
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+
+    tool = executor.wrap(probe)
+
+    async def scenario():
+        await asyncio.gather(*(tool() for _ in range(10)))
+
+    asyncio.run(scenario())
+    assert peak == 2
+
+
+def test_deadline_stops_backoff():
+    async def scenario():
+        budget = Deadline(0.0)
+        return await budget.backoff(5)
+
+    assert asyncio.run(scenario()) is False
@@ -0,0 +1,114 @@
+import asyncio
+
+import httpx
+
+from app import http_client
+from app.tools import http_get, weather_by_zip
+
+
+def _stub_transport(calls):
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.host)
+        if request.url.host == "api.zippopotam.us":
+            return httpx.Response(200, json={"places": [{
+                "latitude": "37.3855", "longitude": "-122.0880",
+                "place name": "Mountain View", "state abbreviation": "CA",
+            }]})
+        if request.url.host == "api.open-meteo.com":
+            return httpx.Response(200, json={"current_weather": {
+                "temperature": 61.2, "windspeed": 4.5, "winddirection": 270,
+                "weathercode": 1, "time": "2025-01-01T12:00",
+            }})
+        return httpx.Response(200, json={"title": "delectus aut autem"})
+
+    return httpx.MockTransport(handler)
+
+
+def test_tools_share_one_client():
+    calls = []
+    http_client.set_transport(_stub_transport(calls))
+
+    async def scenario():
+        first = http_client.get_client()
+        todo = await http_get("https://example.test/todos/1")
+        weather = await weather_by_zip("09001")  # an APO ZIP, not in the bundled index
+        assert http_client.get_client() is first
+        await http_client.aclose_client()
+        return todo, weather
+
+    try:
+        todo, weather = asyncio.run(scenario())
+    finally:
+        http_client.set_transport(None)
+
+    assert todo == {"ok": True, "status": 200, "data": {"title": "delectus aut autem"}, "error": None}
+    assert weather["ok"]
+    assert weather["data"]["location"]["city"] == "Mountain View"
+    assert weather["data"]["temperature_f"] == 61.2
+    assert calls == ["example.test", "api.zippopotam.us", "api.open-meteo.com"]
+
+
+def test_http_get_projects_fields_and_bounds_size():
+    chunks_sent = []
+    rows = [{"id": i, "name": f"row {i}", "blob": "x" * 5000} for i in range(100)]
+
+    async def endless():
+        for i in range(1000):
+            chunks_sent.append(i)
+            yield b"[" + b"0," * 4096
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/rows":
+            return httpx.Response(200, json={"total": 100, "rows": rows})
+        if request.url.path == "/declared":
+            return httpx.Response(200, content=b"[" + b"1," * 50_000 + b"1]")
+        return httpx.Response(200, content=endless())
+
+    http_client.set_transport(httpx.MockTransport(handler))
+
+    async def scenario():
+        return (
+            await http_get("https://example.test/rows", fields=["total", "rows[*].id", "rows[:2].name", "missing.key"]),
+            await http_get("https://example.test/rows", max_items=3),
+            await http_get("https://example.test/rows", fields=["rows[?(@.id)]"]),
+            await http_get("https://example.test/declared", max_bytes=10_000),
+            await http_get("https://example.test/stream", max_bytes=64_000),
+        )
+
+    try:
+        projected, summarized, bad_field, declared, streamed = asyncio.run(scenario())
+    finally:
+        http_client.set_transport(None)
+
+    assert projected["data"] == {
+        "total": 100,
+        "rows[*].id": {"length": 100, "first": list(range(20))},
+        "rows[:2].name": ["row 0", "row 1"],
+        "missing.key": None,
+    }
+    assert summarized["data"]["rows"]["length"] == 100
+    assert len(summarized["data"]["rows"]["first"]) == 3
+    assert summarized["data"]["rows"]["first"][0]["blob"].endswith("... [+3000 chars]")
+    assert not bad_field["ok"] and "Unsupported selector" in bad_field["error"]
+    assert declared == {"ok": False, "status": 200, "data": None, "error": "Response exceeds max_bytes=10000 (at least 100003 bytes)"}
+    assert not streamed["ok"] and streamed["error"].startswith("Response exceeds max_bytes")
+    assert len(chunks_sent) < 10
+
+
+def test_a_client_does_not_outlive_its_event_loop():
+    http_client.set_transport(_stub_transport([]))
+
+    async def scenario():
+        client = http_client.get_client()
+        slot = http_client.host_slot("https://api.open-meteo.com/v1/forecast")
+        async with slot:
+            await client.get("https://example.test/todos/1")
+        return client, slot
+
+    try:
+        first, first_slot = asyncio.run(scenario())
+        assert first.is_closed  # closed by asyncio.run() on its own loop, without aclose_client()
+        second, second_slot = asyncio.run(scenario())
+    finally:
+        http_client.set_transport(None)
+    assert second is not first and second_slot is not first_slot
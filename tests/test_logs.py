@@ -0,0 +1,88 @@
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from app import plugins
+from app.logs import AdkSink, JsonLinesSink, StructuredLogger
+from app.plugins import LoggerPlugin
+
+
+class ListSink:
+    def __init__(self):
+        self.records = []
+
+    def write(self, records):
+        self.records.extend(records)
+
+
+def _tool_context():
+    session = SimpleNamespace(id="s-1", user_id="u-1")
+    return SimpleNamespace(session=session, invocation_id="e-42", agent_name="root", function_call_id="call-7")
+
+
+def test_logger_plugin_records_are_leveled_sampled_bounded_and_correlated(monkeypatch):
+    sink = ListSink()
+    logger = StructuredLogger(level="INFO", sinks=[sink], sample="tool:start=0", max_string=20, max_items=2)
+    monkeypatch.setattr(plugins, "log", logger)
+    plugin = LoggerPlugin()
+    tool = SimpleNamespace(name="http_get")
+    args = {"url": "https://example.test/" + "x" * 100, "headers": {"Authorization": "Bearer abc"}}
+    result = {"ok": False, "status": 500, "data": list(range(10)), "error": "boom"}
+
+    async def scenario():
+        await plugin.before_tool_callback(tool=tool, tool_args=args, tool_context=_tool_context())
+        await plugin.after_tool_callback(tool=tool, tool_args=args, tool_context=_tool_context(), result=result)
+
+    asyncio.run(scenario())
+    logger.event("ollama-bridge", "DEBUG", msg="below LOG_LEVEL")
+    logger.event("tool:start", "WARNING", msg="warnings are never sampled out")
+    logger.flush()
+
+    assert logger.sampled_out == 1
+    assert [(r["event"], r["level"]) for r in sink.records] == [("tool:end", "WARNING"), ("tool:start", "WARNING")]
+    end = sink.records[0]
+    assert {k: end[k] for k in ("session_id", "user_id", "invocation_id", "function_call_id")} == {
+        "session_id": "s-1", "user_id": "u-1", "invocation_id": "e-42", "function_call_id": "call-7",
+    }
+    assert end["result"]["data"] == {"length": 10, "first": [0, 1]}
+
+    redacted = StructuredLogger(sinks=[sink], max_string=20)
+    redacted.event("tool:start", args=args, token="t0p-secret")
+    redacted.flush()
+    record = sink.records[-1]
+    assert record["token"] == "[redacted]"
+    assert record["args"]["headers"] == {"Authorization": "[redacted]"}
+    assert record["args"]["url"] == "https://example.test... [+101 chars]"
+    assert args["headers"]["Authorization"] == "Bearer abc"  # the caller's dict is left alone
+
+
+def test_sinks_and_a_full_queue_never_block(tmp_path, capsys):
+    path = tmp_path / "adk.jsonl"
+    logger = StructuredLogger(sinks=[JsonLinesSink(str(path)), AdkSink()])
+    logger.event("agent:start", context=_tool_context())
+    logger.flush()
+    assert json.loads(path.read_text())["session_id"] == "s-1"
+    assert capsys.readouterr().out == (
+        "[ADK][agent:start] session_id=s-1 user_id=u-1 invocation_id=e-42 agent_name=root function_call_id=call-7\n"
+    )
+
+    release = threading.Event()
+    entered = threading.Event()
+
+    class StuckSink:
+        def write(self, records):
+            entered.set()
+            release.wait(5)
+
+    stuck = StructuredLogger(sinks=[StuckSink()], queue_size=1)
+    stuck.event("tool:end", n=0)
+    assert entered.wait(5)
+    started = time.perf_counter()
+    for n in range(1, 5):
+        stuck.event("tool:end", n=n)
+    assert time.perf_counter() - started < 0.5
+    assert stuck.dropped == 3
+    release.set()
+    stuck.flush()
@@ -0,0 +1,47 @@
+import urllib.error
+import urllib.request
+
+from app.metrics import MetricsDumper, Registry, serve_metrics
+
+
+def test_registry_is_served_and_dumped_in_prometheus_format(tmp_path):
+    registry = Registry()
+    latency = registry.histogram("demo_seconds", "Demo latency.", ("tool",), buckets=(0.1, 1))
+    calls = registry.counter("demo_calls_total", "Demo calls.", ("tool",))
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.observe(value, tool='say "hi"')
+    calls.inc(tool="calc")
+    expected = "\n".join([
+        "# HELP demo_seconds Demo latency.",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{tool="say \\"hi\\"",le="0.1"} 2',
+        'demo_seconds_bucket{tool="say \\"hi\\"",le="1"} 3',
+        'demo_seconds_bucket{tool="say \\"hi\\"",le="+Inf"} 4',
+        'demo_seconds_sum{tool="say \\"hi\\""} 3.65',
+        'demo_seconds_count{tool="say \\"hi\\""} 4',
+        "# HELP demo_calls_total Demo calls.",
+        "# TYPE demo_calls_total counter",
+        'demo_calls_total{tool="calc"} 1',
+    ]) + "\n"
+    assert registry.render() == expected
+
+    server = serve_metrics(0, registry=registry)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert response.read().decode() == expected
+        try:
+            urllib.request.urlopen(f"{url}/other")
+            raise AssertionError("expected a 404")
+        except urllib.error.HTTPError as exc:
+            assert exc.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    path = tmp_path / "metrics.prom"
+    dumper = MetricsDumper(str(path), interval=3600, registry=registry).start()
+    calls.inc(tool="calc")
+    dumper.stop()
+    assert path.read_text().endswith('demo_calls_total{tool="calc"} 2\n')
@@ -0,0 +1,51 @@
+import asyncio
+
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from app import metrics
+from app.ollama import warm_up
+from app.plugins import OllamaOptionsPlugin
+from benchmarks.e2e import bench_agent
+from benchmarks.fake_ollama import FakeOllama, Reply
+
+
+def test_num_ctx_steps_up_at_once_and_down_after_the_hold():
+    plugin = OllamaOptionsPlugin(buckets=(2048, 8192), hold=0.05)
+    assert plugin.size(1000) == 2048
+    assert plugin.size(5000) == 8192
+    assert plugin.size(1000) == 8192  # held: every change reloads the model
+    asyncio.run(asyncio.sleep(0.06))
+    assert plugin.size(1000) == 2048
+    assert plugin.size(99999) == 8192
+
+
+def test_requests_carry_sized_options_and_truncation_is_counted():
+    plugin = OllamaOptionsPlugin(buckets=(2048, 4096), tool_num_predict=4)
+    with FakeOllama(lambda request: Reply(content="a fairly long answer"), base_latency=0.001) as ollama:
+        runner = Runner(
+            agent=bench_agent(ollama.url), app_name="app", session_service=InMemorySessionService(), plugins=[plugin]
+        )
+        before = metrics.MODEL_TRUNCATED.value(model=runner.agent.model.model)
+
+        async def ask():
+            await runner.session_service.create_session(app_name="app", user_id="u", session_id="s")
+            message = types.Content(role="user", parts=[types.Part(text="hello")])
+            async for _ in runner.run_async(user_id="u", session_id="s", new_message=message):
+                pass
+
+        asyncio.run(ask())
+        (request,) = ollama.requests
+    # System prompt and four tool declarations fit the smallest bucket.
+    assert request["options"] == {"num_ctx": 2048, "num_predict": 4}
+    assert plugin.truncated == 1
+    assert metrics.MODEL_TRUNCATED.value(model=runner.agent.model.model) == before + 1
+
+
+def test_warm_up_loads_the_model_on_every_daemon():
+    with FakeOllama(base_latency=0.001) as up, FakeOllama(base_latency=0.001) as down:
+        down.healthy = False
+        results = asyncio.run(warm_up([up.url, down.url], "llama3:8b", keep_alive="-1", num_ctx=2048))
+        assert results[down.url] is None and results[up.url] >= 0
+        assert up.loads == [{"model": "llama3:8b", "prompt": "", "stream": False, "keep_alive": -1, "options": {"num_ctx": 2048}}]
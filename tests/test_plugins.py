@@ -0,0 +1,574 @@
+import asyncio
+import copy
+import json
+import random
+from types import SimpleNamespace
+
+from google.adk.agents import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from app import metrics
+from app.cache import cache_policy
+from app.executor import ToolExecutor
+from app.plugins import (
+    ContextBudgetPlugin,
+    LlmResponseCachePlugin,
+    LoggerPlugin,
+    MetricsPlugin,
+    OllamaToolCallBridgePlugin,
+    ToolResultCachePlugin,
+    llm_request_key,
+)
+
+TOOLS = {"calc", "http_get", "weather_by_zip"}
+
+
+def _context(session_id: str) -> SimpleNamespace:
+    session = SimpleNamespace(id=session_id, app_name="app", user_id="u")
+    return SimpleNamespace(session=session, agent=None)
+
+
+def _turn(i: int) -> list[types.Content]:
+    return [
+        types.Content(role="user", parts=[types.Part(text=f"compute {i}+1")]),
+        types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name="calc", args={"expression": f"{i}+1"}))]),
+        types.Content(role="user", parts=[types.Part(function_response=types.FunctionResponse(name="calc", response={"result": str(i + 1)}))]),
+    ]
+
+
+def _request(history: list[types.Content]) -> SimpleNamespace:
+    # ADK hands every model call a fresh deep copy of the session history.
+    return SimpleNamespace(contents=copy.deepcopy(history))
+
+
+def test_before_model_only_normalizes_new_history():
+    plugin = OllamaToolCallBridgePlugin(allowed_tool_names=TOOLS)
+    converted = []
+    original = plugin._maybe_convert_part
+
+    def counting(part, allowed, **kwargs):
+        converted.append(part)
+        return original(part, allowed, **kwargs)
+
+    plugin._maybe_convert_part = counting
+    ctx = _context("s1")
+    history = _turn(0)
+
+    asyncio.run(plugin.before_model_callback(callback_context=ctx, llm_request=_request(history)))
+    assert len(converted) == 3
+
+    history += _turn(1)
+    request = _request(history)
+    asyncio.run(plugin.before_model_callback(callback_context=ctx, llm_request=request))
+    assert len(converted) == 6
+    assert request.contents[2].parts[0].text == "calc result: 1"
+    assert request.contents[5].parts[0].text == "calc result: 2"
+
+    # A rewritten history (e.g. replay from an earlier event) is reprocessed in full.
+    edited = _turn(7) + _turn(1)
+    asyncio.run(plugin.before_model_callback(callback_context=ctx, llm_request=_request(edited)))
+    assert len(converted) == 12
+
+
+class _EchoToolModel:
+    """Fake model: calls calc with the session's number, then answers via a bogus
+    `response` tool call that the bridge must fill from *this* session's result."""
+
+    @staticmethod
+    def build():
+        from google.adk.models.base_llm import BaseLlm
+        from google.adk.models.llm_response import LlmResponse
+
+        class EchoToolModel(BaseLlm):
+            async def generate_content_async(self, llm_request, stream=False):
+                await asyncio.sleep(random.random() / 100)
+                last = llm_request.contents[-1].parts[0]
+                if last.text and last.text.startswith("session "):
+                    call = types.FunctionCall(name="calc", args={"expression": f"{last.text[8:]}+0"})
+                else:
+                    call = types.FunctionCall(name="response", args={})
+                yield LlmResponse(content=types.Content(role="model", parts=[types.Part(function_call=call)]))
+
+        return EchoToolModel(model="fake-echo")
+
+
+def test_concurrent_sessions_never_share_tool_results():
+    from google.adk.agents import LlmAgent
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+
+    from app.tools import calc
+
+    agent = LlmAgent(name="root", model=_EchoToolModel.build(), tools=[calc])
+    sessions = InMemorySessionService()
+    runner = Runner(
+        agent=agent,
+        app_name="app",
+        session_service=sessions,
+        plugins=[OllamaToolCallBridgePlugin(allowed_tool_names={"calc"})],
+    )
+
+    async def converse(i: int) -> str:
+        session = await sessions.create_session(app_name="app", user_id=f"user-{i}")
+        message = types.Content(role="user", parts=[types.Part(text=f"session {i}")])
+        final = ""
+        async for event in runner.run_async(user_id=f"user-{i}", session_id=session.id, new_message=message):
+            if event.is_final_response() and event.content and event.content.parts:
+                final = event.content.parts[0].text or ""
+        return final
+
+    async def scenario():
+        return await asyncio.gather(*(converse(i) for i in range(200)))
+
+    finals = asyncio.run(scenario())
+    assert finals == [f"calc result: {i}" for i in range(200)]
+
+
+def test_streamed_json_tool_call_dispatches_when_object_closes():
+    from google.adk.agents import LlmAgent
+    from google.adk.agents.run_config import RunConfig, StreamingMode
+    from google.adk.models.base_llm import BaseLlm
+    from google.adk.models.llm_response import LlmResponse
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+
+    from app.tools import calc
+
+    call_text = '{"name": "calc", "arguments": {"expression": "2*(5+7)"}}\n\nDone {maybe}.'
+    progress = {"chunks": 0}
+
+    class StreamingModel(BaseLlm):
+        async def generate_content_async(self, llm_request, stream=False):
+            last = llm_request.contents[-1].parts[0]
+            text = call_text if last.text == "go" else "The answer is 24."
+            for i in range(0, len(text), 7):
+                progress["chunks"] += 1
+                chunk = types.Content(role="model", parts=[types.Part(text=text[i:i + 7])])
+                yield LlmResponse(content=chunk, partial=True)
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+    sessions = InMemorySessionService()
+    runner = Runner(
+        agent=LlmAgent(name="root", model=StreamingModel(model="fake-stream"), tools=[calc]),
+        app_name="app",
+        session_service=sessions,
+        plugins=[OllamaToolCallBridgePlugin(allowed_tool_names={"calc"})],
+    )
+
+    async def scenario():
+        await sessions.create_session(app_name="app", user_id="u", session_id="s")
+        events = []
+        async for event in runner.run_async(
+            user_id="u", session_id="s",
+            new_message=types.Content(role="user", parts=[types.Part(text="go")]),
+            run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+        ):
+            events.append((progress["chunks"], event))
+        return events
+
+    events = asyncio.run(scenario())
+    streamed = [e.content.parts[0].text for _, e in events if e.partial]
+    calls = [(n, e) for n, e in events if e.get_function_calls()]
+    responses = [e for _, e in events if e.get_function_responses()]
+    finals = [e for _, e in events if e.is_final_response()]
+
+    assert len(calls) == 1 and len(responses) == 1
+    closing_chunk = -(-len('{"name": "calc", "arguments": {"expression": "2*(5+7)"}}') // 7)
+    assert calls[0][0] == closing_chunk  # dispatched before the stream finished
+    assert responses[0].content.parts[0].function_response.response == {"result": "24"}
+    assert "".join(streamed) == "The answer is 24."
+    assert finals[-1].content.parts[0].text == "The answer is 24."
+
+
+def _fetch_turn(i: int, url: str) -> list[types.Content]:
+    payload = {"ok": True, "status": 200, "data": {"items": [{"id": n, "title": "x" * 60} for n in range(30)]}, "error": None}
+    return [
+        types.Content(role="user", parts=[types.Part(text=f"fetch {url} ({i})")]),
+        types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name="http_get", args={"url": url}))]),
+        types.Content(role="user", parts=[types.Part(function_response=types.FunctionResponse(name="http_get", response=payload))]),
+        types.Content(role="model", parts=[types.Part(text=f"done {i}")]),
+    ]
+
+
+def test_context_budget_compacts_old_tool_results_behind_the_bridge():
+    history = []
+    for i, url in enumerate(["https://a.test", "https://b.test", "https://a.test", "https://c.test"]):
+        history += _fetch_turn(i, url)
+    bridge = OllamaToolCallBridgePlugin(allowed_tool_names=TOOLS)
+    budget = ContextBudgetPlugin(budget=1500, keep_turns=1, tool_result_chars=200)
+    instruction = "You are a helpful assistant. " * 20
+    request = SimpleNamespace(
+        contents=copy.deepcopy(history), config=types.GenerateContentConfig(system_instruction=instruction)
+    )
+
+    async def run():
+        await bridge.before_model_callback(callback_context=_context("s"), llm_request=request)
+        bridged = list(request.contents)
+        bridged_texts = [c.parts[0].text for c in bridged]
+        await budget.before_model_callback(callback_context=_context("s"), llm_request=request)
+        return bridged, bridged_texts
+
+    bridged, bridged_texts = asyncio.run(run())
+    texts = [c.parts[0].text for c in request.contents]
+
+    # The first https://a.test result is superseded by the identical third call.
+    assert texts[2] == "http_get result: [superseded by a later call with the same arguments]"
+    # Older results are shrunk to an outline of the payload.
+    assert texts[6] == 'http_get result: {"ok": true, "status": 200, "data": {"items": "[30 items]"}, "error": null}'
+    # The most recent turn is untouched, and the bridge's cached entries were not edited.
+    assert texts[-4:] == bridged_texts[-4:]
+    assert [c.parts[0].text for c in bridged] == bridged_texts
+    assert 0 < budget.tokens_saved
+    total = len(instruction) + sum(len(t or "") for t in texts)
+    assert total / 4 <= 1500
+
+
+def test_context_budget_drops_oldest_turns_when_shrinking_is_not_enough():
+    history = []
+    for i in range(30):
+        history += _fetch_turn(i, f"https://example.test/{i}")
+    plugin = ContextBudgetPlugin(budget=800, keep_turns=2, tool_result_chars=100)
+    request = SimpleNamespace(contents=copy.deepcopy(history), config=None)
+
+    asyncio.run(plugin.before_model_callback(callback_context=_context("s"), llm_request=request))
+
+    first = request.contents[0].parts[0].text
+    assert first.endswith("earlier messages omitted to fit the context window]")
+    assert request.contents[1].parts[0].text.startswith("fetch ")  # cut at a turn boundary
+    assert request.contents[-8:] == history[-8:]
+    assert sum(len(json.dumps(c.model_dump(exclude_none=True))) for c in request.contents) < len(json.dumps([c.model_dump(exclude_none=True) for c in history]))
+
+
+def test_context_budget_leaves_small_requests_alone():
+    history = _fetch_turn(0, "https://a.test")
+    request = SimpleNamespace(contents=copy.deepcopy(history), config=None)
+    plugin = ContextBudgetPlugin(budget=100_000)
+    asyncio.run(plugin.before_model_callback(callback_context=_context("s"), llm_request=request))
+    assert request.contents == history and plugin.tokens_saved == 0
+
+
+class CalcThenAnswerModel(BaseLlm):
+    calls: int = 0
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.calls += 1
+        last = llm_request.contents[-1].parts[0]
+        if last.function_response:
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=f"it is {last.function_response.response['result']}")]))
+        else:
+            call = types.FunctionCall(name="calc", args={"expression": "6*7"}, id=f"call-{self.calls}")
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(function_call=call)]))
+
+
+def test_llm_cache_answers_a_repeated_conversation_without_the_model():
+    tool_runs = []
+
+    def calc(expression: str) -> dict:
+        tool_runs.append(expression)
+        return {"result": 42}
+
+    model = CalcThenAnswerModel(model="fake")
+    cache = LlmResponseCachePlugin(maxsize=16)
+    runner = InMemoryRunner(agent=LlmAgent(name="root", model=model, tools=[calc]), app_name="app", plugins=[cache])
+
+    async def ask(session_id):
+        await runner.session_service.create_session(app_name="app", user_id="u", session_id=session_id)
+        message = types.Content(role="user", parts=[types.Part(text="what is 6*7?")])
+        texts = []
+        async for event in runner.run_async(user_id="u", session_id=session_id, new_message=message):
+            if event.content and event.content.parts and event.content.parts[0].text:
+                texts.append(event.content.parts[0].text)
+        return texts
+
+    assert asyncio.run(ask("a")) == ["it is 42"]
+    assert asyncio.run(ask("b")) == ["it is 42"]
+    # The second session's two model calls were cache hits (its call ids differ from
+    # the first session's), but the tool still ran.
+    assert model.calls == 2
+    assert tool_runs == ["6*7", "6*7"]
+    assert cache.cache.stats()["hits"] == 2
+    assert cache.seconds_saved >= 0
+
+
+def _llm_request(model, text, instruction="be brief"):
+    return SimpleNamespace(
+        model=model,
+        contents=[types.Content(role="user", parts=[types.Part(text=text)])],
+        config=types.GenerateContentConfig(system_instruction=instruction, labels={"adk_agent_name": "root"}),
+    )
+
+
+def test_llm_cache_keys_bypass_and_invalidation():
+    assert llm_request_key(_llm_request("m1", "hi")) == llm_request_key(_llm_request("m1", "hi"))
+    assert llm_request_key(_llm_request("m1", "hi")) != llm_request_key(_llm_request("m2", "hi"))
+    assert llm_request_key(_llm_request("m1", "hi")) != llm_request_key(_llm_request("m1", "hi", "be verbose"))
+
+    cache = LlmResponseCachePlugin(maxsize=16)
+    context = SimpleNamespace(invocation_id="inv", state={})
+    reply = LlmResponse(content=types.Content(role="model", parts=[types.Part(text="hello")]))
+
+    async def call(request, response=reply):
+        hit = await cache.before_model_callback(callback_context=context, llm_request=request)
+        if hit is None and response is not None:
+            await cache.after_model_callback(callback_context=context, llm_response=response)
+        return hit
+
+    async def scenario():
+        # Partial chunks and errors are never stored.
+        assert await call(_llm_request("m1", "hi"), LlmResponse(partial=True, content=reply.content)) is None
+        assert await call(_llm_request("m1", "hi"), LlmResponse(error_code="500", error_message="boom")) is None
+        assert await call(_llm_request("m1", "hi")) is None
+        assert await call(_llm_request("m2", "hi")) is None
+        hit = await call(_llm_request("m1", "hi"))
+        assert hit.content.parts[0].text == "hello" and hit.custom_metadata == {"llm_cache": "hit"}
+
+        context.state["llm_cache_bypass"] = True
+        assert await call(_llm_request("m1", "hi")) is None
+        context.state.clear()
+
+        cache.invalidate("m1")
+        assert await call(_llm_request("m1", "hi"), None) is None
+        assert (await call(_llm_request("m2", "hi"))).content.parts[0].text == "hello"
+
+        # A failed or abandoned model call leaves nothing behind: a later response in the same
+        # invocation is not stored under its key, so the identical request still goes to the model.
+        forgets = [
+            lambda: cache.on_model_error_callback(callback_context=context, llm_request=None, error=RuntimeError("down")),
+            lambda: cache.after_agent_callback(agent=None, callback_context=context),
+        ]
+        for forget in forgets:
+            assert await call(_llm_request("m3", "hi"), None) is None
+            await forget()
+            await cache.after_model_callback(callback_context=context, llm_response=reply)
+            assert await call(_llm_request("m3", "hi"), None) is None
+
+    asyncio.run(scenario())
+
+
+class LoopingModel(BaseLlm):
+    """Calls lookup twice at once, repeats it on the next turn, then answers."""
+
+    calls: int = 0
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.calls += 1
+        if self.calls <= 2:
+            parts = [
+                types.Part(function_call=types.FunctionCall(name=name, args={"key": "k"}))
+                for name in ("lookup", "lookup", "flaky", "uncached")
+            ]
+            yield LlmResponse(content=types.Content(role="model", parts=parts))
+        else:
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text="done")]))
+
+
+def test_tool_cache_reuses_results_per_declared_policy():
+    runs = []
+
+    @cache_policy("ttl", ttl=60)
+    async def lookup(key: str) -> dict:
+        runs.append("lookup")
+        await asyncio.sleep(0.05)
+        return {"ok": True, "status": 200, "data": key, "error": None}
+
+    @cache_policy("pure")
+    def flaky(key: str) -> dict:
+        runs.append("flaky")
+        return {"ok": False, "status": None, "data": None, "error": "upstream down"}
+
+    def uncached(key: str) -> str:
+        runs.append("uncached")
+        return key
+
+    tools = ToolExecutor().wrap_all([lookup, flaky, uncached])
+    cache = ToolResultCachePlugin(maxsize=16)
+    agent = LlmAgent(name="root", model=LoopingModel(model="fake"), tools=tools)
+    runner = InMemoryRunner(agent=agent, app_name="app", plugins=[cache])
+
+    async def scenario():
+        await runner.session_service.create_session(app_name="app", user_id="u", session_id="s")
+        message = types.Content(role="user", parts=[types.Part(text="go")])
+        responses = []
+        async for event in runner.run_async(user_id="u", session_id="s", new_message=message):
+            responses += [p.function_response.response for p in event.content.parts if p.function_response]
+        return responses
+
+    responses = asyncio.run(scenario())
+    # lookup ran once: its overlapping twin waited for it, the next turn hit the cache.
+    assert runs.count("lookup") == 1
+    assert runs.count("flaky") == 2  # failures are never reused
+    assert runs.count("uncached") == 2  # no policy, always runs
+    assert [r for r in responses if r.get("data") == "k"] == [{"ok": True, "status": 200, "data": "k", "error": None}] * 4
+    assert cache.cache.stats()["hits"] == 2 and cache.cache.coalesced == 1
+
+
+def test_tool_cache_waiters_do_not_hang_on_a_cancelled_or_stuck_call():
+    @cache_policy("pure")
+    def lookup(key: str) -> dict:
+        return {"ok": True, "status": 200, "data": key, "error": None}
+
+    tool = SimpleNamespace(name="lookup", func=lookup)
+    cache = ToolResultCachePlugin(maxsize=16, join_timeout=0.1)
+
+    def call(call_id):
+        return cache.before_tool_callback(
+            tool=tool, tool_args={"key": "k"}, tool_context=SimpleNamespace(function_call_id=call_id)
+        )
+
+    async def leader(call_id):
+        assert await call(call_id) is None  # runs the tool...
+        await asyncio.sleep(3600)  # ...which never finishes
+
+    async def scenario():
+        first = asyncio.create_task(leader("a"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(call("b"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        # The cancelled leader never reaches after_tool; the waiter runs the tool itself at once.
+        assert await asyncio.wait_for(waiter, 0.05) is None
+        assert await asyncio.wait_for(call("e"), 0.05) is None  # nothing stale left to wait on
+
+        stuck = asyncio.create_task(leader("c"))
+        await asyncio.sleep(0)
+        started = asyncio.get_running_loop().time()
+        assert await call("d") is None  # gave up after join_timeout
+        assert 0.09 < asyncio.get_running_loop().time() - started < 1
+        assert await asyncio.wait_for(call("f"), 0.05) is None  # the stuck call no longer holds the key
+        stuck.cancel()
+
+    asyncio.run(scenario())
+
+
+class ParallelTextModel(BaseLlm):
+    """Emits `calls_text` as plain text, streamed in chunks when asked; answers once results arrive."""
+
+    calls_text: str
+    requests: list = []
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.requests.append(llm_request.contents[-1].model_copy(deep=True))
+        last = llm_request.contents[-1].parts[0]
+        text = self.calls_text if last.text == "go" else "done"
+        if stream:
+            for i in range(0, len(text), 9):
+                yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text[i:i + 9])]), partial=True)
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+def _run_parallel(calls_text, *, stream=False):
+    from google.adk.agents.run_config import RunConfig, StreamingMode
+
+    spans = []
+
+    async def slow(n: int) -> dict:
+        started = asyncio.get_running_loop().time()
+        await asyncio.sleep(0.1)
+        spans.append((n, started, asyncio.get_running_loop().time()))
+        return {"ok": True, "status": 200, "data": n, "error": None}
+
+    model = ParallelTextModel(model="fake", calls_text=calls_text, requests=[])
+    runner = InMemoryRunner(
+        agent=LlmAgent(name="root", model=model, tools=[slow]),
+        app_name="app",
+        plugins=[OllamaToolCallBridgePlugin(allowed_tool_names={"slow"})],
+    )
+
+    async def scenario():
+        await runner.session_service.create_session(app_name="app", user_id="u", session_id="s")
+        message = types.Content(role="user", parts=[types.Part(text="go")])
+        run_config = RunConfig(streaming_mode=StreamingMode.SSE if stream else StreamingMode.NONE)
+        events = []
+        async for event in runner.run_async(user_id="u", session_id="s", new_message=message, run_config=run_config):
+            events.append(event)
+        return events
+
+    return asyncio.run(scenario()), spans, model.requests
+
+
+def test_bridge_splits_several_text_tool_calls_and_runs_them_concurrently():
+    forms = [
+        '[{"name": "slow", "arguments": {"n": 1}}, {"name": "slow", "arguments": {"n": 2}}, {"name": "slow", "arguments": {"n": 3}}]',
+        '{"name": "slow", "arguments": {"n": 1}}\n{"name": "slow", "arguments": {"n": 2}}\n{"name": "slow", "arguments": {"n": 3}}',
+        '{"name": "slow", "arguments": {"n": 1}}, {"name": "slow", "arguments": {"n": 2}} {"name": "nope"} {"name": "slow", "arguments": {"n": 3}}',
+    ]
+    for calls_text in forms:
+        events, spans, requests = _run_parallel(calls_text)
+        calls = [e for e in events if e.get_function_calls()]
+        responses = [e for e in events if e.get_function_responses()]
+        assert len(calls) == 1 and [c.args["n"] for c in calls[0].get_function_calls()] == [1, 2, 3]
+        assert len(responses) == 1
+        assert [r.response["data"] for r in responses[0].get_function_responses()] == [1, 2, 3]
+        assert max(start for _, start, _ in spans) < min(end for _, _, end in spans)  # all overlapped
+        assert len(requests) == 2  # one turn for the calls, one for the answer
+        assert [p.text for p in requests[1].parts] == [
+            'slow result: {"ok": true, "status": 200, "data": 1, "error": null}\n',
+            'slow result: {"ok": true, "status": 200, "data": 2, "error": null}\n',
+            'slow result: {"ok": true, "status": 200, "data": 3, "error": null}',
+        ]
+        assert events[-1].content.parts[0].text == "done"
+
+
+def test_streamed_tool_calls_dispatch_first_call_early_and_the_rest_together():
+    calls_text = "\n".join(f'{{"name": "slow", "arguments": {{"n": {n}}}}}' for n in (1, 2, 3))
+    events, spans, requests = _run_parallel(calls_text, stream=True)
+    calls = [[c.args["n"] for c in e.get_function_calls()] for e in events if e.get_function_calls()]
+    assert calls == [[1], [2, 3]]
+    assert sorted(n for n, _, _ in spans) == [1, 2, 3]
+    later = [span for span in spans if span[0] != 1]
+    assert max(start for _, start, _ in later) < min(end for _, _, end in later)
+    assert len(requests) == 2
+    assert [e.content.parts[0].text for e in events if e.is_final_response()][-1] == "done"
+
+
+class UsageModel(CalcThenAnswerModel):
+    async def generate_content_async(self, llm_request, stream=False):
+        async for response in super().generate_content_async(llm_request, stream):
+            response.usage_metadata = types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=300, candidates_token_count=20
+            )
+            yield response
+
+
+def test_metrics_plugin_times_model_tool_and_plugin_callbacks():
+    def calc(expression: str) -> dict:
+        return {"result": 42}
+
+    runner = InMemoryRunner(
+        agent=LlmAgent(name="metered", model=UsageModel(model="fake-metrics"), tools=[calc]),
+        app_name="app",
+        plugins=[MetricsPlugin(), MetricsPlugin.instrument(LoggerPlugin())],
+    )
+    before = metrics.TOOL_SECONDS.snapshot(tool="calc", outcome="ok")["count"]
+
+    async def ask():
+        await runner.session_service.create_session(app_name="app", user_id="u", session_id="m")
+        message = types.Content(role="user", parts=[types.Part(text="what is 6*7?")])
+        async for _ in runner.run_async(user_id="u", session_id="m", new_message=message):
+            pass
+
+    asyncio.run(ask())
+    assert metrics.MODEL_SECONDS.snapshot(model="fake-metrics")["count"] == 2
+    assert metrics.MODEL_PROMPT_TOKENS.snapshot(model="fake-metrics") == {"count": 2, "sum": 600}
+    assert metrics.MODEL_OUTPUT_TOKENS.snapshot(model="fake-metrics")["sum"] == 40
+    assert metrics.TOOL_SECONDS.snapshot(tool="calc", outcome="ok")["count"] == before + 1
+    assert metrics.AGENT_SECONDS.snapshot(agent="metered")["count"] == 1
+    assert metrics.PLUGIN_CALLBACK_SECONDS.snapshot(plugin="logger", callback="after_tool_callback")["count"] >= 1
+    text = metrics.REGISTRY.render()
+    assert 'adk_model_prompt_tokens_bucket{model="fake-metrics",le="512"} 2' in text
+    assert 'adk_model_seconds_count{model="fake-metrics"} 2' in text
+
+
+def test_cli_and_adk_web_run_the_same_plugin_chain():
+    from google.adk.sessions import InMemorySessionService
+
+    from app import get_app
+    from app.main import build_runner
+
+    expected = ["metrics", "ollama_tool_call_bridge", "context_budget", "ollama_options", "llm_response_cache", "logger", "tool_result_cache"]
+    runner = build_runner(InMemorySessionService())
+    assert [plugin.name for plugin in runner.plugin_manager.plugins] == expected
+    assert [plugin.name for plugin in get_app().plugins] == expected
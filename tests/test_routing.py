@@ -0,0 +1,81 @@
+import asyncio
+import socket
+from contextlib import ExitStack
+
+import litellm
+import pytest
+
+from app.routing import OllamaRouter
+from benchmarks.fake_ollama import FakeOllama, Reply
+
+MODEL = "ollama_chat/llama3:8b"
+
+
+def _conversation(n):
+    return [{"role": "system", "content": "be brief"}, {"role": "user", "content": f"question {n}"}]
+
+
+def _dead_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}"
+
+
+def _servers(stack, count, **kwargs):
+    script = lambda request: Reply(content="ok")  # noqa: E731
+    return [stack.enter_context(FakeOllama(script, base_latency=kwargs.get("base_latency", 0.001))) for _ in range(count)]
+
+
+def test_spreads_load_and_keeps_conversations_on_one_backend():
+    with ExitStack() as stack:
+        servers = _servers(stack, 3, base_latency=0.05)
+        router = OllamaRouter([s.url for s in servers], health_interval=0)
+
+        async def scenario():
+            # Six new conversations at once: least outstanding requests puts two on each.
+            await asyncio.gather(*(router.acompletion(MODEL, _conversation(n), None) for n in range(6)))
+            assert [len(s.requests) for s in servers] == [2, 2, 2]
+            # One conversation's follow-ups go back to the backend that served it.
+            for turn in range(3):
+                messages = _conversation(0) + [{"role": "assistant", "content": "ok"}] * turn
+                await router.acompletion(MODEL, messages, None)
+            counts = [len(s.requests) for s in servers]
+            assert sorted(counts) == [2, 2, 5]
+            assert all(b.in_flight == 0 for b in router.backends)
+
+        asyncio.run(scenario())
+
+
+def test_fails_over_opens_the_circuit_and_recovers_via_probe():
+    with ExitStack() as stack:
+        good, sick = _servers(stack, 2)
+        sick.healthy = False
+        router = OllamaRouter([sick.url, _dead_url(), good.url], health_interval=0, circuit_failures=1)
+
+        async def scenario():
+            response = await router.acompletion(MODEL, _conversation(1), None)
+            assert response.choices[0].message.content == "ok"
+            sick_backend, dead_backend, good_backend = router.backends
+            assert sick_backend.open_until and dead_backend.open_until and not good_backend.open_until
+
+            # Open circuits are skipped entirely.
+            before = len(sick.requests)
+            await router.acompletion(MODEL, _conversation(2), None)
+            assert len(sick.requests) == before and len(good.requests) == 2
+
+            # The probe marks the dead one down, and closes the recovered one's circuit.
+            sick.healthy = True
+            await router.probe()
+            assert not dead_backend.healthy
+            assert sick_backend.healthy and sick_backend.open_until == 0.0
+            await router.acompletion(MODEL, _conversation(3), None)
+            assert len(sick.requests) == before + 1
+
+        asyncio.run(scenario())
+
+
+def test_raises_when_every_backend_fails():
+    router = OllamaRouter([_dead_url(), _dead_url()], health_interval=0, timeout=2)
+    with pytest.raises(litellm.exceptions.APIConnectionError):
+        asyncio.run(router.acompletion(MODEL, _conversation(1), None))
+    assert all(b.failures == 1 and b.in_flight == 0 for b in router.backends)
@@ -0,0 +1,122 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+
+from app.server import Rejected, TurnScheduler, build_server_app
+from benchmarks.e2e import bench_agent
+from benchmarks.fake_ollama import FakeOllama, Reply
+
+
+def test_scheduler_orders_turns_per_session_and_rejects_when_full():
+    async def scenario():
+        scheduler = TurnScheduler(concurrency=2, queue_size=5, session_queue=2)
+        log, running, peak = [], 0, 0
+
+        def turn(name):
+            async def run():
+                nonlocal running, peak
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                log.append(name)
+                running -= 1
+                return name
+            return run
+
+        futures = [scheduler.submit("a", turn("a1")), scheduler.submit("a", turn("a2"))]
+        with pytest.raises(Rejected) as full_session:
+            scheduler.submit("a", turn("a3"))
+        assert full_session.value.status == 429 and full_session.value.reason == "session_queue_full"
+        futures += [scheduler.submit(s, turn(s)) for s in ("b", "c", "d")]
+        with pytest.raises(Rejected, match="server_queue_full"):
+            scheduler.submit("e", turn("e"))
+
+        assert await asyncio.gather(*futures) == ["a1", "a2", "b", "c", "d"]
+        assert log.index("a1") < log.index("a2") and peak == 2
+        assert scheduler.stats()["queued"] == scheduler.stats()["running"] == 0
+
+        slow = scheduler.submit("f", lambda: asyncio.sleep(10))
+        assert await scheduler.drain(timeout=0.05) is False
+        assert slow.cancelled()
+        with pytest.raises(Rejected) as draining:
+            scheduler.submit("g", turn("g"))
+        assert draining.value.status == 503
+
+    asyncio.run(scenario())
+
+
+def test_serves_turns_as_json_and_sse():
+    with FakeOllama(lambda request: Reply(content="hello there"), base_latency=0.001) as ollama:
+        runner = Runner(agent=bench_agent(ollama.url), app_name="app", session_service=InMemorySessionService())
+        with TestClient(build_server_app(runner)) as client:
+            reply = client.post("/sessions/s1/turns", json={"message": "hi"})
+            assert reply.status_code == 200 and reply.json()["text"] == "hello there"
+
+            with client.stream("POST", "/sessions/s1/turns", json={"message": "again", "stream": True}) as stream:
+                assert stream.headers["content-type"].startswith("text/event-stream")
+                body = "".join(stream.iter_text())
+            names = [line.split(": ", 1)[1] for line in body.splitlines() if line.startswith("event: ")]
+            assert names[-1] == "done" and "event" in names
+            done = json.loads(body.rstrip().splitlines()[-1].split(": ", 1)[1])
+            assert done["text"] == "hello there"
+
+            assert client.get("/healthz").json()["running"] == 0
+            assert "adk_serve_queue_seconds_count" in client.get("/metrics").text
+        # Both turns landed in one session, in order.
+        session = asyncio.run(runner.session_service.get_session(app_name="app", user_id="local-user", session_id="s1"))
+        texts = [e.content.parts[0].text for e in session.events if e.author == "user"]
+        assert texts == ["hi", "again"]
+
+
+def test_exit_signal_stops_admitting_at_once_and_drain_shares_its_budget():
+    import signal
+    import time
+
+    import uvicorn
+
+    from app.server import DrainingServer
+
+    app = build_server_app(runner=object())
+    server = DrainingServer(uvicorn.Config(app))
+    server.handle_exit(signal.SIGTERM, None)
+    scheduler = app.state.scheduler
+    assert scheduler.draining and server.should_exit
+    with pytest.raises(Rejected, match="draining"):
+        scheduler.submit("s", lambda: asyncio.sleep(0))
+
+    async def scenario():
+        busy = TurnScheduler()
+        busy.submit("s", lambda: asyncio.sleep(10))
+        busy.begin_drain()
+        await asyncio.sleep(0.1)  # uvicorn's own wait for open requests
+        started = time.monotonic()
+        assert await busy.drain(timeout=0.1) is False
+        assert time.monotonic() - started < 0.05
+
+    asyncio.run(scenario())
+
+
+def test_a_turn_cut_off_by_drain_answers_503_with_retry_after():
+    import httpx
+    from types import SimpleNamespace
+
+    async def run_async(**_):
+        await asyncio.sleep(10)
+        yield None
+
+    runner = SimpleNamespace(session_service=InMemorySessionService(), run_async=run_async)
+    app = build_server_app(runner)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            reply = asyncio.create_task(client.post("/sessions/s/turns", json={"message": "hi"}))
+            await asyncio.sleep(0.1)
+            assert await app.state.scheduler.drain(timeout=0) is False
+            return await reply
+
+    reply = asyncio.run(scenario())
+    assert reply.status_code == 503 and "retry-after" in reply.headers
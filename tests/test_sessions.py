@@ -0,0 +1,174 @@
+import asyncio
+import sqlite3
+import time
+
+from google.adk.agents import LlmAgent
+from google.adk.events.event import Event
+from google.adk.events.event_actions import EventActions
+from google.adk.runners import Runner
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.genai import types
+
+from app.sessions import SqliteSessionService
+
+
+def _service(path, **kwargs):
+    return SqliteSessionService(str(path), **kwargs)
+
+
+def _user(text):
+    return Event(author="user", invocation_id="i", content=types.Content(role="user", parts=[types.Part(text=text)]))
+
+
+def _tool_round(i):
+    call = types.Part(function_call=types.FunctionCall(name="calc", args={"expression": f"{i}+1"}, id=f"c{i}"))
+    reply = types.Part(function_response=types.FunctionResponse(name="calc", response={"result": i + 1}, id=f"c{i}"))
+    return [
+        Event(author="root", invocation_id="i", content=types.Content(role="model", parts=[call])),
+        Event(author="user", invocation_id="i", content=types.Content(role="user", parts=[reply])),
+        Event(author="root", invocation_id="i", content=types.Content(role="model", parts=[types.Part(text=f"{i + 1}")])),
+    ]
+
+
+def test_runner_sessions_persist_across_restarts(tmp_path, echo_model):
+    db = tmp_path / "sessions.db"
+
+    async def turn(service, text):
+        runner = Runner(agent=LlmAgent(name="root", model=echo_model), app_name="app", session_service=service)
+        message = types.Content(role="user", parts=[types.Part(text=text)])
+        async for _ in runner.run_async(user_id="u", session_id="s1", new_message=message):
+            pass
+
+    async def scenario():
+        first = _service(db)
+        await first.create_session(app_name="app", user_id="u", session_id="s1", state={"topic": "math", "user:tz": "PT"})
+        await turn(first, "hello")
+        assert first.flushes == 1  # the user message and the reply land in one transaction
+        await first.aclose()
+
+        second = _service(db)
+        await turn(second, "again")
+        session = await second.get_session(app_name="app", user_id="u", session_id="s1")
+        listed = await second.list_sessions(app_name="app", user_id="u")
+        await second.aclose()
+        return session, listed
+
+    session, listed = asyncio.run(scenario())
+    texts = [event.content.parts[0].text for event in session.events]
+    assert texts == ["hello", "echo: hello", "again", "echo: again"]
+    assert session.state == {"topic": "math", "user:tz": "PT"}
+    assert [s.id for s in listed.sessions] == ["s1"] and listed.sessions[0].events == []
+
+
+def test_state_deltas_and_windowed_loads(tmp_path):
+    async def scenario():
+        service = _service(tmp_path / "s.db", load_events=5)
+        session = await service.create_session(app_name="app", user_id="u", session_id="s")
+        for i in range(4):
+            await service.append_event(session, _user(f"q{i}"))
+            for event in _tool_round(i):
+                await service.append_event(session, event)
+        delta = Event(author="root", invocation_id="i", actions=EventActions(state_delta={"n": 1, "app:v": 2, "temp:x": 3}))
+        await service.append_event(session, delta)
+        windowed = await service.get_session(app_name="app", user_id="u", session_id="s")
+        recent = await service.get_session(
+            app_name="app", user_id="u", session_id="s", config=GetSessionConfig(num_recent_events=2)
+        )
+        pages = [len(page) async for page in service.iter_events(app_name="app", user_id="u", session_id="s", page_size=7)]
+        other = await service.create_session(app_name="app", user_id="v")
+        await service.aclose()
+        return windowed, recent, pages, other
+
+    windowed, recent, pages, other = asyncio.run(scenario())
+    # The 5-event window would start mid tool round, so it widens to the last user turn.
+    assert [e.content.parts[0].text if e.content else None for e in windowed.events] == ["q3", None, None, "4", None]
+    assert len(recent.events) == 2
+    assert pages == [7, 7, 3]
+    assert windowed.state == {"n": 1, "app:v": 2}
+    assert other.state == {"app:v": 2}
+
+
+def test_prune_drops_idle_sessions_and_trims_whole_turns(tmp_path):
+    db = tmp_path / "s.db"
+
+    async def fill():
+        service = _service(db)
+        for sid in ("old", "long"):
+            session = await service.create_session(app_name="app", user_id="u", session_id=sid)
+            for i in range(5):
+                await service.append_event(session, _user(f"q{i}"))
+                for event in _tool_round(i):
+                    await service.append_event(session, event)
+        service._conn.execute("UPDATE sessions SET update_time = ? WHERE id = 'old'", (time.time() - 400 * 86400,))
+        await service.aclose()
+
+    async def load(service):
+        loaded = (
+            await service.get_session(app_name="app", user_id="u", session_id="old"),
+            await service.get_session(app_name="app", user_id="u", session_id="long"),
+        )
+        await service.aclose()
+        return loaded
+
+    asyncio.run(fill())
+    old, long = asyncio.run(load(_service(db)))
+    assert old is not None and len(long.events) == 20  # retention is opt-in
+    old, long = asyncio.run(load(_service(db, retention_days=7, max_events=10)))
+    assert old is None
+    # 20 events, at most 10 kept, cut at a user turn: the last two turns survive.
+    assert len(long.events) == 8
+    assert long.events[0].content.parts[0].text == "q3"
+
+
+def test_two_processes_appending_to_one_session_keep_every_event(tmp_path):
+    db = tmp_path / "s.db"
+
+    async def scenario():
+        first, second = _service(db), _service(db)
+        session = await first.create_session(app_name="app", user_id="u", session_id="s")
+        for i in range(3):
+            for service in (first, second):  # e.g. a CLI run against a served session
+                await service.append_event(session, _user(f"q{i}"))
+                await service.aflush()
+        loaded = await first.get_session(app_name="app", user_id="u", session_id="s")
+        await first.aclose()
+        await second.aclose()
+        return loaded
+
+    loaded = asyncio.run(scenario())
+    assert [event.content.parts[0].text for event in loaded.events] == ["q0", "q0", "q1", "q1", "q2", "q2"]
+
+
+def test_a_locked_database_neither_stalls_the_loop_nor_loses_events(tmp_path):
+    db = tmp_path / "s.db"
+
+    async def scenario():
+        service = _service(db, busy_timeout=0.2, flush_interval=0.05)
+        session = await service.create_session(app_name="app", user_id="u", session_id="s")
+        other = sqlite3.connect(db, isolation_level=None)
+        other.execute("BEGIN IMMEDIATE")  # another process holds the write lock
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        await service.append_event(session, _user("q"))
+        await service.append_event(session, _tool_round(0)[-1])  # the final reply forces a write
+        assert ticks >= 10  # the loop kept running while the write waited for the lock
+        assert service.events_written == 0
+        other.execute("ROLLBACK")
+        await asyncio.sleep(0.2)  # the retry timer writes the kept rows
+        ticker.cancel()
+        written = service.events_written
+        loaded = await service.get_session(app_name="app", user_id="u", session_id="s")
+        other.close()
+        await service.aclose()
+        return written, loaded
+
+    written, loaded = asyncio.run(scenario())
+    assert written == 2
+    assert [event.content.parts[0].text for event in loaded.events] == ["q", "1"]
@@ -0,0 +1,17 @@
+import subprocess
+import sys
+
+from app.agents import TOOL_NAMES, get_root_agent
+from app.startup import ROOT
+
+
+def test_light_imports_do_not_build_the_agent():
+    code = "import sys, app, app.agents, app.tools; print(sorted(m for m in ('google.adk', 'litellm') if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def test_tool_registry_matches_the_built_agent():
+    agent = get_root_agent()
+    assert get_root_agent() is agent
+    assert {tool.__name__ for tool in agent.tools} == TOOL_NAMES == {"calc", "http_get", "weather_by_zip", "weather_by_zips"}
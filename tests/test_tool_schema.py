@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.adk.tools import FunctionTool
+from google.genai import types
+
+from app.agents import TOOL_NAMES, TOOLS
+from app.plugins import OllamaOptionsPlugin, OllamaToolCallBridgePlugin
+from app.tool_schema import SCHEMA_INSTRUCTION, reply_schema
+from benchmarks.e2e import bench_agent
+from benchmarks.fake_ollama import FakeOllama, Reply, tool_chain_script
+
+
+def _run(ollama, plugins, text="What is 2*(5+7)?"):
+    runner = Runner(agent=bench_agent(ollama.url), app_name="app", session_service=InMemorySessionService(), plugins=plugins)
+
+    async def ask():
+        await runner.session_service.create_session(app_name="app", user_id="u", session_id="s")
+        message = types.Content(role="user", parts=[types.Part(text=text)])
+        final = ""
+        async for event in runner.run_async(user_id="u", session_id="s", new_message=message):
+            if event.is_final_response() and event.content and event.content.parts:
+                final = "".join(part.text or "" for part in event.content.parts)
+        return final
+
+    return asyncio.run(ask())
+
+
+def test_reply_schema_admits_each_tool_with_its_required_arguments():
+    schema = reply_schema([FunctionTool(tool)._get_declaration() for tool in TOOLS], {t.__name__: t for t in TOOLS})
+    *calls, answer, batch = schema["oneOf"]
+    arguments = {call["properties"]["name"]["const"]: call["properties"]["arguments"] for call in calls}
+    assert set(arguments) == set(TOOL_NAMES)
+    # Defaulted parameters stay optional even though ADK declares them required.
+    assert arguments["weather_by_zip"]["required"] == ["zip_code"]
+    assert arguments["http_get"]["required"] == ["url"]
+    assert arguments["weather_by_zip"]["properties"]["timeout"] == {"type": "number"}
+    assert answer["properties"]["name"] == {"const": "response"}
+    assert batch["type"] == "array" and batch["items"]["oneOf"] == calls
+
+
+def test_tool_turns_are_constrained_and_need_no_repair():
+    bridge = OllamaToolCallBridgePlugin(allowed_tool_names=TOOL_NAMES)
+    script = tool_chain_script([("calc", {"expression": "2*(5+7)"})], answer="It is 24.")
+    with FakeOllama(script, base_latency=0.001) as ollama:
+        final = _run(ollama, [bridge, OllamaOptionsPlugin(tool_schema=True)])
+        first, second = ollama.requests
+    assert first["format"]["oneOf"]
+    assert SCHEMA_INSTRUCTION in first["messages"][0]["content"]
+    assert second["format"] == first["format"]
+    assert final == "It is 24."
+    assert bridge.responses == 2 and bridge.repairs == {}
+
+
+def test_invented_tool_names_are_counted_as_repairs():
+    bridge = OllamaToolCallBridgePlugin(allowed_tool_names=TOOL_NAMES)
+    invented = json.dumps({"name": "get_weather", "arguments": {"city": "Mountain View"}})
+    with FakeOllama(lambda request: Reply(content=invented), base_latency=0.001) as ollama:
+        _run(ollama, [bridge, OllamaOptionsPlugin()])
+        (request,) = ollama.requests
+    assert "format" not in request or not isinstance(request["format"], dict)
+    assert bridge.repairs == {"unsupported_tool": 1}
@@ -1,3 +1,22 @@
 from app.tools import calc
 def test_calc():
     assert calc("2*(5+7)") == "24"
+
+def test_calc_rejects_unsafe_and_runaway_expressions():
+    assert calc("__import__('os')").startswith("Error: Unsupported function")
+    assert calc("().__class__").startswith("Error: Unsupported syntax")
+    assert calc("9**9**9") == "Error: Exponent too large."
+    assert calc("(-1)**5000 + 0**5000 + 1**99999") == "2"
+
+def test_calc_batches_and_vectorizes():
+    assert calc(expressions=["1+1", "sqrt(16)"]) == "[2, 4.0]"
+    assert calc("x*2 + y", variables={"x": [1, 2, 3], "y": 1}) == "[3.0, 5.0, 7.0]"
+    xyz = {"x": [1, 2], "y": [3, 4], "z": [0, 0]}
+    assert calc("min(x, y, z)", variables=xyz) == "[0.0, 0.0]"
+    assert calc("max(x, y, z)", variables=xyz) == "[3.0, 4.0]"
+    assert calc("max(x)", variables={"x": [1, 2]}) == "2.0"
+    assert calc("min(x) + max(x, 5)", variables={"x": [1, 7]}) == "[6.0, 8.0]"
+
+def test_calc_rejects_non_numeric_variables():
+    for value in ("ab", {"a": 1}, True, [1, "2"], [[1, 2]]):
+        assert calc("x*3", variables={"x": value}) == "Error: Variable 'x' must be a number or a list of numbers."
@@ -0,0 +1,40 @@
+import asyncio
+
+import httpx
+
+from app import http_client
+from app.tools import weather_by_zips
+
+
+def test_batch_uses_one_multi_coordinate_request():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url)
+        if request.url.host == "api.zippopotam.us":
+            return httpx.Response(200, json={"places": [{
+                "latitude": "42.9956", "longitude": "-71.4548",
+                "place name": "Manchester", "state abbreviation": "NH",
+            }]})
+        count = len(request.url.params["latitude"].split(","))
+        return httpx.Response(200, json=[
+            {"current_weather": {"temperature": 50 + i, "windspeed": 1.0, "weathercode": 0, "time": "2025-01-01T12:00"}}
+            for i in range(count)
+        ])
+
+    http_client.set_transport(httpx.MockTransport(handler))
+    result = asyncio.run(weather_by_zips(["94040", "10001", "09001", "94040"]))
+
+    assert result["ok"], result
+    assert [row[0] for row in result["data"]["rows"]] == ["94040", "10001", "09001"]
+    assert [row[3] for row in result["data"]["rows"]] == [50, 51, 52]
+    hosts = [url.host for url in requests]
+    assert hosts.count("api.open-meteo.com") == 1
+    assert hosts.count("api.zippopotam.us") == 1
+    assert "Manchester, NH" in result["data"]["table"]
+
+
+def test_batch_rejects_invalid_zips_up_front():
+    result = asyncio.run(weather_by_zips(["94040", "9404", "abcde"]))
+    assert not result["ok"]
+    assert "9404, abcde" in result["error"]
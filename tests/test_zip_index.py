@@ -0,0 +1,52 @@
+import asyncio
+
+import httpx
+
+from app import http_client
+from app.tools import weather_by_zip
+from app.zip_index import ZipIndex, ZipPlace, lookup_zip, write_index
+
+
+def test_index_round_trip(tmp_path):
+    path = tmp_path / "zips.bin"
+    places = [
+        ZipPlace("02108", 42.3576, -71.0684, "Boston", "MA"),
+        ZipPlace("94040", 37.3855, -122.088, "Mountain View", "CA"),
+        ZipPlace("99501", 61.2116, -149.8761, "Anchorage", "AK"),
+    ]
+    assert write_index(reversed(places), path) == 3
+
+    index = ZipIndex(path)
+    try:
+        assert len(index) == 3
+        for place in places:
+            assert index.lookup(place.zip) == place
+        assert index.lookup("94041") is None
+        assert index.lookup("abcde") is None
+    finally:
+        index.close()
+
+
+def test_weather_by_zip_geocodes_offline():
+    assert lookup_zip("94040").city == "Mountain View"
+    assert lookup_zip("05401").city == "Burlington"  # the bundled index is not just a seed list
+    hosts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        hosts.append(request.url.host)
+        if request.url.host != "api.open-meteo.com":
+            raise httpx.ConnectError("network disabled")
+        return httpx.Response(200, json={"current_weather": {
+            "temperature": 58.0, "windspeed": 3.1, "winddirection": 200,
+            "weathercode": 2, "time": "2025-01-01T12:00",
+        }})
+
+    http_client.set_transport(httpx.MockTransport(handler))
+    try:
+        result = asyncio.run(weather_by_zip("94040"))
+    finally:
+        http_client.set_transport(None)
+
+    assert result["ok"], result
+    assert result["data"]["location"]["city"] == "Mountain View"
+    assert hosts == ["api.open-meteo.com"]